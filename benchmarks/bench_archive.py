@@ -0,0 +1,98 @@
+"""
+Measures the history archive against reading the history from the sheet as lists of strings, for growing histories.
+
+Usage:
+    python benchmarks/bench_archive.py [--sizes 100000 1000000] [--appended 100]
+
+For each size it reports:
+    rows           building a HistorySnapshot from the rows get_all_data returns, the way the history is read today
+    export         a full export to the archive, including reading the fake sheet
+    append         exporting again after `--appended` games were added, which only reads and writes what changed
+    open           opening the archive and mapping every year as a HistorySnapshot
+    scan           counting each player's wins per year over the mapped winners column
+    stats          compute_stats over the mapped archive
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+import numpy as np
+from catan_core.analytics import HistorySnapshot, compute_stats
+from catan_core.archive import HistoryArchive, export_archive
+from catan_core.storage import GoogleSheets
+from synthetic import generate_game, generate_rows
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return (time.perf_counter() - start) * 1000, result
+
+
+def archive_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def scan(archive):
+    wins = {}
+    for year, arrays in archive.scan(["winners"]):
+        wins[year] = np.bincount(arrays["winners"], minlength=len(archive.winner_names))
+    return wins
+
+
+def run(size, appended, path):
+    rows, columns = generate_rows(size)
+    sheets = fakes.FakeSheets([columns] + rows)
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+
+    rows_ms, _ = timed(lambda: HistorySnapshot.from_rows(rows, columns, size + 1))
+    export_ms, _ = timed(lambda: export_archive(GoogleSheets("credentials.json"), path, full=True))
+    size_mb = archive_size(path) / 1e6
+
+    rng = random.Random(size)
+    store = GoogleSheets("credentials.json")
+    # New games are recent ones, so they land in the last year
+    games = [dict(generate_game(rng), **{"Game date": "12/31/2026"}) for _ in range(appended)]
+    store.add_rows(games)
+    append_ms, report = timed(lambda: export_archive(GoogleSheets("credentials.json"), path))
+
+    open_ms, snapshot = timed(lambda: HistoryArchive(path).snapshot())
+    scan_ms, _ = timed(lambda: scan(HistoryArchive(path)))
+    stats_ms, _ = timed(lambda: compute_stats(snapshot))
+    assert len(snapshot) == size + appended
+    print(
+        f"{size:>9}{rows_ms:>10.0f}{export_ms:>10.0f}{append_ms:>10.0f}{len(report['years_written']):>7}"
+        f"{open_ms:>9.1f}{scan_ms:>9.1f}{stats_ms:>9.0f}{size_mb:>9.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--appended", type=int, default=100)
+    args = parser.parse_args()
+
+    print(
+        f"{'games':>9}{'rows ms':>10}{'export':>10}{'append':>10}{'years':>7}{'open':>9}{'scan':>9}{'stats':>9}{'MB':>9}"
+    )
+    path = tempfile.mkdtemp()
+    try:
+        for size in args.sizes:
+            run(size, args.appended, os.path.join(path, str(size)))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
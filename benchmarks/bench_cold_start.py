@@ -0,0 +1,68 @@
+"""
+Measures the cold start of every lambda route and fails when a route goes over its budget.
+
+Each run starts a fresh interpreter with lambda_runner.py, so the import time and the first invocation are both paid in
+full. The median of the runs is compared to the budget, in milliseconds, from cold_start_budget.json.
+
+Usage:
+    python benchmarks/bench_cold_start.py [--runs 5] [--budget-file benchmarks/cold_start_budget.json]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BENCHMARKS_PATH = Path(__file__).parent.absolute()
+
+
+def measure(interface, route, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, str(BENCHMARKS_PATH / "lambda_runner.py"), interface, route],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        "import_ms": statistics.median(r["import_ms"] for r in results),
+        "first_invocation_ms": statistics.median(r["first_invocation_ms"] for r in results),
+        "total_ms": statistics.median(r["total_ms"] for r in results),
+        "modules": results[-1]["modules_after_invocation"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-file", default=str(BENCHMARKS_PATH / "cold_start_budget.json"))
+    args = parser.parse_args()
+
+    with open(args.budget_file) as f:
+        budgets = json.load(f)
+
+    over_budget = []
+    print(f"{'route':<28} {'import ms':>10} {'invoke ms':>10} {'total ms':>10} {'budget ms':>10} {'modules':>8}")
+    for interface, routes in budgets.items():
+        for route, budget in routes.items():
+            result = measure(interface, route, args.runs)
+            name = f"{interface} {route}"
+            print(
+                f"{name:<28} {result['import_ms']:>10.1f} {result['first_invocation_ms']:>10.1f} "
+                f"{result['total_ms']:>10.1f} {budget:>10} {result['modules']:>8}"
+            )
+            if result["total_ms"] > budget:
+                over_budget.append(name)
+
+    if over_budget:
+        print(f"Over budget: {', '.join(over_budget)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
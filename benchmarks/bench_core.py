@@ -0,0 +1,122 @@
+"""
+Benchmark of the catan_core scoring pipeline that both lambdas run, against the in-process fakes in fakes.py.
+An optimisation to parsing, storage or stats shows up here once, whichever lambda it is for.
+
+Each scenario reports its p50 latency and the p50 time of each traced phase:
+    parse: parsing messages only
+    score: a score whose stats line up with the sheet, so the game is counted incrementally
+    score rebuild: a score whose stats are missing, so they are rebuilt from the whole sheet
+    import: a bulk import of --import-rows games
+    stats: /stats on a cached snapshot, with a different rolling window every time so nothing but the snapshot is reused
+
+--store picks the backend: the Google Sheet with aggregates in S3, SQLite on its own, or SQLite mirrored to the sheet.
+
+Usage:
+    python benchmarks/bench_core.py [--sizes 1000 10000 100000] [--requests 30] [--sheets-latency-ms 0]
+        [--store sheets|sqlite|sqlite-mirror]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import (
+    GoogleSheets,
+    MessageParser,
+    MirroredStore,
+    S3AggregatesStore,
+    ScoringPipeline,
+    SQLiteStatsStore,
+    SQLiteStore,
+    tracing,
+)
+from synthetic import generate_message, generate_rows
+
+BUCKET = "catan-tracker-local"
+AGGREGATES_KEY = "local/aggregates.json"
+
+
+def run_traced(func, num_requests):
+    """Runs `func` inside a trace `num_requests` times. Returns the p50 latency and the p50 of every phase."""
+    latencies, phases = [], {}
+    for i in range(num_requests):
+        trace = tracing.start("CatanTrackerBench", "bench")
+        start = time.perf_counter()
+        func(i)
+        latencies.append((time.perf_counter() - start) * 1000)
+        for name, ms in trace.spans.items():
+            phases.setdefault(name, []).append(ms)
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracing.emit()
+    return statistics.median(latencies), {name: statistics.median(values) for name, values in phases.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 10_000, 100_000])
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--import-rows", type=int, default=500)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0)
+    parser.add_argument("--s3-latency-ms", type=float, default=0)
+    parser.add_argument("--store", choices=["sheets", "sqlite", "sqlite-mirror"], default="sheets")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    messages = [generate_message(rng) for _ in range(max(args.requests, args.import_rows))]
+    import_data = "\n".join(messages[: args.import_rows])
+
+    print(f"{'scenario':<14} {'games':>7} {'p50 ms':>9}  phases (p50 ms)")
+    for size in args.sizes:
+        rows, columns = generate_rows(size)
+        sheets = fakes.FakeSheets([columns] + rows, latency_ms=args.sheets_latency_ms)
+        s3 = fakes.FakeS3(latency_ms=args.s3_latency_ms)
+        fakes.install(sheets, s3, fakes.FakeSNS())
+        if args.store == "sheets":
+            store_factory = lambda: GoogleSheets("googlecreds.json")
+            stats_store = S3AggregatesStore(BUCKET, AGGREGATES_KEY)
+        else:
+            path = os.path.join(tempfile.mkdtemp(), "games.db")
+            SQLiteStore(path).add_rows([{k: v for k, v in zip(columns, row) if v} for row in rows])
+            if args.store == "sqlite":
+                store_factory = lambda: SQLiteStore(path)
+            else:
+                store_factory = lambda: MirroredStore(SQLiteStore(path), lambda: GoogleSheets("googlecreds.json"))
+            stats_store = SQLiteStatsStore(path)
+        pipeline = ScoringPipeline(store_factory, stats_store, MessageParser())
+
+        def score_rebuild(i):
+            s3.objects.pop((BUCKET, AGGREGATES_KEY), None)
+            pipeline.score(messages[i])
+
+        # The first score builds the stats, the ones after it only count their own game
+        pipeline.score(messages[0])
+        scenarios = [
+            ("parse", lambda i: pipeline.parser.parse(messages[i])),
+            ("score", lambda i: pipeline.score(messages[i])),
+            ("score rebuild", score_rebuild),
+            ("import", lambda i: pipeline.import_games(import_data, "messages")),
+            ("stats", lambda i: pipeline.history_stats(f"bench-{size}", 20 + i, 50)),
+        ]
+        for name, func in scenarios:
+            num_requests = 3 if name == "import" else args.requests
+            p50, phases = run_traced(func, num_requests)
+            phases = ", ".join(f"{phase}={ms:.2f}" for phase, ms in sorted(phases.items(), key=lambda item: -item[1]))
+            print(f"{name:<14} {size:>7} {p50:>9.2f}  {phases}")
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("CONFIG_BUCKET", BUCKET)
+    os.environ.setdefault("AGGREGATES_KEY", AGGREGATES_KEY)
+    sys.exit(main())
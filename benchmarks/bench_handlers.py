@@ -0,0 +1,149 @@
+"""
+End to end benchmark of both lambda_handlers against the in-process fakes in fakes.py.
+
+For every history size the sheet is seeded with synthetic games, then each scenario is invoked repeatedly. The report
+has the p50/p95 latency and the number of Sheets/S3/SNS calls per request. The fakes can add latency to every call to
+model the network, so the call counts show up in the latency the way they would against the real APIs.
+
+Usage:
+    python benchmarks/bench_handlers.py [--sizes 100 1000 10000] [--requests 50] [--sheets-latency-ms 0]
+        [--s3-latency-ms 0]
+"""
+
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import MessageParser
+from lambda_runner import ENVIRONMENT
+from synthetic import generate_message, generate_rows
+
+
+def load_lambda(interface):
+    """Imports an interface's lambda_function under its own name, so both interfaces can be loaded side by side"""
+    interface_path = PROJECT_PATH / "src" / interface
+    spec = importlib.util.spec_from_file_location(f"{interface}_lambda_function", interface_path / "lambda_function.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def ui_send_event(rng):
+    return {"path": "/send", "httpMethod": "POST", "headers": {}, "body": json.dumps({"message": generate_message(rng)})}
+
+
+def ui_home_event(rng):
+    return {"path": "/", "httpMethod": "GET", "headers": {"cookie": "CT_CR=token"}, "body": None}
+
+
+def ui_stats_event(rng):
+    parameters = {"window": "20", "points": "50"}
+    return {"path": "/stats", "httpMethod": "GET", "headers": {"cookie": "CT_CR=token"}, "queryStringParameters": parameters}
+
+
+def sms_event(rng):
+    return {"Records": [{"Sns": {"Message": generate_message(rng)}}]}
+
+
+def sqs_event(rng, batch_size=10):
+    records = []
+    for _ in range(batch_size):
+        key = f"{rng.getrandbits(64):016x}"
+        body = {"idempotency_key": key, "game": MessageParser().parse(generate_message(rng))}
+        records.append({"messageId": key, "body": json.dumps(body)})
+    return {"Records": records}
+
+
+def with_write_behind(module, handler):
+    """Runs a handler of the ui lambda with write-behind turned on, queueing to a temporary directory"""
+    module.SCORE_QUEUE_DIR = tempfile.mkdtemp()
+
+    def run(event, context):
+        module.WRITE_BEHIND = True
+        try:
+            return handler(event, context)
+        finally:
+            module.WRITE_BEHIND = False
+
+    return run
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))]
+
+
+def run_scenario(handler, make_event, num_requests, apis):
+    rng = random.Random(0)
+    latencies, calls_per_request = [], []
+    for _ in range(num_requests):
+        event = make_event(rng)
+        for api in apis:
+            api.reset_calls()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            handler(event, None)
+        latencies.append((time.perf_counter() - start) * 1000)
+        calls_per_request.append(fakes.api_calls(*apis))
+    total_calls = fakes.api_calls()
+    for calls in calls_per_request:
+        total_calls.update(calls)
+    return {
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+        "calls_per_request": sum(total_calls.values()) / num_requests,
+        "calls": {name: count / num_requests for name, count in sorted(total_calls.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[100, 1_000, 10_000])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--sheets-latency-ms", type=float, default=0)
+    parser.add_argument("--s3-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(ENVIRONMENT)
+    ui, sms = load_lambda("ui_interface"), load_lambda("sms_interface")
+    scenarios = [
+        ("ui POST /send", ui.lambda_handler, ui_send_event),
+        ("ui GET /", ui.lambda_handler, ui_home_event),
+        ("ui GET /stats", ui.lambda_handler, ui_stats_event),
+        ("sms SNS", sms.lambda_handler, sms_event),
+        ("ui POST /send write-behind", with_write_behind(ui, ui.lambda_handler), ui_send_event),
+        ("ui SQS batch of 10", ui.queue_handler, sqs_event),
+    ]
+
+    print(f"{'scenario':<26} {'games':>7} {'p50 ms':>9} {'p95 ms':>9} {'calls/req':>10}  calls")
+    for size in args.sizes:
+        rows, columns = generate_rows(size)
+        sheets = fakes.FakeSheets([columns] + rows, latency_ms=args.sheets_latency_ms)
+        s3, sns = fakes.FakeS3(latency_ms=args.s3_latency_ms), fakes.FakeSNS(latency_ms=args.s3_latency_ms)
+        fakes.install(sheets, s3, sns)
+
+        for name, handler, make_event in scenarios:
+            result = run_scenario(handler, make_event, args.requests, [sheets, s3, sns])
+            calls = ", ".join(f"{k}={v:g}" for k, v in result["calls"].items())
+            print(
+                f"{name:<26} {size:>7} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['calls_per_request']:>10.2f}  {calls}"
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+Compares rendering the home page the old way (a new jinja2 Environment per request and every message ever sent) with
+the cached template and a single page of messages, plus the cost of answering an unchanged chat with a 304.
+
+Usage:
+    python benchmarks/bench_home.py [--sizes 10000 50000] [--page-size 50] [--repeat 5]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+UI_INTERFACE_PATH = PROJECT_PATH / "src" / "ui_interface"
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+sys.path.insert(1, str(UI_INTERFACE_PATH))
+
+os.environ.setdefault("MESSAGES_PREFIX", "local/messages/")
+
+import lambda_function
+from synthetic import generate_message
+
+
+def generate_messages(num_messages):
+    import random
+
+    rng = random.Random(0)
+    messages = []
+    for i in range(num_messages // 2):
+        messages.append({"body": generate_message(rng), "who": "sender"})
+        messages.append({"body": f"Congrats! Overall, Jess is winning {i}-{i}.", "who": "receiver"})
+    return messages
+
+
+def render_everything(messages):
+    from jinja2 import Environment, FileSystemLoader
+
+    en = Environment(loader=FileSystemLoader(str(UI_INTERFACE_PATH / "templates"), encoding="utf8"))
+    return en.get_template("index.html").render(messages=messages, flow="home")
+
+
+def render_page(messages, keys, page_size):
+    template, template_hash = lambda_function.get_template("index.html")
+    page_keys = keys[:page_size]
+    lambda_function.make_etag(template_hash, "home", page_keys, page_keys[-1])
+    return template.render(messages=messages[-page_size * 2 :], flow="home", cursor=page_keys[-1])
+
+
+def not_modified(keys, page_size, etag):
+    _, template_hash = lambda_function.get_template("index.html")
+    page_keys = keys[:page_size]
+    event = {"headers": {"If-None-Match": etag}}
+    return lambda_function.is_not_modified(event, lambda_function.make_etag(template_hash, "home", page_keys, None))
+
+
+def time_it(func, repeat, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[10_000, 50_000])
+    parser.add_argument("--page-size", type=int, default=lambda_function.MESSAGES_PAGE_SIZE)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'everything ms':>14} {'everything KB':>14} {'page ms':>10} {'page KB':>10} {'304 ms':>8}")
+    for size in args.sizes:
+        messages = generate_messages(size)
+        keys = [lambda_function.message_key(i, "bench") for i in range(size // 2, 0, -1)]
+        _, template_hash = lambda_function.get_template("index.html")
+        etag = lambda_function.make_etag(template_hash, "home", keys[: args.page_size], None)
+
+        everything_ms = time_it(render_everything, args.repeat, messages)
+        page_ms = time_it(render_page, args.repeat, messages, keys, args.page_size)
+        not_modified_ms = time_it(not_modified, args.repeat, keys, args.page_size, etag)
+        everything_kb = len(render_everything(messages).encode()) / 1024
+        page_kb = len(render_page(messages, keys, args.page_size).encode()) / 1024
+        print(
+            f"{size:>10} {everything_ms:>14.1f} {everything_kb:>14.0f} {page_ms:>10.2f} {page_kb:>10.0f} "
+            f"{not_modified_ms:>8.3f}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Measures the throughput of MessageParser against the original convert_message_to_dictionary, over a corpus of
+generated messages with a share of them malformed the ways texts usually go wrong.
+
+Usage:
+    python benchmarks/bench_parser.py [--messages 100000] [--malformed 0.2] [--repeat 3]
+
+The messages both parsers accept are also compared, so the report shows where the new grammar disagrees.
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+from catan_core.groups import DEFAULT_PLAYERS
+from catan_core.parsing import MessageParseError, MessageParser, parse_game_date, today
+from synthetic import generate_message
+
+GAME_DATE = "1/1/2024"
+
+
+def validate_message(message_parts, players=DEFAULT_PLAYERS):
+    """
+    Args:
+        message_parts (list): The sentences of the message
+        players (list): The roster of the group the message is for
+    """
+    errors = []
+    score_difference = message_parts[0].strip()
+    game_name = message_parts[1].strip().lower() if len(message_parts) > 1 else ""
+
+    if not re.search(r"by \d", score_difference):
+        errors.append(f"The first sentence should follow the format of '{players[0]} by 5'")
+    elif score_difference.split(" by ")[0].strip().lower() not in [player.lower() for player in players]:
+        errors.append(f"The winner should be one of {', '.join(players)}")
+
+    if not game_name or any(player.lower() in game_name for player in players):
+        errors.append("The second sentence should only be the game name")
+
+    if errors:
+        error_messages = ". ".join(errors)
+        raise Exception(f"The message was not sent in the correct format. {error_messages}")
+
+
+def convert_message_to_dictionary(received_message, game_date=None, players=DEFAULT_PLAYERS):
+    """The parser the lambdas used before MessageParser, IE. "Jess by 5. Seafarers. Raining" split on the periods"""
+    # Validate the message parts
+    message_parts = received_message.split(".")
+    validate_message(message_parts, players)
+
+    # Transform the message to a dictionary. The game is dated today unless a date is given (IE. for a backfill).
+    game_date = today() if game_date is None else parse_game_date(game_date)
+    winner, score_difference = message_parts[0].strip().split(" by ")
+    # The winner is spelled the way the roster has it, so "jess by 5" counts for Jess
+    winner = next(player for player in players if player.lower() == winner.strip().lower())
+    my_dict = {
+        "Game date": game_date,
+        "Winner": winner,
+        "Score difference": score_difference,
+        "Game": message_parts[1].strip(),
+    }
+    if len(message_parts) > 2:
+        for message_part in message_parts[2:]:
+            stripped_message_part = message_part.strip()
+            if stripped_message_part:
+                my_dict[f"{stripped_message_part}?"] = "Yes"
+
+    return my_dict
+
+
+def alias(rng, message):
+    """Rewrites a well formed message the way the new parser also accepts it"""
+    winner, rest = message.split(" by ", 1)
+    score, rest = rest.split(".", 1)
+    words = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten"]
+    return rng.choice(
+        [
+            f"{winner.lower()} by {score}.{rest}",
+            f"{winner} won by {score}.{rest}",
+            f"{winner} by {words[int(score)]}.{rest}",
+            f"  {winner}  by {score} . {rest} ",
+        ]
+    )
+
+
+def malform(rng, message):
+    """Breaks a well formed message the way texts usually go wrong"""
+    winner, rest = message.split(" by ", 1)
+    score, rest = rest.split(".", 1)
+    return rng.choice(
+        [
+            f"{winner} by {score}{rest}",
+            f"Sam by {score}.{rest}",
+            f"{winner} by lots.{rest}",
+            f"{winner} {score}.{rest}",
+            f"{winner} by {score}",
+            f"{winner} by {score}. {winner}'s favourite",
+            "",
+        ]
+    )
+
+
+def generate_corpus(num_messages, malformed_share, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(num_messages):
+        message = generate_message(rng)
+        roll = rng.random()
+        if roll < malformed_share:
+            message = malform(rng, message)
+        elif roll < malformed_share * 1.5:
+            message = alias(rng, message)
+        corpus.append(message)
+    return corpus
+
+
+def parse_all(parse, corpus):
+    results = []
+    for message in corpus:
+        try:
+            results.append(parse(message))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def count_errors(parse, corpus):
+    # Only the errors are counted, since keeping every result and exception around would time the garbage collector
+    errors = 0
+    for message in corpus:
+        try:
+            parse(message)
+        except Exception:
+            errors += 1
+    return errors
+
+
+def time_it(parse, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count_errors(parse, corpus)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--malformed", type=float, default=0.2, help="Share of the corpus that is malformed")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.messages, args.malformed)
+    message_parser = MessageParser()
+    parsers = [
+        ("convert_message_to_dictionary", lambda message: convert_message_to_dictionary(message, GAME_DATE)),
+        ("MessageParser.parse", lambda message: message_parser.parse(message, GAME_DATE)),
+        ("MessageParser.parse_game", message_parser.parse_game),
+    ]
+
+    print(f"{'parser':<32}{'msgs/s':>12}{'us/msg':>10}{'parsed':>10}{'errors':>10}")
+    results = {}
+    for name, parse in parsers:
+        seconds = time_it(parse, corpus, args.repeat)
+        results[name] = parse_all(parse, corpus)
+        errors = sum(isinstance(result, Exception) for result in results[name])
+        per_second = len(corpus) / seconds
+        print(f"{name:<32}{per_second:>12,.0f}{seconds / len(corpus) * 1e6:>10.2f}{len(corpus) - errors:>10}{errors:>10}")
+
+    old, new = results["convert_message_to_dictionary"], results["MessageParser.parse"]
+    both = [(o, n) for o, n in zip(old, new) if not isinstance(o, Exception) and not isinstance(n, Exception)]
+    only_new = sum(isinstance(o, Exception) and not isinstance(n, Exception) for o, n in zip(old, new))
+    only_old = sum(not isinstance(o, Exception) and isinstance(n, Exception) for o, n in zip(old, new))
+    print(f"\nParsed by both: {len(both)}, identical: {sum(o == n for o, n in both)}")
+    print(f"Only parsed by MessageParser (aliases): {only_new}")
+    print(f"Only parsed by convert_message_to_dictionary (IE. a missing period read as the score): {only_old}")
+
+    codes = {}
+    for result in new:
+        if isinstance(result, MessageParseError):
+            for error in result.errors:
+                key = f"{error['field']}.{error['code']}"
+                codes[key] = codes.get(key, 0) + 1
+    print("Error codes: " + ", ".join(f"{key}={count}" for key, count in sorted(codes.items())))
+
+
+if __name__ == "__main__":
+    main()
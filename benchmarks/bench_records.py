@@ -0,0 +1,107 @@
+"""
+Compares the pandas DataFrame path the lambdas used to take against the RecordAggregates they build the reply from.
+
+Usage:
+    python benchmarks/bench_records.py [--sizes 1000 100000 1000000] [--repeat 3]
+
+pandas is a dev dependency, it is only needed for this comparison.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+from catan_core import RecordAggregates
+from synthetic import generate_rows
+
+DATA_DICT = {
+    "Game date": "1/1/2024",
+    "Winner": "Jess",
+    "Score difference": "3",
+    "Game": "Seafarers",
+    "Raining?": "Yes",
+    "At home?": "Yes",
+}
+
+
+def pandas_records(rows, columns, data_dict):
+    import pandas as pd
+
+    df = pd.DataFrame(rows, columns=columns)
+    game, score_diff, winner = data_dict["Game"], data_dict["Score difference"], data_dict["Winner"]
+    df_game = df[df["Game"] == game]
+    df_score_and_game = df[(df["Game"] == game) & (df["Score difference"] == score_diff) & (df["Winner"] == winner)]
+    ignore_columns = ["Game date", "Winner", "Score difference"]
+    query = " & ".join([f'`{k}` == "{v}"' for k, v in data_dict.items() if k not in ignore_columns])
+    df_all_conditions = df.query(query)
+    return (
+        df["Winner"].value_counts().to_dict(),
+        df_game["Winner"].value_counts().to_dict(),
+        df_all_conditions["Winner"].value_counts().to_dict(),
+        len(df_score_and_game.index),
+    )
+
+
+def aggregates_records(aggregates, data_dict):
+    game, score_diff, winner = data_dict["Game"], data_dict["Score difference"], data_dict["Winner"]
+    return (
+        aggregates.overall_records(),
+        aggregates.game_records(game),
+        aggregates.conditions_records(data_dict),
+        aggregates.score_difference_wins(game, winner, score_diff),
+    )
+
+
+def time_it(func, repeat, *args):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        import pandas  # noqa: F401
+
+        pandas_import = time.perf_counter() - start
+        print(f"pandas import: {pandas_import * 1000:.0f} ms")
+    except ImportError:
+        pandas_import = None
+        print("pandas is not installed, only the aggregates are timed")
+
+    print(f"{'games':>10} {'pandas ms':>10} {'build ms':>10} {'query ms':>10} {'total ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        rows, columns = generate_rows(size)
+        pandas_time = None
+        if pandas_import is not None:
+            pandas_time, expected = time_it(pandas_records, args.repeat, rows, columns, DATA_DICT)
+        build_time, aggregates = time_it(RecordAggregates.from_rows, args.repeat, rows, columns, size + 1)
+        query_time, result = time_it(aggregates_records, args.repeat, aggregates, DATA_DICT)
+        if pandas_time is not None and tuple(expected) != result:
+            raise AssertionError(f"Aggregates and pandas disagree for {size} games: {result} != {expected}")
+
+        # A reply only queries the saved aggregates, they are built from the rows when they are rebuilt
+        pandas_ms = f"{pandas_time * 1000:.1f}" if pandas_time is not None else "-"
+        speedup = f"{pandas_time / query_time:.1f}x" if pandas_time is not None else "-"
+        print(
+            f"{size:>10} {pandas_ms:>10} {build_time * 1000:>10.1f} {query_time * 1000:>10.2f} "
+            f"{(build_time + query_time) * 1000:>10.1f} {speedup:>8}"
+        )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+Measures a burst of submissions against a fake Sheets with a quota, with the SheetsScheduler set up a few ways:
+
+    bare          every 429 reaches the caller, which is how GoogleSheets behaved before the scheduler
+    retries       429s are retried after the Retry-After the fake sends, with no token buckets
+    jitter        429s are retried with exponential backoff and full jitter only, IE. when Sheets sends no Retry-After
+    scheduler     token buckets matching the quota, with the retries as a fallback
+
+Usage:
+    python benchmarks/bench_sheets_quota.py [--submissions 120] [--threads 8] [--quota 30] [--window 2]
+                                            [--sheets-latency-ms 20] [--readers 16]
+
+The quota is `--quota` reads and `--quota` writes per `--window` seconds, a minute of the real quota squeezed into a
+few seconds. Each submission is one row appended by GoogleSheets.add_data, as the /send route does. Afterwards
+`--readers` threads read the whole sheet at once, with and without sharing reads that are in flight.
+"""
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import sheets_scheduler
+from catan_core.sheets_scheduler import SheetsScheduler
+from catan_core.storage import GoogleSheets
+from synthetic import generate_columns, generate_game, generate_rows
+
+
+def schedulers(quota, window):
+    return {
+        "bare": lambda: SheetsScheduler(None, None, max_retries=0),
+        "retries": lambda: SheetsScheduler(None, None, window_seconds=window),
+        "jitter": lambda: SheetsScheduler(None, None, base_backoff_seconds=window / 8, max_backoff_seconds=window),
+        "scheduler": lambda: SheetsScheduler(quota, quota, window_seconds=window),
+    }
+
+
+def install(args, retry_after=True, rows=()):
+    sheets = fakes.FakeSheets(
+        [generate_columns()] + list(rows),
+        latency_ms=args.sheets_latency_ms,
+        quota=args.quota,
+        quota_window_seconds=args.window,
+        retry_after=retry_after,
+    )
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+    return sheets
+
+
+def submit(data_dict):
+    start = time.perf_counter()
+    try:
+        GoogleSheets("credentials.json").add_data(data_dict)
+        return time.perf_counter() - start, None
+    except Exception as e:
+        return time.perf_counter() - start, e
+
+
+def run_burst(args, name, make_scheduler):
+    import random
+
+    sheets = install(args, retry_after=name != "jitter")
+    # The header is read once per container, so it is read before the burst like a warm lambda would have
+    GoogleSheets("credentials.json")
+    sheets_scheduler._SCHEDULER = make_scheduler()
+    sheets.reset_calls()
+
+    rng = random.Random(0)
+    data_dicts = [generate_game(rng) for _ in range(args.submissions)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(submit, data_dicts))
+    elapsed = time.perf_counter() - start
+
+    ok = [seconds for seconds, error in results if error is None]
+    throttled = sum(count for call, count in sheets.calls.items() if call.startswith("429."))
+    p95 = statistics.quantiles(ok, n=20)[18] if len(ok) > 1 else float("nan")
+    p50 = statistics.median(ok) if ok else float("nan")
+    print(
+        f"{name:<12}{len(ok) / len(results):>9.0%}{len(ok) / elapsed:>11.1f}{p50 * 1000:>10.0f}{p95 * 1000:>10.0f}"
+        f"{throttled:>8}{sheets.calls['values.append']:>9}{len(sheets.rows) - 1:>7}"
+    )
+
+
+def run_readers(args, coalesce):
+    sheets = install(args, rows=generate_rows(1000)[0])
+    sheets_scheduler._SCHEDULER = SheetsScheduler(args.quota, args.quota, window_seconds=args.window)
+    stores = [GoogleSheets("credentials.json") for _ in range(args.readers)]
+    if not coalesce:
+        for store in stores:
+            store.written = True
+    sheets.reset_calls()
+
+    barrier = threading.Barrier(args.readers)
+
+    def read(store):
+        barrier.wait()
+        start = time.perf_counter()
+        store.get_all_data()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=args.readers) as executor:
+        seconds = list(executor.map(read, stores))
+    print(
+        f"{'shared' if coalesce else 'separate':<12}{sheets.calls['values.get']:>9}"
+        f"{statistics.median(seconds) * 1000:>10.0f}{max(seconds) * 1000:>10.0f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=120)
+    parser.add_argument("--threads", type=int, default=8, help="Submissions in flight at once")
+    parser.add_argument("--quota", type=int, default=30, help="Reads and writes allowed per window")
+    parser.add_argument("--window", type=float, default=2, help="Seconds the quota is counted over")
+    parser.add_argument("--sheets-latency-ms", type=float, default=20)
+    parser.add_argument("--readers", type=int, default=16, help="Threads reading the sheet at once")
+    args = parser.parse_args()
+
+    print(f"{args.submissions} submissions from {args.threads} threads, quota {args.quota} per {args.window:g}s")
+    print(f"{'mode':<12}{'success':>9}{'games/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'429s':>8}{'appends':>9}{'rows':>7}")
+    for name, make_scheduler in schedulers(args.quota, args.window).items():
+        run_burst(args, name, make_scheduler)
+
+    print(f"\n{args.readers} full reads at once")
+    print(f"{'reads':<12}{'values.get':>9}{'p50 ms':>10}{'max ms':>10}")
+    for coalesce in (False, True):
+        run_readers(args, coalesce)
+
+
+if __name__ == "__main__":
+    main()
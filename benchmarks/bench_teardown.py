@@ -0,0 +1,304 @@
+"""
+Measures infra/destroy_renegade_resources.py against an in-process fake AWS account holding the stacks of several
+branches, then checks that everything was deleted in order.
+
+Usage:
+    python benchmarks/bench_teardown.py [--branches 10] [--objects 2500] [--workers 1 8 16] [--latency-ms 20]
+        [--client-ms 100] [--page-size 100]
+
+Each branch has a REST API and its stage, two functions with their log groups and the event source mapping between the
+queue and one of them, the scores queue and its dead-letter queue, and a bucket of `--objects` objects. Every call takes
+`--latency-ms` and creating a client takes `--client-ms`. The tagging API pages `--page-size` ARNs at a time.
+
+For each number of workers it reports the wall time, the time to the first deletion, the clients created and the calls
+made, after checking that:
+    deleted     every resource is gone and every bucket was empty before it was deleted
+    order       no stage was deleted after its API, and no log group before the function that writes to it
+A `--dry-run` pass is checked to delete nothing and to count every object. It exits non-zero when a check fails.
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "infra"))
+
+import destroy_renegade_resources as teardown
+
+REGION = "us-west-2"
+ACCOUNT = "123456789012"
+TAG_FILTERS = [{"Key": "project", "Values": [teardown.PROJECT_NAME]}]
+
+
+class FakeAccount:
+    """
+    The resources of an account and the services to call them. Errors read like botocore's, IE. "(NoSuchBucket)".
+    """
+
+    def __init__(self, num_branches, num_objects, latency_ms=0, client_ms=0, page_size=100, seed=0):
+        self.latency = latency_ms / 1000
+        self.client_latency = client_ms / 1000
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.calls = Counter()
+        self.clients_created = 0
+        self.first_delete = None
+        self.problems = []
+        self.rest_apis = {}
+        self.functions = set()
+        self.mappings = set()
+        self.log_groups = set()
+        self.queues = set()
+        self.buckets = {}
+        arns = []
+        for branch in range(num_branches):
+            api_id = f"api{branch:04d}"
+            self.rest_apis[api_id] = {"prod"}
+            arns.append(f"arn:aws:apigateway:{REGION}::/restapis/{api_id}")
+            arns.append(f"arn:aws:apigateway:{REGION}::/restapis/{api_id}/stages/prod")
+            for lambda_name in ("ui", "sms"):
+                function = f"catan-tracker-{branch}-{lambda_name}"
+                self.functions.add(function)
+                self.log_groups.add(f"/aws/lambda/{function}")
+                arns.append(f"arn:aws:lambda:{REGION}:{ACCOUNT}:function:{function}")
+                arns.append(f"arn:aws:logs:{REGION}:{ACCOUNT}:log-group:/aws/lambda/{function}")
+            mapping = f"{branch:08d}-0000-0000-0000-000000000000"
+            self.mappings.add(mapping)
+            arns.append(f"arn:aws:lambda:{REGION}:{ACCOUNT}:event-source-mapping:{mapping}")
+            for queue in (f"catan-tracker-{branch}-scores.fifo", f"catan-tracker-{branch}-scores-dlq.fifo"):
+                self.queues.add(queue)
+                arns.append(f"arn:aws:sqs:{REGION}:{ACCOUNT}:{queue}")
+            bucket = f"catan-tracker-{branch}-config"
+            self.buckets[bucket] = {f"messages/{i:06d}.json": ["null"] for i in range(num_objects)}
+            arns.append(f"arn:aws:s3:::{bucket}")
+        # The tagging API does not return the resources of a stack together
+        random.Random(seed).shuffle(arns)
+        self.arns = arns
+        self.deleted = []
+
+    def call(self, name):
+        time.sleep(self.latency)
+        with self.lock:
+            self.calls[name] += 1
+
+    def delete(self, kind, name):
+        with self.lock:
+            if self.first_delete is None:
+                self.first_delete = time.perf_counter()
+            self.deleted.append((kind, name))
+
+    def client(self, service_name):
+        time.sleep(self.client_latency)
+        with self.lock:
+            self.clients_created += 1
+        return {
+            "resourcegroupstaggingapi": FakeTagging,
+            "s3": FakeS3Client,
+            "lambda": FakeLambda,
+            "apigateway": FakeApiGateway,
+            "logs": FakeLogs,
+            "sqs": FakeSqs,
+        }[service_name](self)
+
+    def remaining(self):
+        return (
+            len(self.rest_apis)
+            + sum(len(stages) for stages in self.rest_apis.values())
+            + len(self.functions)
+            + len(self.mappings)
+            + len(self.log_groups)
+            + len(self.queues)
+            + len(self.buckets)
+        )
+
+
+class FakeService:
+    def __init__(self, account):
+        self.account = account
+
+
+class FakeTagging(FakeService):
+    def get_resources(self, TagFilters, PaginationToken=None):
+        self.account.call("get_resources")
+        start = int(PaginationToken or 0)
+        end = start + self.account.page_size
+        page = self.account.arns[start:end]
+        token = str(end) if end < len(self.account.arns) else ""
+        return {"ResourceTagMappingList": [{"ResourceARN": arn} for arn in page], "PaginationToken": token}
+
+
+class FakeS3Client(FakeService):
+    def _bucket(self, bucket):
+        if bucket not in self.account.buckets:
+            raise Exception(f"An error occurred (NoSuchBucket): {bucket}")
+        return self.account.buckets[bucket]
+
+    def list_object_versions(self, Bucket, MaxKeys=1000, KeyMarker="", VersionIdMarker=""):
+        self.account.call("list_object_versions")
+        with self.account.lock:
+            keys = sorted(key for key in self._bucket(Bucket) if key > KeyMarker)
+        page = keys[:MaxKeys]
+        response = {"Versions": [{"Key": key, "VersionId": "null"} for key in page], "IsTruncated": len(keys) > MaxKeys}
+        if response["IsTruncated"]:
+            response.update(NextKeyMarker=page[-1], NextVersionIdMarker="null")
+        return response
+
+    def delete_objects(self, Bucket, Delete):
+        self.account.call("delete_objects")
+        if len(Delete["Objects"]) > 1000:
+            raise Exception("An error occurred (MalformedXML): more than 1000 keys")
+        with self.account.lock:
+            objects = self._bucket(Bucket)
+            for obj in Delete["Objects"]:
+                objects.pop(obj["Key"], None)
+        return {}
+
+    def delete_bucket(self, Bucket):
+        self.account.call("delete_bucket")
+        with self.account.lock:
+            if self._bucket(Bucket):
+                raise Exception(f"An error occurred (BucketNotEmpty): {Bucket}")
+            del self.account.buckets[Bucket]
+        self.account.delete("bucket", Bucket)
+
+
+class FakeLambda(FakeService):
+    def delete_function(self, FunctionName):
+        self.account.call("delete_function")
+        with self.account.lock:
+            if FunctionName not in self.account.functions:
+                raise Exception(f"An error occurred (ResourceNotFoundException): {FunctionName}")
+            self.account.functions.remove(FunctionName)
+        self.account.delete("function", FunctionName)
+
+    def delete_event_source_mapping(self, UUID):
+        self.account.call("delete_event_source_mapping")
+        with self.account.lock:
+            self.account.mappings.discard(UUID)
+        self.account.delete("event_source_mapping", UUID)
+
+
+class FakeApiGateway(FakeService):
+    def delete_stage(self, restApiId, stageName):
+        self.account.call("delete_stage")
+        with self.account.lock:
+            if restApiId not in self.account.rest_apis:
+                self.account.problems.append(f"order: stage {restApiId}/{stageName} deleted after its API")
+                raise Exception(f"An error occurred (NotFoundException): {restApiId}")
+            self.account.rest_apis[restApiId].discard(stageName)
+        self.account.delete("stage", f"{restApiId}/{stageName}")
+
+    def delete_rest_api(self, restApiId):
+        self.account.call("delete_rest_api")
+        with self.account.lock:
+            # Deleting an API deletes its stages, the order check is in delete_stage
+            self.account.rest_apis.pop(restApiId)
+        self.account.delete("rest_api", restApiId)
+
+
+class FakeLogs(FakeService):
+    def delete_log_group(self, logGroupName):
+        self.account.call("delete_log_group")
+        with self.account.lock:
+            function = logGroupName[len("/aws/lambda/") :]
+            if function in self.account.functions:
+                self.account.problems.append(f"order: {logGroupName} deleted before its function")
+            self.account.log_groups.remove(logGroupName)
+        self.account.delete("log_group", logGroupName)
+
+
+class FakeSqs(FakeService):
+    def get_queue_url(self, QueueName):
+        self.account.call("get_queue_url")
+        if QueueName not in self.account.queues:
+            raise Exception(f"An error occurred (AWS.SimpleQueueService.NonExistentQueue): {QueueName}")
+        return {"QueueUrl": f"https://sqs.{REGION}.amazonaws.com/{ACCOUNT}/{QueueName}"}
+
+    def delete_queue(self, QueueUrl):
+        self.account.call("delete_queue")
+        with self.account.lock:
+            self.account.queues.remove(QueueUrl.split("/")[-1])
+        self.account.delete("queue", QueueUrl.split("/")[-1])
+
+
+def new_client_per_call(account):
+    """The way the script used to get its clients, IE. boto3.client(service) for every resource"""
+    return account.client
+
+
+def run(args, workers, dry_run=False, cached=True):
+    account = FakeAccount(args.branches, args.objects, args.latency_ms, args.client_ms, args.page_size)
+    total, objects = len(account.arns), args.branches * args.objects
+    get_client = CachedClients(account) if cached else new_client_per_call(account)
+
+    start = time.perf_counter()
+    results, skipped = teardown.destroy(get_client, TAG_FILTERS, workers, dry_run)
+    elapsed = time.perf_counter() - start
+
+    problems = list(account.problems) + [f"skipped {arn}" for arn in skipped]
+    actions = Counter(result["action"] for result in results)
+    problems += [f"failed {result['arn']}: {result['error']}" for result in results if result["action"] == "failed"]
+    if len(results) != total:
+        problems.append(f"{len(results)} results for {total} resources")
+    if dry_run:
+        if account.remaining() != total or account.deleted:
+            problems.append(f"the dry run deleted {len(account.deleted)} resources")
+        counted = sum(result.get("objects", 0) for result in results)
+        if counted != objects:
+            problems.append(f"the dry run counted {counted} objects, not {objects}")
+    elif account.remaining():
+        problems.append(f"{account.remaining()} resources are left")
+
+    first = (account.first_delete - start) * 1000 if account.first_delete else float("nan")
+    label = f"{workers}{'' if cached else ' (client per resource)'}{' dry run' if dry_run else ''}"
+    print(
+        f"{label:<30}{elapsed:>9.2f}{first:>12.0f}{account.clients_created:>9}{sum(account.calls.values()):>8}"
+        f"{account.calls['delete_objects']:>9}  "
+        + ", ".join(f"{action} {count}" for action, count in sorted(actions.items()))
+    )
+    for problem in problems[:5]:
+        print(f"        {problem}")
+    return problems
+
+
+class CachedClients(teardown.Clients):
+    """The script's Clients, creating the fake account's clients instead of boto3's"""
+
+    def __init__(self, account):
+        super().__init__()
+        self.account = account
+
+    def __call__(self, service_name):
+        with self.lock:
+            if service_name not in self.clients:
+                self.clients[service_name] = self.account.client(service_name)
+            return self.clients[service_name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--branches", type=int, default=10)
+    parser.add_argument("--objects", type=int, default=2500, help="Objects in each bucket")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency of every call")
+    parser.add_argument("--client-ms", type=float, default=100, help="Time to create a client")
+    parser.add_argument("--page-size", type=int, default=100, help="ARNs in a page of the tagging API")
+    args = parser.parse_args()
+
+    resources = len(FakeAccount(args.branches, 0).arns)
+    print(f"{resources} resources and {args.branches * args.objects} objects in {args.branches} branches")
+    print(f"{'workers':<30}{'seconds':>9}{'first ms':>12}{'clients':>9}{'calls':>8}{'batches':>9}  results")
+    problems = run(args, args.workers[0], cached=False)
+    for workers in args.workers:
+        problems += run(args, workers)
+    problems += run(args, args.workers[-1], dry_run=True)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+In-process stand-ins for the Google Sheets and AWS APIs the lambdas use, so they can run and be measured without
+Google or AWS. Every fake counts its calls and can add a fixed latency to each one to model the network.
+
+    sheets, s3, sns = FakeSheets(), FakeS3(), FakeSNS()
+    install(sheets, s3, sns)
+
+`install` hands the fake Sheets service to catan_core's GoogleSheets and makes `boto3.client` return the fake S3 and
+SNS clients.
+"""
+
+import hashlib
+import io
+import re
+import threading
+import time
+from collections import Counter, deque
+from datetime import date, timedelta
+
+A1_PATTERN = re.compile(
+    r"^(?:(?P<sheet>[^!]+)!)?(?P<start_col>[A-Z]*)(?P<start_row>\d*)(?::(?P<end_col>[A-Z]*)(?P<end_row>\d*))?$"
+)
+SHEETS_EPOCH = date(1899, 12, 30)
+
+
+def column_number(name):
+    n = 0
+    for c in name:
+        n = n * 26 + 1 + ord(c) - ord("A")
+    return n
+
+
+def column_name(n):
+    result = ""
+    while n > 0:
+        result += chr((n - 1) % 26 + ord("A"))
+        n = (n - 1) // 26
+    return result[::-1]
+
+
+class FakeAPI:
+    """Base for the fakes. Counts calls, adds latency and serializes access to the stored data."""
+
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.bytes_sent = 0
+        self.lock = threading.Lock()
+
+    def _call(self, name, func, sent=0):
+        with self.lock:
+            self.calls[name] += 1
+            self.bytes_sent += sent
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            return func()
+
+    def reset_calls(self):
+        with self.lock:
+            self.calls = Counter()
+            self.bytes_sent = 0
+
+
+class _Request:
+    """What the Google API client returns from a method, the call only happens on execute()"""
+
+    def __init__(self, api, name, func, sent=0):
+        self.api, self.name, self.func, self.sent = api, name, func, sent
+
+    def execute(self):
+        return self.api._call(self.name, self.func, self.sent)
+
+
+class FakeResponse(dict):
+    """The httplib2.Response on a googleapiclient HttpError: the headers, with the status as an attribute"""
+
+    def __init__(self, status, headers=None):
+        super().__init__(headers or {})
+        self.status = status
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, headers=None):
+        super().__init__(f"<HttpError {status} \"Quota exceeded for quota metric 'Requests'\">")
+        self.resp = FakeResponse(status, headers)
+
+
+READ_CALLS = {"values.get", "values.batchGet", "spreadsheets.get"}
+
+
+class FakeSheets(FakeAPI):
+    """
+    Stands in for the `spreadsheets()` resource of the Sheets API: values().get/append/update/batchGet, get and
+    batchUpdate with the appendDimension, updateCells and appendCells requests. Cells are stored as the formatted
+    strings the API would return.
+
+    With a `quota`, reads and writes are each limited to that many requests per `quota_window_seconds`, the way Sheets
+    limits them per minute. A request over it fails with a 429 that says when to retry, unless `retry_after` is False.
+    Rejected requests are counted as `429.<call>`.
+    """
+
+    def __init__(
+        self, rows=None, sheet_name="Sheet1", latency_ms=0, quota=None, quota_window_seconds=60, retry_after=True
+    ):
+        super().__init__(latency_ms)
+        self.sheet_name = sheet_name
+        self.rows = [list(row) for row in rows or []]
+        self.quota = quota
+        self.quota_window = quota_window_seconds
+        self.retry_after = retry_after
+        self.requests = {"read": deque(), "write": deque()}
+
+    def _check_quota(self, name):
+        kind = "read" if name in READ_CALLS else "write"
+        now = time.monotonic()
+        with self.lock:
+            requests = self.requests[kind]
+            while requests and requests[0] <= now - self.quota_window:
+                requests.popleft()
+            if len(requests) < self.quota:
+                requests.append(now)
+                return
+            self.calls[f"429.{name}"] += 1
+            retry_after = requests[0] + self.quota_window - now
+        raise FakeHttpError(429, {"retry-after": f"{retry_after:.3f}"} if self.retry_after else None)
+
+    def _call(self, name, func, sent=0):
+        if self.quota is not None:
+            self._check_quota(name)
+        return super()._call(name, func, sent)
+
+    # Grid helpers
+    def _last_row(self):
+        for i in range(len(self.rows) - 1, -1, -1):
+            if any(self.rows[i]):
+                return i + 1
+        return 0
+
+    def _last_col(self):
+        return max((len(self._trim(row)) for row in self.rows), default=0)
+
+    @staticmethod
+    def _trim(row):
+        row = list(row)
+        while row and not row[-1]:
+            row.pop()
+        return row
+
+    def _write(self, row_index, col_index, values):
+        while len(self.rows) <= row_index:
+            self.rows.append([])
+        row = self.rows[row_index]
+        while len(row) < col_index + len(values):
+            row.append("")
+        for i, value in enumerate(values):
+            row[col_index + i] = "" if value is None else str(value)
+
+    def _parse_range(self, range_name):
+        match = A1_PATTERN.match(range_name)
+        start_row = int(match.group("start_row")) - 1 if match.group("start_row") else 0
+        start_col = column_number(match.group("start_col")) - 1 if match.group("start_col") else 0
+        end_row = int(match.group("end_row")) if match.group("end_row") else None
+        end_col = column_number(match.group("end_col")) if match.group("end_col") else None
+        if match.group("end_row") is None and match.group("end_col") is None:
+            # A single cell
+            end_row, end_col = start_row + 1, start_col + 1
+        return start_row, start_col, end_row, end_col
+
+    def _append(self, rows):
+        last_row = self._last_row()
+        table_range = f"{self.sheet_name}!A1:{column_name(max(self._last_col(), 1))}{last_row}" if last_row else None
+        for i, values in enumerate(rows):
+            self._write(last_row + i, 0, values)
+        width = column_name(max(len(values) for values in rows)) if rows else "A"
+        result = {
+            "updates": {
+                "updatedRange": f"{self.sheet_name}!A{last_row + 1}:{width}{last_row + len(rows)}",
+                "updatedRows": len(rows),
+            }
+        }
+        if table_range:
+            result["tableRange"] = table_range
+        return result
+
+    @staticmethod
+    def _formatted(cell):
+        """The formatted value the API returns for a CellData written by appendCells or updateCells"""
+        value = cell.get("userEnteredValue", {})
+        if "numberValue" in value:
+            number = value["numberValue"]
+            if cell.get("userEnteredFormat", {}).get("numberFormat", {}).get("type") == "DATE":
+                day = SHEETS_EPOCH + timedelta(days=number)
+                return f"{day.month}/{day.day}/{day.year}"
+            return str(int(number)) if float(number).is_integer() else str(number)
+        return str(next(iter(value.values()), ""))
+
+    # Sheets API surface
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range=None, fields=None, **kwargs):
+        if range is None:
+            properties = {"sheetId": 0, "title": self.sheet_name}
+            return _Request(self, "spreadsheets.get", lambda: {"sheets": [{"properties": properties}]})
+
+        def get_values():
+            start_row, start_col, end_row, end_col = self._parse_range(range)
+            rows = [self._trim(row[start_col:end_col]) for row in self.rows[start_row:end_row]]
+            while rows and not rows[-1]:
+                rows.pop()
+            result = {"range": range, "majorDimension": "ROWS"}
+            if rows:
+                result["values"] = rows
+            return result
+
+        return _Request(self, "values.get", get_values)
+
+    def batchGet(self, spreadsheetId, ranges, **kwargs):
+        def batch_get():
+            return {"valueRanges": [self.get(spreadsheetId, range=r).func() for r in ranges]}
+
+        return _Request(self, "values.batchGet", batch_get)
+
+    def append(self, spreadsheetId, range, body, **kwargs):
+        return _Request(self, "values.append", lambda: self._append(body.get("values", [])), len(str(body)))
+
+    def update(self, spreadsheetId, range, body, **kwargs):
+        def update_values():
+            start_row, start_col, _, _ = self._parse_range(range.split("!")[-1])
+            for i, values in enumerate(body.get("values", [])):
+                self._write(start_row + i, start_col, values)
+            return {"updatedRange": range}
+
+        return _Request(self, "values.update", update_values, len(str(body)))
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        def batch_update():
+            replies = []
+            for request in body["requests"]:
+                if "updateCells" in request:
+                    update = request["updateCells"]
+                    for i, row in enumerate(update["rows"]):
+                        values = [self._formatted(cell) for cell in row.get("values", [])]
+                        self._write(update["start"]["rowIndex"] + i, update["start"]["columnIndex"], values)
+                elif "appendCells" in request:
+                    rows = request["appendCells"]["rows"]
+                    self._append([[self._formatted(cell) for cell in row.get("values", [])] for row in rows])
+                replies.append({})
+            return {"spreadsheetId": spreadsheetId, "replies": replies}
+
+        return _Request(self, "spreadsheets.batchUpdate", batch_update, len(str(body)))
+
+
+class NoSuchKey(Exception):
+    def __init__(self, key):
+        super().__init__(f"An error occurred (NoSuchKey) when calling the GetObject operation: {key} does not exist.")
+
+
+class NotModified(Exception):
+    def __init__(self):
+        super().__init__("An error occurred (304) when calling the GetObject operation: Not Modified")
+
+
+class FakeS3(FakeAPI):
+    """Stands in for the boto3 S3 client: get_object (with IfNoneMatch), put_object and list_objects_v2"""
+
+    def __init__(self, latency_ms=0):
+        super().__init__(latency_ms)
+        self.objects = {}
+
+    @staticmethod
+    def _etag(body):
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        body = Body.encode() if isinstance(Body, str) else Body
+
+        def put():
+            self.objects[(Bucket, Key)] = body
+            return {"ETag": self._etag(body)}
+
+        return self._call("s3.put_object", put, len(body))
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        def get():
+            if (Bucket, Key) not in self.objects:
+                raise NoSuchKey(Key)
+            body = self.objects[(Bucket, Key)]
+            if IfNoneMatch == self._etag(body):
+                raise NotModified()
+            return {"Body": io.BytesIO(body), "ETag": self._etag(body)}
+
+        return self._call("s3.get_object", get)
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, StartAfter="", **kwargs):
+        def list_objects():
+            keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix) and k > StartAfter)
+            result = {"KeyCount": min(len(keys), MaxKeys), "IsTruncated": len(keys) > MaxKeys}
+            if keys:
+                result["Contents"] = [{"Key": k} for k in keys[:MaxKeys]]
+            return result
+
+        return self._call("s3.list_objects_v2", list_objects)
+
+
+class FakeSNS(FakeAPI):
+    """Stands in for the boto3 SNS client. Published messages are kept in `messages`."""
+
+    def __init__(self, latency_ms=0):
+        super().__init__(latency_ms)
+        self.messages = []
+
+    def publish(self, TopicArn, Message, **kwargs):
+        def publish():
+            self.messages.append(Message)
+            return {"MessageId": str(len(self.messages))}
+
+        return self._call("sns.publish", publish, len(Message))
+
+
+def install(sheets, s3, sns):
+    """
+    Points catan_core and the lambdas at the fakes. boto3 still has to be importable, only its `client` function is
+    replaced. Creating a client is counted as a `client.<service>` call of its fake. The cached AWS clients, Sheets
+    header and sheet ids are cleared since they belong to whatever fakes were used before.
+    The Sheets scheduler is replaced with one whose buckets match the quota of the fake Sheets, or that has no buckets
+    if the fake has no quota.
+    """
+    import boto3
+    from catan_core import aws, sheets_scheduler, storage
+
+    clients = {"s3": s3, "sns": sns}
+
+    def client(service_name, *args, **kwargs):
+        fake = clients[service_name]
+        with fake.lock:
+            fake.calls[f"client.{service_name}"] += 1
+        return fake
+
+    boto3.client = client
+    aws._CLIENTS.clear()
+    storage.get_sheets_service = lambda credentials_filepath: sheets
+    storage._SHEETS_COLUMNS.clear()
+    storage._SHEET_IDS.clear()
+    sheets_scheduler._SCHEDULER = sheets_scheduler.SheetsScheduler(
+        sheets.quota, sheets.quota, window_seconds=sheets.quota_window
+    )
+
+
+def api_calls(*fakes):
+    calls = Counter()
+    for fake in fakes:
+        calls.update(fake.calls)
+    return calls
@@ -0,0 +1,185 @@
+"""
+Runs a single lambda invocation in a fresh interpreter, the way a Lambda cold start would, and prints its timings as
+JSON. It is started by bench_cold_start.py once per route so that nothing is already imported.
+
+Every library is imported and set up for real, so import and client construction costs are measured. Only the network
+is replaced: botocore requests are answered from a `before-send` handler and the Google API client is given an
+in-process http object. No AWS or Google credentials are needed.
+
+Usage:
+    python benchmarks/lambda_runner.py <interface> <route>
+"""
+
+import importlib.abc
+import importlib.machinery
+import json
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+
+EVENTS = {
+    "ui_interface": {
+        "GET /": {"path": "/", "httpMethod": "GET", "headers": {"cookie": "CT_CR=token"}, "body": None},
+        "GET /messages": {
+            "path": "/messages",
+            "httpMethod": "GET",
+            "headers": {"cookie": "CT_CR=token"},
+            "queryStringParameters": None,
+            "body": None,
+        },
+        "POST /login": {"path": "/login", "httpMethod": "POST", "headers": {}, "body": '{"credential": "token"}'},
+        "POST /send": {
+            "path": "/send",
+            "httpMethod": "POST",
+            "headers": {},
+            "body": '{"message": "Jess by 5. Seafarers. Raining"}',
+        },
+    },
+    "sms_interface": {
+        "SNS": {"Records": [{"Sns": {"Message": "Jess by 5. Seafarers. Raining"}}]},
+    },
+}
+
+ENVIRONMENT = {
+    "CONFIG_BUCKET": "catan-tracker-local",
+    "MESSAGES_KEY": "local/messages.json",
+    "MESSAGES_PREFIX": "local/messages/",
+    "AGGREGATES_KEY": "local/aggregates.json",
+    "APPLIED_KEYS_KEY": "local/applied_keys.json",
+    "HISTORY_SNAPSHOT_KEY": "local/history.npz",
+    "GROUPS_PREFIX": "local/groups/",
+    "SNS_TOPIC_ARN": "arn:aws:sns:us-west-2:000000000000:catan-tracker-local",
+    "AWS_DEFAULT_REGION": "us-west-2",
+    "AWS_ACCESS_KEY_ID": "local",
+    "AWS_SECRET_ACCESS_KEY": "local",
+}
+
+HEADER = ["Game date", "Winner", "Score difference", "Game", "Raining?"]
+
+
+class _RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def _aws_response(request, **kwargs):
+    """Answers botocore requests in process. S3 is always empty, everything else succeeds."""
+    from botocore.awsrequest import AWSResponse
+
+    if request.method == "GET" and "list-type=2" in request.url:
+        body = b"<ListBucketResult><KeyCount>0</KeyCount><IsTruncated>false</IsTruncated></ListBucketResult>"
+        return AWSResponse(request.url, 200, {}, _RawBody(body))
+    if request.method == "GET" and ".s3." in request.url:
+        body = b"<Error><Code>NoSuchKey</Code><Message>The specified key does not exist.</Message></Error>"
+        return AWSResponse(request.url, 404, {}, _RawBody(body))
+    if "sns." in request.url:
+        body = b"<PublishResponse><PublishResult><MessageId>local</MessageId></PublishResult></PublishResponse>"
+        return AWSResponse(request.url, 200, {}, _RawBody(body))
+    return AWSResponse(request.url, 200, {}, _RawBody(b""))
+
+
+class _SheetsHttp:
+    """Stands in for httplib2.Http underneath the Google API client"""
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        import httplib2
+
+        if ":append" in uri:
+            content = {"updates": {"updatedRange": "Sheet1!A2:E2"}}
+        elif ":batchUpdate" in uri:
+            content = {"replies": []}
+        elif re.search(r"/values/[^/?]*1%3A1", uri) or re.search(r"/values/[^/?]*!1:1", uri):
+            content = {"values": [HEADER]}
+        elif "/values/" in uri:
+            content = {"values": [["1/1/2024", "Jess", "5", "Seafarers", "Yes"]]}
+        else:
+            content = {"sheets": [{"properties": {"sheetId": 0, "title": "Sheet1"}}]}
+        return httplib2.Response({"status": "200"}), json.dumps(content).encode()
+
+
+def _patch_boto3(module):
+    original_client = module.client
+
+    def client(*args, **kwargs):
+        service_client = original_client(*args, **kwargs)
+        service_client.meta.events.register("before-send", _aws_response)
+        return service_client
+
+    module.client = client
+
+
+def _patch_discovery(module):
+    original_build = module.build
+
+    def build(*args, credentials=None, http=None, **kwargs):
+        return original_build(*args, http=_SheetsHttp(), **kwargs)
+
+    module.build = build
+
+
+PATCHES = {"boto3": _patch_boto3, "googleapiclient.discovery": _patch_discovery}
+
+
+class _PatchOnImport(importlib.abc.MetaPathFinder):
+    """Patches the network out of a module right after it is imported, so the import itself is still timed"""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname not in PATCHES:
+            return None
+        spec = importlib.machinery.PathFinder.find_spec(fullname, path)
+        if spec is None:
+            return None
+        exec_module = spec.loader.exec_module
+
+        def patched_exec_module(module):
+            exec_module(module)
+            PATCHES[fullname](module)
+
+        spec.loader.exec_module = patched_exec_module
+        return spec
+
+
+def run(interface, route):
+    sys.meta_path.insert(0, _PatchOnImport())
+    os.environ.update(ENVIRONMENT)
+    interface_path = PROJECT_PATH / "src" / interface
+    os.chdir(interface_path)
+    # catan_core comes from the lambda layer, which Lambda puts on the path as /opt/python
+    sys.path.insert(0, str(PROJECT_PATH / "src"))
+    sys.path.insert(0, str(interface_path))
+
+    modules_before = set(sys.modules)
+    start = time.perf_counter()
+    import lambda_function
+
+    imported = time.perf_counter()
+    modules_at_import = set(sys.modules)
+
+    # Keep the handler's own prints out of the JSON result
+    stdout, sys.stdout = sys.stdout, open(os.devnull, "w")
+    try:
+        lambda_function.lambda_handler(EVENTS[interface][route], None)
+    finally:
+        sys.stdout = stdout
+    invoked = time.perf_counter()
+
+    return {
+        "interface": interface,
+        "route": route,
+        "import_ms": (imported - start) * 1000,
+        "first_invocation_ms": (invoked - imported) * 1000,
+        "total_ms": (invoked - start) * 1000,
+        "modules_at_import": len(modules_at_import - modules_before),
+        "modules_after_invocation": len(set(sys.modules) - modules_before),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(sys.argv[1], sys.argv[2])))
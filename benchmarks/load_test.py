@@ -0,0 +1,255 @@
+"""
+Submits scores to both lambda_handlers at once against the in-process fakes, then checks that nothing was lost.
+
+A mix of messages is replayed at each concurrency: well formed games, games with a condition the sheet has no column
+for yet, games whose name has not been played before, and malformed messages. Half of them go to POST /send of the ui
+lambda and half to the sms lambda, unless --target picks one. The report has the throughput and the p50/p95/p99 latency,
+and then the checks of the final state:
+
+    rows        every accepted game is in the sheet exactly once, and the history that was there is untouched
+    header      every column is in the header exactly once, IE. two new conditions did not take the same column
+    messages    every submission to /send is in the message log once, with the reply next to it
+    replies     every sms submission was replied to once
+    aggregates  the S3 aggregates count the games in the rows they say they cover. Aggregates left behind the sheet
+                by a save that lost the race are fine, the next game rebuilds them.
+
+Usage:
+    python benchmarks/load_test.py [--submissions 400] [--concurrency 1 8 32] [--target both|ui|sms]
+        [--mix valid=0.7,new_condition=0.1,new_game=0.1,malformed=0.1] [--history 1000]
+        [--sheets-latency-ms 20] [--s3-latency-ms 5] [--quota 0] [--seed 0]
+
+The invocations run on threads of this process, so they share the module level caches the way concurrent invocations
+in one warm container would, and the fakes serialize their own state the way the APIs do. The `reads` column counts the
+reads of the sheet, which go up when the aggregates are rebuilt after a save lost the race. It exits non-zero when a
+check fails.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from bench_handlers import load_lambda
+from bench_parser import malform
+from catan_core import MessageParseError, MessageParser
+from catan_core.backends import get_stats_store
+from lambda_runner import ENVIRONMENT
+from synthetic import generate_message, generate_rows
+
+NEW_CONDITIONS = ["Snowing", "Power out", "Birthday", "Tournament", "Outdoors"]
+NEW_GAMES = ["Catan Junior", "Star Trek Catan", "Rivals for Catan", "Catan Dice"]
+DEFAULT_MIX = "valid=0.7,new_condition=0.1,new_game=0.1,malformed=0.1"
+
+
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        kind, weight = part.split("=")
+        if kind not in ("valid", "new_condition", "new_game", "malformed"):
+            raise Exception(f"Unknown kind of message {kind}")
+        weights[kind] = float(weight)
+    return weights
+
+
+def generate_submissions(num_submissions, mix, target, seed):
+    """
+    Returns:
+        list: (target, kind, message) for each submission
+    """
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    submissions = []
+    for i in range(num_submissions):
+        kind = rng.choices(kinds, weights)[0]
+        message = generate_message(rng)
+        if kind == "new_condition":
+            message = f"{message}. {rng.choice(NEW_CONDITIONS)}"
+        elif kind == "new_game":
+            winner_and_score = message.split(".")[0]
+            message = f"{winner_and_score}. {rng.choice(NEW_GAMES)}"
+        elif kind == "malformed":
+            message = malform(rng, message)
+        submission_target = target if target != "both" else ("ui" if i % 2 == 0 else "sms")
+        submissions.append((submission_target, kind, message))
+    return submissions
+
+
+def ui_event(message):
+    return {"path": "/send", "httpMethod": "POST", "headers": {}, "body": json.dumps({"message": message})}
+
+
+def sms_event(message):
+    return {"Records": [{"Sns": {"Message": message}}]}
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))] if values else float("nan")
+
+
+def row_key(values):
+    """A game as the set of its non blank cells, so rows compare regardless of column order"""
+    return frozenset((column, value) for column, value in values.items() if value not in (None, ""))
+
+
+def check(sheets, s3, sns, history_rows, columns, submissions, replies):
+    """
+    Returns:
+        tuple: ({check name: list of problems}, the last row the aggregates cover)
+    """
+    problems = {"rows": [], "header": [], "messages": [], "replies": [], "aggregates": []}
+    parser = MessageParser()
+
+    header = sheets.rows[0]
+    for column, count in Counter(header).items():
+        if count > 1:
+            problems["header"].append(f"{column!r} is in the header {count} times")
+    expected_columns = set(columns)
+    for _, kind, message in submissions:
+        try:
+            expected_columns.update(parser.parse(message))
+        except MessageParseError:
+            pass
+    for column in sorted(expected_columns - set(header)):
+        problems["header"].append(f"{column!r} is missing from the header")
+
+    # The history that was in the sheet before, compared cell by cell
+    for i, row in enumerate(history_rows):
+        actual = fakes.FakeSheets._trim(sheets.rows[i + 1]) if i + 1 < len(sheets.rows) else []
+        if actual != row:
+            problems["rows"].append(f"Row {i + 2} of the history changed from {row} to {actual}")
+
+    expected = Counter()
+    for _, _, message in submissions:
+        try:
+            expected[row_key(parser.parse(message))] += 1
+        except MessageParseError:
+            pass
+    actual = Counter(row_key(dict(zip(header, row))) for row in sheets.rows[len(history_rows) + 1 :] if any(row))
+    for key, count in (expected - actual).items():
+        problems["rows"].append(f"Lost {count}x {dict(key)}")
+    for key, count in (actual - expected).items():
+        problems["rows"].append(f"Unexpected {count}x {dict(key)}")
+
+    # The message log has one object per /send with the message and its reply
+    prefix = os.environ["MESSAGES_PREFIX"]
+    logged = Counter()
+    for (bucket, key), body in list(s3.objects.items()):
+        if key.startswith(prefix) and key.endswith(".json"):
+            messages = json.loads(body)
+            if len(messages) != 2 or messages[1]["who"] != "receiver" or not messages[1]["body"]:
+                problems["messages"].append(f"{key} does not have a message and its reply: {messages}")
+            logged[messages[0]["body"]] += 1
+    sent = Counter(message for target, _, message in submissions if target == "ui")
+    for message, count in (sent - logged).items():
+        problems["messages"].append(f"Missing {count}x {message!r} from the message log")
+    for message, count in (logged - sent).items():
+        problems["messages"].append(f"{count} extra {message!r} in the message log")
+
+    sms_sent = sum(target == "sms" for target, _, _ in submissions)
+    if len(sns.messages) != sms_sent:
+        problems["replies"].append(f"{len(sns.messages)} sms replies for {sms_sent} sms submissions")
+    for (target, _, message), reply in zip(submissions, replies):
+        if reply is None:
+            problems["replies"].append(f"{target} {message!r} failed without a reply")
+
+    aggregates = get_stats_store().load()
+    covered = [dict(zip(header, row)) for row in sheets.rows[1 : aggregates.last_row]]
+    wins = dict(Counter(row.get("Winner") for row in covered if row.get("Winner")))
+    counted = {winner: count for winner, count in aggregates.overall.items() if count}
+    if wins != counted:
+        problems["aggregates"].append(f"The aggregates count {counted} in rows 2 to {aggregates.last_row}, not {wins}")
+    return problems, aggregates.last_row
+
+
+def run(args, ui, sms, concurrency, submissions):
+    history_rows, columns = generate_rows(args.history, seed=args.seed)
+    sheets = fakes.FakeSheets([columns] + history_rows, latency_ms=args.sheets_latency_ms, quota=args.quota or None)
+    s3, sns = fakes.FakeS3(latency_ms=args.s3_latency_ms), fakes.FakeSNS(latency_ms=args.s3_latency_ms)
+    fakes.install(sheets, s3, sns)
+    # Each concurrency starts from a cold container, the history snapshot kept in memory is for the previous sheet
+    ui.analytics._SNAPSHOTS.clear()
+
+    def submit(submission):
+        target, _, message = submission
+        if target == "ui":
+            handler, event = ui.lambda_handler, ui_event(message)
+        else:
+            handler, event = sms.lambda_handler, sms_event(message)
+        start = time.perf_counter()
+        try:
+            result = handler(event, None)
+            reply = result["body"] if target == "ui" else result
+        except Exception as e:
+            reply = None
+            print(f"{target} {message!r} raised {e.__class__.__name__}: {e}", file=sys.stderr)
+        return time.perf_counter() - start, reply
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(submit, submissions))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds * 1000 for seconds, _ in results]
+    replies = [reply for _, reply in results]
+    problems, aggregates_row = check(sheets, s3, sns, history_rows, columns, submissions, replies)
+    throttled = sum(count for call, count in sheets.calls.items() if call.startswith("429."))
+    print(
+        f"{concurrency:>6}{len(submissions) / elapsed:>10.1f}{statistics.median(latencies):>9.0f}"
+        f"{percentile(latencies, 95):>9.0f}{percentile(latencies, 99):>9.0f}{throttled:>7}"
+        f"{sheets.calls['values.get']:>8}{sheets._last_row() - aggregates_row:>9}  "
+        + ", ".join(f"{name}={'ok' if not found else len(found)}" for name, found in problems.items())
+    )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submissions", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--target", choices=["both", "ui", "sms"], default="both")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weights of each kind of message")
+    parser.add_argument("--history", type=int, default=1000, help="Games already in the sheet")
+    parser.add_argument("--sheets-latency-ms", type=float, default=20)
+    parser.add_argument("--s3-latency-ms", type=float, default=5)
+    parser.add_argument("--quota", type=int, default=0, help="Sheets reads and writes per minute, 0 for no quota")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="List every problem found")
+    args = parser.parse_args()
+
+    os.environ.update(ENVIRONMENT)
+    ui, sms = load_lambda("ui_interface"), load_lambda("sms_interface")
+    submissions = generate_submissions(args.submissions, parse_mix(args.mix), args.target, args.seed)
+    kinds = Counter(kind for _, kind, _ in submissions)
+    mix = ", ".join(f"{kind}={count}" for kind, count in sorted(kinds.items()))
+    print(f"{len(submissions)} submissions to {args.target}: {mix}")
+    print(
+        f"{'conc':>6}{'subs/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'429s':>7}{'reads':>8}{'agg lag':>9}  checks"
+    )
+
+    failed = False
+    for concurrency in args.concurrency:
+        problems = run(args, ui, sms, concurrency, submissions)
+        for name, found in problems.items():
+            failed = failed or bool(found)
+            for problem in found[: None if args.verbose else 5]:
+                print(f"        {name}: {problem}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
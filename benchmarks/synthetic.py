@@ -0,0 +1,55 @@
+"""
+Synthetic game history for the benchmarks. Rows look like the ones in the Google Sheet.
+"""
+
+import random
+
+BASE_COLUMNS = ["Game date", "Winner", "Score difference", "Game"]
+GAMES = ["Catan", "Seafarers", "Cities and Knights", "Traders and Barbarians", "Explorers and Pirates"]
+CONDITIONS = ["Raining?", "At home?", "Drinking?", "With friends?", "Late night?", "New board?", "Music on?"]
+WINNERS = ["Jess", "Dan"]
+
+
+def generate_columns():
+    return BASE_COLUMNS + CONDITIONS
+
+
+def generate_game(rng):
+    game = {
+        "Game date": f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/{rng.randint(2018, 2026)}",
+        "Winner": rng.choice(WINNERS),
+        "Score difference": str(rng.randint(1, 8)),
+        "Game": rng.choice(GAMES),
+    }
+    for condition in rng.sample(CONDITIONS, rng.randint(0, 3)):
+        game[condition] = "Yes"
+    return game
+
+
+def generate_rows(num_games, seed=0):
+    """
+    Generates games as rows of cell values, the same shape GoogleSheets.get_all_data returns
+    Args:
+        num_games (int): Number of rows to generate
+        seed (int): Seed for the random generator so that runs are comparable
+    Returns:
+        tuple: (rows, columns)
+    """
+    rng = random.Random(seed)
+    columns = generate_columns()
+    rows = []
+    for _ in range(num_games):
+        game = generate_game(rng)
+        row = [game.get(column, "") for column in columns]
+        # The Sheets API drops empty cells at the end of a row
+        while row and not row[-1]:
+            row.pop()
+        rows.append(row)
+    return rows, columns
+
+
+def generate_message(rng):
+    """A message in the format the lambdas receive. IE. 'Jess by 5. Seafarers. Raining'"""
+    game = generate_game(rng)
+    conditions = [k[:-1] for k in game if k.endswith("?")]
+    return ". ".join([f"{game['Winner']} by {game['Score difference']}", game["Game"]] + conditions)
@@ -7,16 +7,17 @@ projectName=${PWD##*/}
 stateS3Key="${projectName}/prod/state.json"
 awsRegion="${AWS_DEFAULT_REGION:-us-west-2}"
 
-# Zip python dependencies in docker container for Lambda Layer
+# Zip python dependencies and the shared catan_core package in docker container for Lambda Layer
 docker run -it -d --name dummypython python:3.9-slim /bin/bash
 docker cp Pipfile dummypython:/
 docker cp Pipfile.lock dummypython:/
+docker cp src/catan_core dummypython:/
 cat <<EOM | docker exec -i dummypython /bin/bash
 export PIPENV_VENV_IN_PROJECT=1
 apt-get update && apt-get install -y zip
 pip install pipenv
 pipenv install
-mkdir python && cp -r .venv/lib python/
+mkdir python && cp -r .venv/lib python/ && cp -r catan_core python/
 zip -mrqX lambda_layer.zip python -x *__pycache__* .*
 EOM
 docker cp dummypython:lambda_layer.zip infra/lambda_layer.zip
@@ -0,0 +1,49 @@
+"""
+This file is not for the application. It backfills historical games from a file, the same way `POST /import` does,
+without going through API Gateway's time limit.
+
+Usage:
+    python bulk_import.py games.csv
+    python bulk_import.py games.txt --dry-run
+    python bulk_import.py games.txt --group game-night
+
+A .csv file has the sheet's columns as its header. Any other file has one message per line, optionally starting with
+the game date, IE. "1/31/2024 Jess by 5. Seafarers. Raining"
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from lambda_function import get_pipeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the rows")
+    parser.add_argument("--group", help="The group the games are for. The default group when it is not set.")
+    args = parser.parse_args()
+
+    with open(args.path) as f:
+        data = f.read()
+    file_format = "csv" if args.path.lower().endswith(".csv") else "messages"
+
+    set_env_vars.main()
+    # The lambda code finds googlecreds.json relative to where it runs
+    os.chdir(UI_INTERFACE_PATH)
+    report = get_pipeline(args.group).import_games(data, file_format, args.dry_run)
+    print(json.dumps(report, indent=2))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
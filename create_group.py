@@ -0,0 +1,45 @@
+"""
+This file is not for the application. It creates a group of players with its own record: the group is saved under
+GROUPS_PREFIX in the config bucket and gets its own tab in the Google Sheet, with the same header as Sheet1.
+
+Usage:
+    python create_group.py game-night Alice Bob Carol
+
+The group's page is then the usual page with ?group=game-night at the end of the url.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from catan_core import GoogleSheets, S3GroupRegistry, validate_group
+from catan_core.aggregates import IGNORE_COLUMNS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("group_id", help="Lower case letters, digits and dashes")
+    parser.add_argument("players", nargs="+")
+    args = parser.parse_args()
+
+    validate_group(args.group_id, args.players)
+    set_env_vars.main()
+    registry = S3GroupRegistry(os.environ["CONFIG_BUCKET"], os.environ["GROUPS_PREFIX"])
+    # The tab is added first so that a group is never saved without one. Its name is the group id, so adding it also
+    # fails for a group that already exists.
+    # Conditions are added as columns the first time they are played, so the new tab only starts with the fixed ones.
+    credentials_filepath = os.path.join(UI_INTERFACE_PATH, "googlecreds.json")
+    GoogleSheets.add_sheet(credentials_filepath, args.group_id, IGNORE_COLUMNS + ["Game"])
+    group = registry.create(args.group_id, args.players)
+    print(f"Created {group.group_id} for {', '.join(group.players)} in the {group.sheet_name} tab")
+
+
+if __name__ == "__main__":
+    main()
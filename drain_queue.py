@@ -0,0 +1,42 @@
+"""
+This file is not for the application. It writes the games waiting in the write-behind queue to the Google Sheet, the same
+way the queue triggered lambda does, each group's games to its own tab. Use it to drain the local queue directory when
+running with WRITE_BEHIND=true.
+
+Usage:
+    python drain_queue.py [--batch-size 100]
+
+The queue is SQS when SCORE_QUEUE_URL is set, otherwise the SCORE_QUEUE_DIR directory.
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from catan_core import drain
+from lambda_function import get_applied_keys, get_pipeline, get_queue
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    set_env_vars.main()
+    # The lambda code finds googlecreds.json relative to where it runs
+    os.chdir(UI_INTERFACE_PATH)
+    report = drain(get_queue(), get_pipeline, get_applied_keys, args.batch_size)
+    print(json.dumps(report, indent=2))
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+This file is not for the application. It exports the game history to a columnar archive on local disk, split by year,
+so it can be analysed without reading the sheet again. See catan_core/archive.py for the layout.
+
+Usage:
+    python export_archive.py
+    python export_archive.py --path archive/game-night --group game-night
+    python export_archive.py --full
+
+Exporting again only reads the games added since the last export. --full reads the whole history again, which is
+needed after the sheet was edited by hand. The archive is read with catan_core.HistoryArchive, IE.
+
+    from catan_core import HistoryArchive
+    from catan_core.analytics import compute_stats
+
+    compute_stats(HistoryArchive("archive/default").snapshot(["2024"]))
+"""
+
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from catan_core import export_archive, get_group, get_store_factory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--group", help="The group to export. The default group when it is not set.")
+    parser.add_argument("--path", help="The archive's directory. archive/<group id> when it is not set.")
+    parser.add_argument("--full", action="store_true", help="Read the whole history again")
+    args = parser.parse_args()
+
+    set_env_vars.main()
+    group = get_group(args.group)
+    store_factory = get_store_factory(os.path.join(UI_INTERFACE_PATH, "googlecreds.json"), group)
+    report = export_archive(store_factory(), args.path or os.path.join("archive", group.group_id), args.full)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
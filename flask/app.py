@@ -1,5 +1,7 @@
 import os
+import signal
 import sys
+import threading
 import traceback
 from pathlib import Path
 
@@ -7,8 +9,17 @@ from flask import Flask, abort, make_response, render_template, request
 
 PROJECT_PATH = f"{Path(__file__).parent.parent.absolute()}{os.sep}"
 sys.path.insert(1, PROJECT_PATH)
+sys.path.insert(1, f"{PROJECT_PATH}src")
+sys.path.insert(1, f"{PROJECT_PATH}src{os.sep}ui_interface")
 
 import set_env_vars
+
+# The config is resolved once before the lambda code reads it, and again only once it is older than
+# CONFIG_TTL_SECONDS or after a SIGHUP
+set_env_vars.main()
+if threading.current_thread() is threading.main_thread() and hasattr(signal, "SIGHUP"):
+    signal.signal(signal.SIGHUP, lambda signum, frame: set_env_vars.invalidate())
+
 from src.ui_interface.lambda_function import lambda_handler
 
 app = Flask(__name__, static_folder=f"{PROJECT_PATH}frontend")
@@ -38,11 +49,17 @@ def format_event(req):
 @app.route("/", methods=["GET"])
 @app.route("/send", methods=["POST"])
 @app.route("/login", methods=["POST"])
+@app.route("/messages", methods=["GET"])
+@app.route("/import", methods=["POST"])
+@app.route("/stats", methods=["GET"])
 def forward_request():
+    # Only resolved again when the cached config is stale
     set_env_vars.main()
     event = format_event(request)
     handler_response = lambda_handler(event, None)
-    response = make_response(handler_response["body"])
+    response = make_response(
+        handler_response["body"], handler_response["statusCode"], handler_response.get("headers", {})
+    )
     try:
         return response
     except Exception:
@@ -0,0 +1,78 @@
+"""
+This file is not for the application. It serves the UI lambda_handler behind several worker processes, to load test
+the UI path locally.
+
+Usage:
+    python flask/serve.py --workers 4
+    CATAN_CONFIG_FILE=local_config.json python flask/serve.py --workers 8 --port 5001
+
+The app is imported and the config resolved once before the workers are forked, like gunicorn's --preload. Each worker
+then handles one request at a time and keeps its caches between requests, the way a warm lambda container does, so the
+number of workers is the concurrency being tested. `kill -HUP <pid>` makes every worker resolve the config again.
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+
+from app import app
+
+import set_env_vars
+
+
+def serve(fd, host, port):
+    """Runs in a worker. Requests are accepted from the socket all the workers share."""
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGHUP, lambda signum, frame: set_env_vars.invalidate())
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    make_server(host, port, app, threaded=False, fd=fd).serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--backlog", type=int, default=128, help="Connections that can wait for a free worker")
+    parser.add_argument("--access-log", action="store_true", help="Log every request, which slows a load test down")
+    args = parser.parse_args()
+
+    if not args.access_log:
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((args.host, args.port))
+    listener.listen(args.backlog)
+
+    workers = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                serve(listener.fileno(), args.host, args.port)
+            finally:
+                os._exit(0)
+        workers.append(pid)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers, pid {os.getpid()}")
+
+    def forward(signum, frame):
+        for pid in workers:
+            os.kill(pid, signum)
+
+    signal.signal(signal.SIGHUP, forward)
+    signal.signal(signal.SIGTERM, forward)
+    try:
+        for pid in workers:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        # The workers got the same SIGINT from the terminal
+        for pid in workers:
+            os.waitpid(pid, 0)
+
+
+if __name__ == "__main__":
+    main()
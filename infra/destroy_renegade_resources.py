@@ -1,68 +1,346 @@
-import boto3
-
-
-def destroy_resource(arn):
-    service = arn.split(":")[2]
-    service_client = boto3.client(service)
-    if service == "dynamodb":
-        return destroy_dynamodb_table(service_client, arn)
-    elif service == "s3":
-        return destroy_s3_bucket(service_client, arn)
-    elif service == "lambda":
-        return destroy_lambda(service_client, arn)
-    elif service == "logs":
-        return destroy_log_group(service_client, arn)
-    elif service == "apigateway" and "stages" not in arn:
-        return destroy_apigateway(service_client, arn)
-    return False
-
-
-def destroy_lambda(service_client, arn):
-    service_client.delete_function(FunctionName=arn)
-    return True
-
-
-def destroy_apigateway(service_client, arn):
-    rest_api_id = arn.split('/')[-1]
-    service_client.delete_rest_api(restApiId=rest_api_id)
-    return True
-
-
-def destroy_dynamodb_table(service_client, arn):
-    table_name = arn.split("/")[-1]
-    service_client.delete_table(TableName=table_name)
-    return True
-
-
-def destroy_s3_bucket(service_client, arn):
-    bucket_name = arn.split(":")[-1]
-    service_client.delete_bucket(Bucket=bucket_name)
-    return True
-
-
-def destroy_log_group(service_client, arn):
-    name = arn.split(":")[-1]
-    service_client.delete_log_group(logGroupName=name)
-    return True
-
-
-client = boto3.client("resourcegroupstaggingapi")
-kwargs = {"TagFilters": [
-    {"Key": "project", "Values": ["catan-tracker"]},
-    #{"Key": "git_branch", "Values": ["feature/backend-lambda"]}
-]}
-results = []
-while True:
-    response = client.get_resources(**kwargs)
-    results.extend(response["ResourceTagMappingList"])
-    if not response["PaginationToken"]:
-        break
-    kwargs["PaginationToken"] = response["PaginationToken"]
-
-for result in results:
-    arn = result["ResourceARN"]
-    print(f"Destroying {arn}...")
-    if destroy_resource(arn):
-        print(f"Destroyed {arn}")
-    else:
-        print(f"DID NOT DESTROY {arn}")
\ No newline at end of file
+"""
+Deletes every AWS resource tagged with the project, IE. the stacks of feature branches that were never destroyed.
+
+Usage:
+    python infra/destroy_renegade_resources.py --dry-run
+    python infra/destroy_renegade_resources.py --branch feature/backend-lambda --workers 16 --report teardown.json
+    python infra/destroy_renegade_resources.py --endpoint-url http://localhost:4566
+
+Deleting starts while the tagging API is still being listed, on a pool of `--workers` threads that share one client per
+service. A resource that others depend on is deleted first: an API's stages before the API, and a function before its
+log group, so the function can not write the group back. Buckets are emptied with batched delete_objects calls,
+including every object version, before they are deleted. A resource that is already gone counts as deleted.
+
+`--endpoint-url` points every client at a local AWS stand-in such as LocalStack or moto's server.
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import Counter
+
+PROJECT_NAME = "catan-tracker"
+MAX_WORKERS = 8
+# delete_objects takes at most 1000 keys
+DELETE_OBJECTS_BATCH_SIZE = 1000
+# Error codes of a resource that no longer exists
+GONE_ERRORS = (
+    "NoSuchBucket",
+    "ResourceNotFoundException",
+    "NotFoundException",
+    "NonExistentQueue",
+    "QueueDoesNotExist",
+)
+
+
+class Resource:
+    """
+    A tagged resource and where it sits in the teardown order
+        key: Identifies the resource to the resources waiting for it, IE. ("function", name)
+        waits_for: Keys of the resources that have to be deleted first
+    """
+
+    def __init__(self, arn, kind, name, key=None, waits_for=()):
+        self.arn = arn
+        self.kind = kind
+        self.name = name
+        self.key = key
+        self.waits_for = tuple(waits_for)
+
+
+def parse_arn(arn):
+    """
+    Args:
+        arn (str): IE. "arn:aws:lambda:us-west-2:123456789012:function:catan-tracker-ui"
+    Returns:
+        Resource: None when the service is not one this script deletes
+    """
+    parts = arn.split(":", 5)
+    service, resource = parts[2], parts[5]
+    if service == "lambda" and resource.startswith("function:"):
+        name = resource.split(":")[1]
+        return Resource(arn, "function", name, key=("function", name))
+    if service == "lambda" and resource.startswith("event-source-mapping:"):
+        return Resource(arn, "event_source_mapping", resource.split(":")[1])
+    if service == "apigateway" and resource.startswith("/restapis/"):
+        path = resource.split("/")
+        if len(path) == 3:
+            return Resource(arn, "rest_api", path[2], key=("rest_api", path[2]), waits_for=[("stage", path[2])])
+        if len(path) == 5 and path[3] == "stages":
+            return Resource(arn, "stage", f"{path[2]}/{path[4]}", key=("stage", path[2]))
+    if service == "logs" and resource.startswith("log-group:"):
+        name = resource[len("log-group:") :]
+        name = name[:-2] if name.endswith(":*") else name
+        waits_for = []
+        if name.startswith("/aws/lambda/"):
+            waits_for.append(("function", name[len("/aws/lambda/") :]))
+        if name.startswith("API-Gateway-Execution-Logs_"):
+            waits_for.append(("rest_api", name[len("API-Gateway-Execution-Logs_") :].split("/")[0]))
+        return Resource(arn, "log_group", name, waits_for=waits_for)
+    if service == "s3":
+        return Resource(arn, "bucket", resource)
+    if service == "sqs":
+        return Resource(arn, "queue", resource)
+    if service == "dynamodb" and resource.startswith("table/"):
+        return Resource(arn, "table", resource.split("/")[1])
+    return None
+
+
+class Clients:
+    """
+    One boto3 client per service, shared by every thread. Creating a client is not thread safe, using one is.
+    Args:
+        endpoint_url (str): A local AWS stand-in, IE. http://localhost:4566
+        max_pool_connections (int): Connections per client, one for each worker
+    """
+
+    def __init__(self, endpoint_url=None, region_name=None, max_pool_connections=MAX_WORKERS):
+        self.endpoint_url = endpoint_url
+        self.region_name = region_name
+        self.max_pool_connections = max_pool_connections
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, service_name):
+        with self.lock:
+            if service_name not in self.clients:
+                import boto3
+                from botocore.config import Config
+
+                config = Config(
+                    max_pool_connections=self.max_pool_connections,
+                    retries={"max_attempts": 8, "mode": "adaptive"},
+                )
+                self.clients[service_name] = boto3.client(
+                    service_name, endpoint_url=self.endpoint_url, region_name=self.region_name, config=config
+                )
+            return self.clients[service_name]
+
+
+def list_resources(get_client, tag_filters):
+    """Yields the tagged ARNs a page at a time, so deleting can start before the listing is done"""
+    kwargs = {"TagFilters": tag_filters}
+    while True:
+        response = get_client("resourcegroupstaggingapi").get_resources(**kwargs)
+        yield [mapping["ResourceARN"] for mapping in response["ResourceTagMappingList"]]
+        if not response.get("PaginationToken"):
+            break
+        kwargs["PaginationToken"] = response["PaginationToken"]
+
+
+def empty_bucket(s3, bucket, dry_run=False):
+    """
+    Deletes every object version and delete marker in the bucket, a page of up to 1000 at a time
+    Returns:
+        int: Number of objects deleted, or that would be with `dry_run`
+    """
+    deleted = 0
+    kwargs = {"Bucket": bucket, "MaxKeys": DELETE_OBJECTS_BATCH_SIZE}
+    while True:
+        response = s3.list_object_versions(**kwargs)
+        objects = [
+            {"Key": version["Key"], "VersionId": version["VersionId"]}
+            for version in response.get("Versions", []) + response.get("DeleteMarkers", [])
+        ]
+        if objects and not dry_run:
+            result = s3.delete_objects(Bucket=bucket, Delete={"Objects": objects, "Quiet": True})
+            if result.get("Errors"):
+                error = result["Errors"][0]
+                raise Exception(f"Could not delete {error['Key']} from {bucket}: {error['Code']} {error['Message']}")
+        deleted += len(objects)
+        if not response.get("IsTruncated"):
+            return deleted
+        kwargs["KeyMarker"] = response["NextKeyMarker"]
+        kwargs["VersionIdMarker"] = response["NextVersionIdMarker"]
+
+
+def delete_resource(get_client, resource, dry_run=False):
+    """
+    Returns:
+        dict: Details for the report, IE. {"objects": 1200} for a bucket
+    """
+    if resource.kind == "bucket":
+        objects = empty_bucket(get_client("s3"), resource.name, dry_run)
+        if not dry_run:
+            get_client("s3").delete_bucket(Bucket=resource.name)
+        return {"objects": objects}
+    if dry_run:
+        return {}
+    if resource.kind == "function":
+        get_client("lambda").delete_function(FunctionName=resource.name)
+    elif resource.kind == "event_source_mapping":
+        get_client("lambda").delete_event_source_mapping(UUID=resource.name)
+    elif resource.kind == "rest_api":
+        get_client("apigateway").delete_rest_api(restApiId=resource.name)
+    elif resource.kind == "stage":
+        rest_api_id, stage_name = resource.name.split("/")
+        get_client("apigateway").delete_stage(restApiId=rest_api_id, stageName=stage_name)
+    elif resource.kind == "log_group":
+        get_client("logs").delete_log_group(logGroupName=resource.name)
+    elif resource.kind == "queue":
+        sqs = get_client("sqs")
+        sqs.delete_queue(QueueUrl=sqs.get_queue_url(QueueName=resource.name)["QueueUrl"])
+    elif resource.kind == "table":
+        get_client("dynamodb").delete_table(TableName=resource.name)
+    return {}
+
+
+class Teardown:
+    """
+    Deletes resources on a thread pool as they are added. A resource waits while any resource it depends on is not
+    deleted yet, and until the listing is done for those that were not listed yet, since the tagging API does not return
+    the resources of a stack together. Resources nothing depends on, like buckets and functions, start right away.
+    Args:
+        get_client (callable): Returns the client of a service, IE. a Clients
+        workers (int): Deletions running at once
+        dry_run (bool): Only list what would be deleted, and the objects in each bucket
+        on_result (callable): Called with each result as it finishes, IE. to print it
+    """
+
+    def __init__(self, get_client, workers=MAX_WORKERS, dry_run=False, on_result=None):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.get_client = get_client
+        self.dry_run = dry_run
+        self.on_result = on_result
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="teardown")
+        self.lock = threading.Lock()
+        self.done = threading.Condition(self.lock)
+        # Resources added but not finished, by key, and the resources waiting for them
+        self.unfinished = Counter()
+        self.listed = set()
+        self.listing = True
+        self.waiting = []
+        self.running = 0
+        self.results = []
+
+    def _blocked(self, resource):
+        return any(self.unfinished[key] or (self.listing and key not in self.listed) for key in resource.waits_for)
+
+    def add(self, resource):
+        with self.lock:
+            if resource.key is not None:
+                self.unfinished[resource.key] += 1
+                self.listed.add(resource.key)
+            self.waiting.append(resource)
+            self._release()
+
+    def listing_done(self):
+        """Lets go of the resources that were waiting for something the listing did not have"""
+        with self.lock:
+            self.listing = False
+            self._release()
+            self.done.notify_all()
+
+    def _release(self):
+        """Submits the waiting resources that are not blocked anymore, in the order they were added"""
+        ready = [resource for resource in self.waiting if not self._blocked(resource)]
+        self.waiting = [resource for resource in self.waiting if resource not in ready]
+        for resource in ready:
+            self.running += 1
+            self.executor.submit(self._run, resource)
+
+    def _run(self, resource):
+        start = time.perf_counter()
+        result = {"arn": resource.arn, "kind": resource.kind, "name": resource.name}
+        try:
+            result.update(delete_resource(self.get_client, resource, self.dry_run))
+            result["action"] = "would delete" if self.dry_run else "deleted"
+        except Exception as e:
+            if any(code in str(e) for code in GONE_ERRORS):
+                result["action"] = "already gone"
+            else:
+                result["action"] = "failed"
+                result["error"] = f"{e.__class__.__name__}: {e}"
+        result["seconds"] = round(time.perf_counter() - start, 3)
+
+        with self.lock:
+            self.results.append(result)
+            if resource.key is not None:
+                self.unfinished[resource.key] -= 1
+            self._release()
+            self.running -= 1
+            self.done.notify_all()
+        if self.on_result is not None:
+            self.on_result(result)
+
+    def wait(self):
+        """Waits for every resource added, then stops the threads. Returns the results in the order they finished."""
+        self.listing_done()
+        with self.lock:
+            while self.running or self.waiting:
+                self.done.wait()
+        self.executor.shutdown()
+        return self.results
+
+
+def destroy(get_client, tag_filters, workers=MAX_WORKERS, dry_run=False, on_result=None):
+    """
+    Lists the tagged resources and deletes them while the listing goes on
+    Returns:
+        tuple: (results of the resources it deletes, ARNs of the resources it does not know how to delete)
+    """
+    teardown = Teardown(get_client, workers, dry_run, on_result)
+    skipped = []
+    try:
+        for arns in list_resources(get_client, tag_filters):
+            for arn in arns:
+                resource = parse_arn(arn)
+                if resource is None:
+                    skipped.append(arn)
+                else:
+                    teardown.add(resource)
+    finally:
+        results = teardown.wait()
+    return results, skipped
+
+
+def print_report(results, skipped, seconds):
+    actions = Counter(result["action"] for result in results)
+    print(f"\n{len(results)} resources in {seconds:.1f}s: " + ", ".join(f"{k} {v}" for k, v in sorted(actions.items())))
+    by_kind = {}
+    for result in results:
+        count, total = by_kind.get(result["kind"], (0, 0))
+        by_kind[result["kind"]] = (count + 1, total + result["seconds"])
+    for kind, (count, total) in sorted(by_kind.items(), key=lambda item: -item[1][1]):
+        print(f"    {kind:<22}{count:>5}{total:>9.2f}s")
+    for arn in skipped:
+        print(f"DID NOT DESTROY {arn}")
+    for result in results:
+        if result["action"] == "failed":
+            print(f"FAILED {result['arn']}: {result['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--project", default=PROJECT_NAME, help="Value of the project tag")
+    parser.add_argument("--branch", help="Only the resources of this git_branch tag")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be deleted")
+    parser.add_argument("--endpoint-url", help="A local AWS stand-in, IE. http://localhost:4566")
+    parser.add_argument("--region")
+    parser.add_argument("--report", help="Write the result of every resource to this JSON file")
+    args = parser.parse_args()
+
+    tag_filters = [{"Key": "project", "Values": [args.project]}]
+    if args.branch:
+        tag_filters.append({"Key": "git_branch", "Values": [args.branch]})
+    clients = Clients(args.endpoint_url, args.region, args.workers)
+
+    def on_result(result):
+        details = f" ({result['objects']} objects)" if "objects" in result else ""
+        print(f"{result['action']:<13}{result['seconds']:>8.2f}s  {result['arn']}{details}")
+
+    start = time.perf_counter()
+    results, skipped = destroy(clients, tag_filters, args.workers, args.dry_run, on_result)
+    print_report(results, skipped, time.perf_counter() - start)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"results": results, "skipped": skipped}, f, indent=2)
+    return 1 if any(result["action"] == "failed" for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
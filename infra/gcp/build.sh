@@ -4,6 +4,9 @@ workload_pool_id=catan-tracker-pool
 workload_provider_name=catan-tracker-aws-lambda
 aws_account_id=$(aws sts get-caller-identity --query 'Account' --output text)
 aws_assumed_iam_role="arn:aws:sts::${aws_account_id}:assumed-role/catan-tracker-sms_interface-prod"
+# The write-behind queue worker writes to the sheet too, under its own role (infra/queue.tf)
+aws_queue_worker_iam_role="arn:aws:sts::${aws_account_id}:assumed-role/catan-tracker-queue_worker-prod"
+attribute_condition="attribute.aws_role in ['$aws_assumed_iam_role', '$aws_queue_worker_iam_role']"
 project_number=$(gcloud projects describe $(gcloud config get-value core/project) --format=value\(projectNumber\))
 service_account_email=${service_account_id}@${project}.iam.gserviceaccount.com
 
@@ -23,18 +26,31 @@ gcloud iam workload-identity-pools create $workload_pool_id \
     --location="global" \
      --project="$project"
 
-gcloud iam workload-identity-pools  \
-    providers create-aws $workload_provider_name  \
-    --location="global"  \
-    --workload-identity-pool=$workload_pool_id  \
-    --attribute-condition="'$aws_assumed_iam_role' == attribute.aws_role" \
-    --account-id=$aws_account_id \
-    --project="$project"
-
-gcloud iam service-accounts add-iam-policy-binding $service_account_email \
-    --role=roles/iam.workloadIdentityUser \
-    --member=principalSet://iam.googleapis.com/projects/$project_number/locations/global/workloadIdentityPools/$workload_pool_id/attribute.aws_role/$aws_assumed_iam_role \
-    --project="$project"
+# An existing provider only has its condition updated, IE. to let the queue worker in
+if gcloud iam workload-identity-pools providers describe $workload_provider_name \
+    --location="global" --workload-identity-pool=$workload_pool_id --project="$project" > /dev/null 2>&1; then
+    gcloud iam workload-identity-pools  \
+        providers update-aws $workload_provider_name  \
+        --location="global"  \
+        --workload-identity-pool=$workload_pool_id  \
+        --attribute-condition="$attribute_condition" \
+        --project="$project"
+else
+    gcloud iam workload-identity-pools  \
+        providers create-aws $workload_provider_name  \
+        --location="global"  \
+        --workload-identity-pool=$workload_pool_id  \
+        --attribute-condition="$attribute_condition" \
+        --account-id=$aws_account_id \
+        --project="$project"
+fi
+
+for aws_role in $aws_assumed_iam_role $aws_queue_worker_iam_role; do
+    gcloud iam service-accounts add-iam-policy-binding $service_account_email \
+        --role=roles/iam.workloadIdentityUser \
+        --member=principalSet://iam.googleapis.com/projects/$project_number/locations/global/workloadIdentityPools/$workload_pool_id/attribute.aws_role/$aws_role \
+        --project="$project"
+done
 
 
 #################
@@ -35,6 +35,13 @@ module "lambda_function" {
   environment_variables = {
     CONFIG_BUCKET  = aws_s3_bucket.b.bucket
     MESSAGES_KEY   = local.messages_key
+    MESSAGES_PREFIX = local.messages_prefix
+    AGGREGATES_KEY = local.aggregates_key
+    APPLIED_KEYS_KEY = local.applied_keys_key
+    HISTORY_SNAPSHOT_KEY = local.history_snapshot_key
+    GROUPS_PREFIX = local.groups_prefix
+    WRITE_BEHIND    = var.write_behind ? "true" : "false"
+    SCORE_QUEUE_URL = aws_sqs_queue.scores.url
   }
 
   attach_policy_json = true
@@ -63,6 +70,7 @@ data "aws_iam_policy_document" "frontend_permissions" {
     actions = [
       "s3:GetObject*",
       "s3:PutObject*",
+      "s3:ListBucket",
     ]
     resources = [
       aws_s3_bucket.b.arn,
@@ -70,4 +78,10 @@ data "aws_iam_policy_document" "frontend_permissions" {
     ]
   }
 
+  statement {
+    sid     = "SendToScoreQueue"
+    actions = ["sqs:SendMessage"]
+    resources = [aws_sqs_queue.scores.arn]
+  }
+
 }
@@ -35,6 +35,11 @@ locals {
   env         = local.is_main ? "prod" : "feature"
   branch_hash = local.is_main ? "prod" : substr(md5(local.git_branch), 0, 8)
   messages_key = "${local.git_branch}/messages.json"
+  messages_prefix = "${local.git_branch}/messages/"
+  aggregates_key = "${local.git_branch}/aggregates.json"
+  applied_keys_key = "${local.git_branch}/applied_keys.json"
+  history_snapshot_key = "${local.git_branch}/history.npz"
+  groups_prefix = "${local.git_branch}/groups/"
 }
 
 data "external" "get_current_branch" {
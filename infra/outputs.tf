@@ -20,4 +20,28 @@ output "api_endpoint" {
 
 output "messages_key" {
   value = local.messages_key
-}
\ No newline at end of file
+}
+
+output "messages_prefix" {
+  value = local.messages_prefix
+}
+
+output "aggregates_key" {
+  value = local.aggregates_key
+}
+
+output "applied_keys_key" {
+  value = local.applied_keys_key
+}
+
+output "history_snapshot_key" {
+  value = local.history_snapshot_key
+}
+
+output "groups_prefix" {
+  value = local.groups_prefix
+}
+
+output "score_queue_url" {
+  value = aws_sqs_queue.scores.url
+}
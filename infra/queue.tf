@@ -0,0 +1,73 @@
+#######################################################
+# Write-behind queue
+#######################################################
+
+# FIFO so the games are written in the order they were sent, and a resend with the same idempotency key is dropped
+resource "aws_sqs_queue" "scores" {
+  name                       = "${local.project_name}-scores-${local.branch_hash}.fifo"
+  fifo_queue                 = true
+  visibility_timeout_seconds = 90
+  message_retention_seconds  = 1209600
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.scores_dead_letter.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue" "scores_dead_letter" {
+  name                      = "${local.project_name}-scores-dead-letter-${local.branch_hash}.fifo"
+  fifo_queue                = true
+  message_retention_seconds = 1209600
+}
+
+module "queue_worker" {
+  source  = "terraform-aws-modules/lambda/aws"
+  version = "v6.5.0"
+
+  function_name = "${local.project_name}-queue_worker-prod"
+  handler       = "lambda_function.queue_handler"
+  runtime       = "python3.9"
+  publish       = true
+  timeout       = 60
+  memory_size   = 512
+
+  source_path = "../src/ui_interface"
+  # Allowed to get Google credentials by the workload identity provider, see infra/gcp/build.sh
+  role_name   = "${local.project_name}-queue_worker-prod"
+
+  environment_variables = {
+    CONFIG_BUCKET    = aws_s3_bucket.b.bucket
+    MESSAGES_PREFIX  = local.messages_prefix
+    AGGREGATES_KEY   = local.aggregates_key
+    APPLIED_KEYS_KEY = local.applied_keys_key
+    GROUPS_PREFIX    = local.groups_prefix
+  }
+
+  attach_policy_json = true
+  policy_json        = data.aws_iam_policy_document.queue_worker_permissions.json
+
+  layers = [aws_lambda_layer_version.lambda_layer.arn]
+}
+
+resource "aws_lambda_event_source_mapping" "scores" {
+  event_source_arn        = aws_sqs_queue.scores.arn
+  function_name           = module.queue_worker.lambda_function_arn
+  batch_size              = 10
+  function_response_types = ["ReportBatchItemFailures"]
+}
+
+data "aws_iam_policy_document" "queue_worker_permissions" {
+  source_policy_documents = [data.aws_iam_policy_document.frontend_permissions.json]
+
+  statement {
+    sid = "ReadScoreQueue"
+    actions = [
+      "sqs:ReceiveMessage",
+      "sqs:DeleteMessage",
+      "sqs:ChangeMessageVisibility",
+      "sqs:GetQueueAttributes",
+    ]
+    resources = [aws_sqs_queue.scores.arn]
+  }
+}
@@ -1,3 +1,9 @@
 variable "git_branch" {
   default = null
+}
+
+variable "write_behind" {
+  description = "Answer /send as soon as the game is queued and write it to Google Sheets from the queue worker"
+  type        = bool
+  default     = false
 }
\ No newline at end of file
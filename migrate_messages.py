@@ -0,0 +1,39 @@
+"""
+This file is not for the application. It moves the chat history from the single messages file into the append-only
+message log. It is safe to run more than once, the legacy messages always go to the same keys.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from lambda_function import get_s3_json, message_key, message_manifest_key, put_s3_json
+
+
+def main():
+    set_env_vars.main()
+    bucket = os.environ["CONFIG_BUCKET"]
+    legacy_messages = get_s3_json(bucket, os.environ["MESSAGES_KEY"])
+
+    # Each sender/receiver pair becomes one object. They get the earliest possible timestamps, in their original order,
+    # so that they sort before anything sent through the log.
+    for i in range(0, len(legacy_messages), 2):
+        put_s3_json(bucket, message_key(i // 2 + 1, "legacy"), legacy_messages[i : i + 2])
+
+    manifest = {
+        "format": 1,
+        "migrated_from": os.environ["MESSAGES_KEY"],
+        "migrated_messages": len(legacy_messages),
+    }
+    put_s3_json(bucket, message_manifest_key(), manifest)
+    print(f"Migrated {len(legacy_messages)} messages to {os.environ['MESSAGES_PREFIX']}")
+
+
+if __name__ == "__main__":
+    main()
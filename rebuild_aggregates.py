@@ -0,0 +1,29 @@
+"""
+This file is not for the application. It recomputes the record aggregates from the whole Google Sheet in one shot.
+Run it after the sheet has been edited by hand. The lambdas also rebuild on their own when they notice the sheet moved.
+"""
+
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from catan_core import GoogleSheets, S3AggregatesStore
+
+
+def main():
+    set_env_vars.main()
+    sheets = GoogleSheets(os.path.join(UI_INTERFACE_PATH, "googlecreds.json"))
+    stats_store = S3AggregatesStore(os.environ["CONFIG_BUCKET"], os.environ["AGGREGATES_KEY"])
+    aggregates = stats_store.rebuild(sheets)
+    stats_store.save(aggregates)
+    print(f"Rebuilt aggregates for {sum(aggregates.overall.values())} games up to row {aggregates.last_row}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,41 @@
 """
 This file is not for the application. It is used to load environment variables for local development
+
+The variables come from the Terraform state of the project in S3, which takes an SSM parameter, a git subprocess and
+the download of the whole state. They are resolved once and kept for CONFIG_TTL_SECONDS (default 15 minutes), so a
+long running process like the local server only pays for it again when they may have changed.
+
+With CATAN_CONFIG_FILE, or a local_config.json in the project, the variables are read from that JSON file instead and
+no AWS access is needed. To write one from the current state:
+    python set_env_vars.py --save local_config.json
 """
 
+import argparse
 import json
 import os
 import subprocess
+import threading
+import time
 from pathlib import Path
 
-import boto3
+PROJECT_PATH = f"{Path(__file__).parent.absolute()}{os.sep}"
+LOCAL_CONFIG_PATH = f"{PROJECT_PATH}local_config.json"
+CONFIG_TTL_SECONDS = float(os.environ.get("CONFIG_TTL_SECONDS", "900"))
+
+# Environment variable to the Terraform output it is set from
+OUTPUTS = {
+    "CONFIG_BUCKET": "config_bucket_name",
+    "MESSAGES_KEY": "messages_key",
+    "MESSAGES_PREFIX": "messages_prefix",
+    "AGGREGATES_KEY": "aggregates_key",
+    "APPLIED_KEYS_KEY": "applied_keys_key",
+    "HISTORY_SNAPSHOT_KEY": "history_snapshot_key",
+    "GROUPS_PREFIX": "groups_prefix",
+}
+
+_CONFIG = None
+_LOADED_AT = None
+_LOCK = threading.Lock()
 
 
 def get_git_branch(path=None):
@@ -18,24 +46,87 @@ def get_git_branch(path=None):
     return branch.strip().decode("utf-8")
 
 
-def main():
+def get_config_file():
+    """The local file the variables are read from instead of AWS, or None"""
+    path = os.environ.get("CATAN_CONFIG_FILE")
+    if path:
+        return path
+    return LOCAL_CONFIG_PATH if os.path.exists(LOCAL_CONFIG_PATH) else None
+
+
+def load_config():
+    """
+    Resolves the variables without looking at the cache
+    Returns:
+        dict: Environment variable name to value
+    """
+    config_file = get_config_file()
+    if config_file:
+        with open(config_file) as f:
+            return {k: str(v) for k, v in json.load(f).items()}
+
+    import boto3
+
     # Get terraform state for current branch
     ssm = boto3.client("ssm")
     s3 = boto3.client("s3")
     bucket = ssm.get_parameter(Name="/tf_state/bucket_name")["Parameter"]["Value"]
     git_branch = get_git_branch()
-    project_path = f"{Path(__file__).parent.absolute()}{os.sep}"
-    project_name = Path(project_path).name
+    project_name = Path(PROJECT_PATH).name
     state_s3_key = f"{project_name}/prod/state.json"
     print(f"Getting state {state_s3_key}")
     obj = s3.get_object(Bucket=bucket, Key=state_s3_key)
     tf_state = json.loads(obj["Body"].read().decode())
 
-    # Set env
-    os.environ["CONFIG_BUCKET"] = tf_state["outputs"]["config_bucket_name"]["value"]
-    os.environ["MESSAGES_KEY"] = tf_state["outputs"]["messages_key"]["value"]
-    os.environ["ENV"] = "prod" if git_branch == "main" else "feature"
+    config = {name: tf_state["outputs"][output]["value"] for name, output in OUTPUTS.items()}
+    config["ENV"] = "prod" if git_branch == "main" else "feature"
+    return config
+
+
+def invalidate():
+    """
+    Makes the next call to `main` resolve the variables again. It only sets a flag, so it is safe in a signal handler.
+    """
+    global _LOADED_AT
+    _LOADED_AT = None
+
+
+def main(refresh=False):
+    """
+    Sets the environment variables, resolving them only when they are not cached yet, are older than
+    CONFIG_TTL_SECONDS or were invalidated. When resolving them again fails, the cached ones are kept and it is retried
+    on the next call.
+    Args:
+        refresh (bool): Resolve them even if the cached ones are still fresh
+    Returns:
+        dict: The variables that were set
+    """
+    global _CONFIG, _LOADED_AT
+    with _LOCK:
+        stale = _LOADED_AT is None or time.monotonic() - _LOADED_AT > CONFIG_TTL_SECONDS
+        if refresh or _CONFIG is None or stale:
+            try:
+                config = load_config()
+            except Exception as e:
+                if _CONFIG is None:
+                    raise e
+                print(f"Keeping the cached config, it could not be refreshed: {e.__class__.__name__}: {e}")
+            else:
+                _CONFIG = config
+                _LOADED_AT = time.monotonic()
+                os.environ.update(_CONFIG)
+        return _CONFIG
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", help="Write the resolved variables to this JSON file, IE. local_config.json")
+    args = parser.parse_args()
+
+    resolved = main()
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(resolved, f, indent=2)
+        print(f"Saved {len(resolved)} variables to {args.save}")
+    else:
+        print(json.dumps(resolved, indent=2))
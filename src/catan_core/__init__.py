@@ -0,0 +1,33 @@
+"""
+The scoring pipeline shared by the lambdas: parsing messages, storing games and the stats the reply is built from.
+It is shipped in the lambda layer. The Google clients and boto3 are only imported when they are first used.
+"""
+
+from catan_core.aggregates import RecordAggregates
+from catan_core.analytics import HistorySnapshot, S3SnapshotStore
+from catan_core.archive import HistoryArchive, export_archive, write_archive
+from catan_core.aws import get_client
+from catan_core.backends import (
+    build_pipeline,
+    get_group,
+    get_snapshot_store,
+    get_sqlite_path,
+    get_stats_store,
+    get_store_factory,
+)
+from catan_core.groups import Group, S3GroupRegistry, validate_group
+from catan_core.interfaces import GameQueue, GameStore, Parser, StatsEngine, StatsStore
+from catan_core.parsing import (
+    MessageParseError,
+    MessageParser,
+    ParsedGame,
+    parse_game_date,
+    parse_import,
+)
+from catan_core.pipeline import ScoringPipeline
+from catan_core.queues import FileQueue, S3AppliedKeys, SQSQueue, drain, group_entries_by_group
+from catan_core.s3 import get_s3_bytes, get_s3_json, list_s3_keys, put_s3_bytes, put_s3_json
+from catan_core.sheets_scheduler import SheetsQuotaError, SheetsScheduler, get_scheduler
+from catan_core.sqlite_store import SQLiteStats, SQLiteStatsStore, SQLiteStore
+from catan_core.stats import S3AggregatesStore, build_response, determine_winner
+from catan_core.storage import GoogleSheets, MirroredStore, get_sheets_service, sync_mirror
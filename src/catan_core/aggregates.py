@@ -0,0 +1,166 @@
+import json
+from itertools import combinations
+
+from catan_core.interfaces import StatsEngine
+
+IGNORE_COLUMNS = ["Game date", "Winner", "Score difference"]
+# Saved aggregates of an older version are treated as missing, so they are rebuilt from the sheet on the next write
+AGGREGATES_VERSION = 2
+
+# A row adds one to the counter of every subset of its conditions so that any condition query is a single lookup.
+# Rows with more conditions than this would blow up the number of subsets, so they are kept aside and scanned instead.
+MAX_INDEXED_CONDITIONS = 8
+
+
+def get_conditions(data_dict):
+    """Returns the sorted list of conditions that were true for a game. IE. {"Raining?": "Yes"} => ["Raining?"]"""
+    return sorted(k for k, v in data_dict.items() if k not in IGNORE_COLUMNS and k != "Game" and v == "Yes")
+
+
+def conditions_key(game, conditions):
+    """Canonical key for a game and a set of conditions. JSON is used so that any user text is safe in the key."""
+    return json.dumps([game, sorted(conditions)], ensure_ascii=False)
+
+
+def _increment(counter, key, winner):
+    records = counter.setdefault(key, {})
+    records[winner] = records.get(winner, 0) + 1
+
+
+class RecordAggregates(StatsEngine):
+    """
+    Win counts for the whole history of games, kept up to date one row at a time.
+
+    Every counter maps a winner to their number of wins:
+        overall: {winner: wins}
+        games: {game: {winner: wins}}
+        score_differences: {game: {winner: {score difference: wins}}}
+        conditions: {conditions_key: {winner: wins}} for the games that had at least those conditions
+        exact: {conditions_key: {winner: wins}} for the games that had exactly those conditions
+
+    `last_row` is the last sheet row that has been counted so it can be compared to the sheet to detect drift.
+    """
+
+    def __init__(
+        self,
+        last_row=1,
+        overall=None,
+        games=None,
+        score_differences=None,
+        conditions=None,
+        exact=None,
+        overflow=None,
+    ):
+        self.last_row = int(last_row)
+        self.overall = overall or {}
+        self.games = games or {}
+        self.score_differences = score_differences or {}
+        self.conditions = conditions or {}
+        self.exact = exact or {}
+        # [game, winner, conditions] for rows with more than MAX_INDEXED_CONDITIONS conditions
+        self.overflow = overflow or []
+
+    @classmethod
+    def from_dict(cls, aggregates_dict):
+        aggregates_dict = dict(aggregates_dict)
+        if aggregates_dict.pop("version", None) != AGGREGATES_VERSION:
+            return cls()
+        return cls(**aggregates_dict)
+
+    @classmethod
+    def from_rows(cls, rows, columns, last_row):
+        """
+        Recomputes every counter from the rows of the sheet
+        Args:
+            rows (list): Rows of cell values as returned by GoogleSheets.get_all_data
+            columns (list): The header row of the sheet
+            last_row (int): The last row number of the sheet
+        Returns:
+            RecordAggregates
+        """
+        aggregates = cls()
+        for row in rows:
+            aggregates.add(dict(zip(columns, row)))
+        aggregates.last_row = int(last_row)
+        return aggregates
+
+    def to_dict(self):
+        return {
+            "version": AGGREGATES_VERSION,
+            "last_row": self.last_row,
+            "overall": self.overall,
+            "games": self.games,
+            "score_differences": self.score_differences,
+            "conditions": self.conditions,
+            "exact": self.exact,
+            "overflow": self.overflow,
+        }
+
+    def add(self, data_dict):
+        """Counts a single game. Does not touch `last_row`, the caller owns keeping it in line with the sheet."""
+        winner, game, score_diff = data_dict.get("Winner"), data_dict.get("Game"), data_dict.get("Score difference")
+        if not winner:
+            return
+
+        self.overall[winner] = self.overall.get(winner, 0) + 1
+        _increment(self.games, game, winner)
+        _increment(self.score_differences.setdefault(game, {}), winner, score_diff)
+
+        conditions = get_conditions(data_dict)
+        _increment(self.exact, conditions_key(game, conditions), winner)
+        if len(conditions) > MAX_INDEXED_CONDITIONS:
+            self.overflow.append([game, winner, conditions])
+            return
+        for size in range(len(conditions) + 1):
+            for subset in combinations(conditions, size):
+                _increment(self.conditions, conditions_key(game, subset), winner)
+
+    def overall_records(self):
+        return self.overall
+
+    def game_records(self, game):
+        return self.games.get(game, {})
+
+    def score_difference_wins(self, game, winner, score_diff):
+        return self.score_differences.get(game, {}).get(winner, {}).get(score_diff, 0)
+
+    def conditions_records(self, data_dict):
+        """Records for every game of the same type that had at least all of the conditions in `data_dict`"""
+        return self.superset_conditions_records(data_dict.get("Game"), get_conditions(data_dict))
+
+    def superset_conditions_records(self, game, conditions):
+        """Records for the games that had at least all of `conditions`. One lookup unless there are overflow rows."""
+        records = dict(self.conditions.get(conditions_key(game, conditions), {}))
+        for overflow_game, winner, overflow_conditions in self.overflow:
+            if overflow_game == game and set(conditions).issubset(overflow_conditions):
+                records[winner] = records.get(winner, 0) + 1
+        return records
+
+    def exact_conditions_records(self, game, conditions):
+        """Records for the games that had exactly `conditions` and no others. Always one lookup."""
+        return self.exact.get(conditions_key(game, conditions), {})
+
+    def subset_conditions_records(self, game, conditions):
+        """
+        Records for the games that had no conditions other than `conditions`, IE. the exact records of every subset.
+        With more conditions than MAX_INDEXED_CONDITIONS there are more subsets than condition sets that were ever
+        played, so the condition sets are scanned instead.
+        """
+        conditions = sorted(set(conditions))
+        if len(conditions) <= MAX_INDEXED_CONDITIONS:
+            keys = [
+                conditions_key(game, subset)
+                for size in range(len(conditions) + 1)
+                for subset in combinations(conditions, size)
+            ]
+        else:
+            keys = [
+                key
+                for key, (key_game, key_conditions) in ((key, json.loads(key)) for key in self.exact)
+                if key_game == game and set(key_conditions).issubset(conditions)
+            ]
+        records = {}
+        for key in keys:
+            for winner, wins in self.exact.get(key, {}).items():
+                records[winner] = records.get(winner, 0) + wins
+        return records
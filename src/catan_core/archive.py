@@ -0,0 +1,249 @@
+"""
+A columnar archive of a history on local disk, for analysis outside the lambdas. IE. to scan millions of games from a
+script or a notebook without reading the sheet again, or to run the /stats numbers over any range of years.
+
+The archive holds the arrays of a HistorySnapshot, split by the year of the game date. Every array is its own .npy file,
+which np.load maps into memory rather than reading, so a scan only touches the pages of the columns it uses and nothing
+is copied. manifest.json has the names the codes in the arrays refer to, which every year shares, and the row of the
+history the archive is up to:
+
+    archive/
+        manifest.json
+        year=unknown/<last row>/   games without a parsable game date
+        year=2024/<last row>/      days.npy winners.npy games.npy score_differences.npy condition_flags.npy
+
+Exporting again only reads the rows appended to the history since, and only rewrites the years they fall in. A year is
+written to a new folder and the manifest is replaced last, so a reader that opened the archive before keeps a
+consistent view of it.
+"""
+
+import json
+import os
+
+from catan_core import tracing
+from catan_core.analytics import HistorySnapshot
+
+ARCHIVE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+ARRAYS = ("days", "winners", "games", "score_differences", "condition_flags")
+UNKNOWN_YEAR = "unknown"
+
+
+def _partition_bounds(np, days):
+    """
+    The snapshot is sorted by day, so each year is a contiguous slice of it
+    Returns:
+        dict: {year: (start, end)} in order, with the games without a date first under UNKNOWN_YEAR
+    """
+    known = int(np.searchsorted(days, 0))
+    bounds = {UNKNOWN_YEAR: (0, known)} if known else {}
+    if known == len(days):
+        return bounds
+    first_year = int(days[known : known + 1].astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)[0])
+    last_year = int(days[-1:].astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)[0])
+    # Day numbers of the first of January of each year, IE. where each year starts
+    starts = np.arange(first_year, last_year + 2).astype("datetime64[Y]").astype("datetime64[D]").astype(np.int64)
+    edges = np.searchsorted(days, starts)
+    for i, year in enumerate(range(first_year + 1970, last_year + 1971)):
+        start, end = max(int(edges[i]), known), int(edges[i + 1])
+        if end > start:
+            bounds[str(year)] = (start, end)
+    return bounds
+
+
+def _load(np, path):
+    # An empty file can not be mapped, IE. the condition flags of a history without conditions
+    array = np.load(path, mmap_mode="r")
+    return np.load(path) if not array.size else array
+
+
+def _replace(path, write):
+    """Writes a file next to `path` and renames it over `path`, so a reader never sees it half written"""
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        write(f)
+    os.replace(temporary_path, path)
+
+
+class HistoryArchive:
+    """
+    Reads an archive written by `export_archive`. The arrays are read only memory maps of the files.
+        archive = HistoryArchive("archive")
+        compute_stats(archive.snapshot(["2023", "2024"]))
+        for year, arrays in archive.scan(["winners"]):
+            print(year, np.bincount(arrays["winners"]))
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        if manifest["version"] != ARCHIVE_VERSION:
+            raise Exception(f"{path} is an archive of version {manifest['version']}. Export it again.")
+        self.manifest = manifest
+        self.last_row = manifest["last_row"]
+        self.winner_names = manifest["winner_names"]
+        self.game_names = manifest["game_names"]
+        self.condition_names = manifest["condition_names"]
+        self.years = list(manifest["years"])
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+    def __len__(self):
+        return sum(partition["games"] for partition in self.manifest["years"].values())
+
+    def partition(self, year, arrays=ARRAYS):
+        """
+        Args:
+            year (str): IE. "2024", or UNKNOWN_YEAR
+            arrays (iterable): Which of ARRAYS to map
+        Returns:
+            dict: {array name: numpy.memmap}
+        """
+        import numpy as np
+
+        folder = os.path.join(self.path, self.manifest["years"][year]["folder"])
+        return {name: _load(np, os.path.join(folder, f"{name}.npy")) for name in arrays}
+
+    def scan(self, arrays=ARRAYS, years=None):
+        """
+        Yields (year, {array name: numpy.memmap}) for each year in order, with the games without a date first
+        Args:
+            arrays (iterable): Which of ARRAYS to map
+            years (iterable): Only these years. Every year when None.
+        """
+        years = set(years) if years is not None else None
+        for year in self.years:
+            if years is None or year in years:
+                yield year, self.partition(year, arrays)
+
+    def snapshot(self, years=None):
+        """
+        The archive as a HistorySnapshot, to run catan_core.analytics on. The arrays of a single year are the memory
+        maps themselves, more than one are concatenated into memory.
+        Args:
+            years (iterable): Only the games of these years. Every year when None.
+        Returns:
+            HistorySnapshot
+        """
+        import numpy as np
+
+        partitions = [arrays for _, arrays in self.scan(ARRAYS, years)]
+        if len(partitions) == 1:
+            arrays = partitions[0]
+        elif partitions:
+            arrays = {name: np.concatenate([partition[name] for partition in partitions]) for name in ARRAYS}
+        else:
+            arrays = {name: np.zeros(0, dtype=np.int32) for name in ARRAYS}
+            arrays["condition_flags"] = np.zeros((0, len(self.condition_names)), dtype=bool)
+        return HistorySnapshot(
+            self.last_row,
+            arrays["days"],
+            arrays["winners"],
+            arrays["games"],
+            arrays["score_differences"],
+            arrays["condition_flags"],
+            self.winner_names,
+            self.game_names,
+            self.condition_names,
+        )
+
+
+def write_archive(snapshot, path, previous=None):
+    """
+    Writes a snapshot as an archive. With the `previous` archive at `path`, only the years whose games changed are
+    written. That relies on the codes of the previous names never changing, which HistorySnapshot.extend keeps to.
+    Args:
+        snapshot (HistorySnapshot)
+        path (str): The archive's directory
+        previous (HistoryArchive): The archive already at `path`, if any
+    Returns:
+        list: The years that were written
+    """
+    import shutil
+
+    import numpy as np
+
+    os.makedirs(path, exist_ok=True)
+    bounds = _partition_bounds(np, snapshot.days)
+    old_years = previous.manifest["years"] if previous is not None else {}
+    # New conditions widen the condition flags of every year
+    same_conditions = previous is not None and previous.condition_names == snapshot.condition_names
+
+    years, written = {}, []
+    for year, (start, end) in bounds.items():
+        if same_conditions and old_years.get(year, {}).get("games") == end - start:
+            years[year] = old_years[year]
+            continue
+        folder = f"year={year}/{snapshot.last_row}"
+        os.makedirs(os.path.join(path, folder), exist_ok=True)
+        arrays = {
+            "days": snapshot.days,
+            "winners": snapshot.winners,
+            "games": snapshot.games,
+            "score_differences": snapshot.score_differences,
+            "condition_flags": snapshot.condition_flags,
+        }
+        for name, array in arrays.items():
+            _replace(os.path.join(path, folder, f"{name}.npy"), lambda f: np.save(f, array[start:end]))
+        years[year] = {"games": end - start, "folder": folder}
+        written.append(year)
+
+    manifest = {
+        "version": ARCHIVE_VERSION,
+        "last_row": snapshot.last_row,
+        "winner_names": snapshot.winner_names,
+        "game_names": snapshot.game_names,
+        "condition_names": snapshot.condition_names,
+        "years": years,
+    }
+    _replace(os.path.join(path, MANIFEST_NAME), lambda f: f.write(json.dumps(manifest, indent=2).encode()))
+
+    # Folders the manifest no longer points to. A reader that has them mapped keeps its copy until it closes them.
+    kept = {partition["folder"] for partition in years.values()}
+    for year_folder in os.listdir(path):
+        if not year_folder.startswith("year="):
+            continue
+        for folder in os.listdir(os.path.join(path, year_folder)):
+            if f"{year_folder}/{folder}" not in kept:
+                shutil.rmtree(os.path.join(path, year_folder, folder))
+        if not os.listdir(os.path.join(path, year_folder)):
+            os.rmdir(os.path.join(path, year_folder))
+    return written
+
+
+def export_archive(store, path, full=False):
+    """
+    Exports the history in a GameStore to the archive at `path`. When there already is one, only the rows appended
+    since it was exported are read.
+    Args:
+        store (GameStore)
+        path (str): The archive's directory
+        full (bool): Read the whole history again, IE. after the sheet was edited by hand
+    Returns:
+        dict: {"games", "last_row", "rows_read", "years_written"}
+    """
+    previous = HistoryArchive(path) if not full and HistoryArchive.exists(path) else None
+    if previous is not None:
+        with tracing.span("rows_read"):
+            rows = store.get_rows(previous.last_row + 1)
+        snapshot = previous.snapshot()
+        if rows:
+            with tracing.span("snapshot_build"):
+                snapshot = snapshot.extend(rows, store.columns, store.last_row)
+    else:
+        with tracing.span("full_read"):
+            rows = store.get_all_data()
+        with tracing.span("snapshot_build"):
+            snapshot = HistorySnapshot.from_rows(rows, store.columns, store.last_row)
+
+    with tracing.span("archive_write"):
+        years_written = write_archive(snapshot, path, previous) if rows or previous is None else []
+    return {
+        "games": len(snapshot),
+        "last_row": snapshot.last_row,
+        "rows_read": len(rows),
+        "years_written": years_written,
+    }
@@ -0,0 +1,57 @@
+"""
+The boto3 clients, created once per lambda container and shared by every helper and thread.
+
+Creating a client resolves the endpoint, walks the credential chain and starts a new connection pool, which costs tens
+of milliseconds. The clients here are created on first use, so a route that never calls a service never pays for it,
+and then reused by every warm invocation. Each creation is counted as `AWSClientsCreated` in the trace of the
+invocation that paid for it, so the metric is only ever above zero on a cold start. A reused client counts 0, so a warm
+invocation reports the metric as 0 rather than leaving it out.
+"""
+
+import threading
+
+from catan_core import tracing
+
+# Enough connections for the threads that fetch the message log in parallel, with room to spare
+MAX_POOL_CONNECTIONS = 16
+CONNECT_TIMEOUT_SECONDS = 2
+READ_TIMEOUT_SECONDS = 10
+# Adaptive retries back off on throttling as well as on errors, and slow the client down while S3 is throttling it
+RETRY_MAX_ATTEMPTS = 4
+
+_CLIENTS = {}
+# Reusing a client across threads is safe, creating one is not
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(service_name):
+    """
+    Args:
+        service_name (str): IE. "s3", "sns" or "sqs"
+    Returns:
+        The boto3 client for the service, shared by the whole lambda container
+    """
+    client = _CLIENTS.get(service_name)
+    if client is not None:
+        tracing.count("AWSClientsCreated", 0)
+        return client
+
+    with _CLIENTS_LOCK:
+        # Another thread may have created it while this one was waiting for the lock
+        if service_name not in _CLIENTS:
+            import boto3
+            from botocore.config import Config
+
+            config = Config(
+                max_pool_connections=MAX_POOL_CONNECTIONS,
+                connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                read_timeout=READ_TIMEOUT_SECONDS,
+                retries={"max_attempts": RETRY_MAX_ATTEMPTS, "mode": "adaptive"},
+                tcp_keepalive=True,
+            )
+            with tracing.span("client_create"):
+                _CLIENTS[service_name] = boto3.client(service_name, config=config)
+            tracing.count("AWSClientsCreated")
+        else:
+            tracing.count("AWSClientsCreated", 0)
+        return _CLIENTS[service_name]
@@ -0,0 +1,93 @@
+"""
+Picks the storage backend from the environment, so both lambdas and the local scripts build the same pipeline.
+
+GAME_STORE=sheets (the default) keeps the games in the Google Sheet and the stats as aggregates in S3.
+GAME_STORE=sqlite keeps the games in the SQLite file at SQLITE_PATH and answers the stats from its indexes. The sheet
+is then only a mirror, written after each game unless MIRROR_TO_SHEETS=false.
+
+Every group (see catan_core.groups) gets its own pipeline: its own sheet tab, SQLite file and keys in the config bucket.
+"""
+
+import os
+
+from catan_core.analytics import S3SnapshotStore
+from catan_core.groups import DEFAULT_GROUP_ID, DEFAULT_PLAYERS, Group, S3GroupRegistry
+from catan_core.pipeline import ScoringPipeline
+from catan_core.sqlite_store import SQLiteStatsStore, SQLiteStore
+from catan_core.stats import S3AggregatesStore
+from catan_core.storage import GoogleSheets, MirroredStore
+
+DEFAULT_SQLITE_PATH = "/tmp/catan-tracker.db"
+
+
+def _default_group(group):
+    return group or Group(DEFAULT_GROUP_ID, DEFAULT_PLAYERS)
+
+
+def get_group(group_id=None):
+    """
+    Looks a group up in the registry under GROUPS_PREFIX. Without GROUPS_PREFIX there is only the default group.
+    Returns:
+        Group
+    """
+    if group_id in (None, "", DEFAULT_GROUP_ID):
+        return _default_group(None)
+    if not os.environ.get("GROUPS_PREFIX"):
+        raise Exception(f"Unknown group {group_id}")
+    return S3GroupRegistry(os.environ["CONFIG_BUCKET"], os.environ["GROUPS_PREFIX"]).get(group_id)
+
+
+def get_sqlite_path(group=None):
+    """The default group keeps SQLITE_PATH and any other group gets a file next to it, IE. /tmp/catan-tracker-x.db"""
+    group = _default_group(group)
+    path = os.environ.get("SQLITE_PATH", DEFAULT_SQLITE_PATH)
+    if group.prefix is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}-{group.group_id}{extension}"
+
+
+def get_store_factory(credentials_filepath, group=None):
+    """
+    Returns:
+        callable: Builds the group's GameStore for an invocation
+    """
+    sheet_name = _default_group(group).sheet_name
+    game_store = os.environ.get("GAME_STORE", "sheets").lower()
+    if game_store == "sheets":
+        return lambda: GoogleSheets(credentials_filepath, sheet_name)
+    if game_store != "sqlite":
+        raise Exception(f"Unknown GAME_STORE {game_store}. It should be sheets or sqlite.")
+
+    path = get_sqlite_path(group)
+    if os.environ.get("MIRROR_TO_SHEETS", "true").lower() == "true":
+        return lambda: MirroredStore(SQLiteStore(path), lambda: GoogleSheets(credentials_filepath, sheet_name))
+    return lambda: SQLiteStore(path)
+
+
+def get_stats_store(group=None):
+    if os.environ.get("GAME_STORE", "sheets").lower() == "sqlite":
+        return SQLiteStatsStore(get_sqlite_path(group))
+    return S3AggregatesStore(os.environ["CONFIG_BUCKET"], _default_group(group).key(os.environ["AGGREGATES_KEY"]))
+
+
+def get_snapshot_store(group=None):
+    """The history snapshot is saved at HISTORY_SNAPSHOT_KEY in the config bucket, or only kept in memory without it"""
+    if os.environ.get("HISTORY_SNAPSHOT_KEY"):
+        key = _default_group(group).key(os.environ["HISTORY_SNAPSHOT_KEY"])
+        return S3SnapshotStore(os.environ["CONFIG_BUCKET"], key)
+    return None
+
+
+def build_pipeline(credentials_filepath, group=None):
+    """
+    Args:
+        group (Group): Defaults to the original group of Jess and Dan
+    """
+    group = _default_group(group)
+    return ScoringPipeline(
+        get_store_factory(credentials_filepath, group),
+        get_stats_store(group),
+        snapshot_store=get_snapshot_store(group),
+        group=group,
+    )
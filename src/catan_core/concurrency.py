@@ -0,0 +1,60 @@
+"""
+Runs the independent I/O of a request at the same time. IE. /send reads the aggregates from S3 while the sheet's header
+is fetched, and writes them back while the message log is written.
+
+The threads are kept for as long as the lambda container lives. The calls they make share the boto3 clients in
+catan_core.aws, which are safe to use from more than one thread once they are created. The httplib2 connection under
+the Sheets service is not, so each thread builds its own service the first time it calls Sheets, see
+catan_core.storage.ThreadLocalSheetsService.
+"""
+
+import threading
+
+MAX_WORKERS = 4
+
+_EXECUTOR = None
+_EXECUTOR_LOCK = threading.Lock()
+
+
+def _get_executor():
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _EXECUTOR_LOCK:
+            if _EXECUTOR is None:
+                from concurrent.futures import ThreadPoolExecutor
+
+                _EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="catan-io")
+    return _EXECUTOR
+
+
+def run_concurrently(*funcs):
+    """
+    Calls every function at the same time and waits for all of them. The first one runs in the calling thread, so a
+    single function never waits on a thread, and it is not meant to be nested inside a function it runs.
+    Args:
+        funcs (callable): Functions without arguments. None is skipped and returns None.
+    Returns:
+        list: What each function returned, in order
+    Raises:
+        The first exception, in the order of `funcs`, once every function has finished
+    """
+    calls = [(i, func) for i, func in enumerate(funcs) if func is not None]
+    results = [None] * len(funcs)
+    if not calls:
+        return results
+
+    futures = [(i, _get_executor().submit(func)) for i, func in calls[1:]]
+    errors = []
+    first_index, first_func = calls[0]
+    try:
+        results[first_index] = first_func()
+    except Exception as e:
+        errors.append((first_index, e))
+    for i, future in futures:
+        try:
+            results[i] = future.result()
+        except Exception as e:
+            errors.append((i, e))
+    if errors:
+        raise min(errors, key=lambda error: error[0])[1]
+    return results
@@ -0,0 +1,136 @@
+"""
+Groups of players that each keep their own record, IE. a household or a game night. A group has its own roster, its
+own sheet tab and its own keys in the config bucket, so a request only ever reads its own group's history.
+
+The default group is the original one: Jess and Dan, Sheet1 and the original keys. Every other group is kept under
+GROUPS_PREFIX as <group id>/group.json, next to the group's aggregates, snapshot and message log.
+"""
+
+import re
+import time
+from collections import OrderedDict
+
+from catan_core import tracing
+from catan_core.s3 import get_s3_json, put_s3_json
+
+DEFAULT_GROUP_ID = "default"
+DEFAULT_PLAYERS = ["Jess", "Dan"]
+DEFAULT_SHEET_NAME = "Sheet1"
+# Group ids end up in S3 keys and sheet tab names, so they are kept to a safe alphabet
+GROUP_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9-]{0,39}$")
+MAX_PLAYERS = 12
+GROUP_CACHE_SECONDS = 300
+MAX_CACHED_GROUPS = 1000
+
+
+class Group:
+    """
+    Args:
+        group_id (str): Lower case letters, digits and dashes
+        players (list): The roster, in the order records are listed in
+        sheet_name (str): The group's tab in the spreadsheet
+        prefix (str): Where the group's objects are kept in the config bucket. None keeps the original keys.
+    """
+
+    def __init__(self, group_id, players, sheet_name=None, prefix=None):
+        self.group_id = group_id
+        self.players = list(players)
+        self.sheet_name = sheet_name or (DEFAULT_SHEET_NAME if prefix is None else group_id)
+        self.prefix = prefix
+
+    def key(self, base_key):
+        """
+        The group's own version of a key in the config bucket. IE. "main/aggregates.json" is
+        "main/groups/<group id>/aggregates.json" and the "main/messages/" prefix is "main/groups/<group id>/messages/".
+        """
+        if self.prefix is None:
+            return base_key
+        name = base_key.rstrip("/").rsplit("/", 1)[-1]
+        return f"{self.prefix}{name}{'/' if base_key.endswith('/') else ''}"
+
+    def to_dict(self):
+        return {"group_id": self.group_id, "players": self.players, "sheet_name": self.sheet_name}
+
+
+def validate_group(group_id, players):
+    errors = []
+    if not GROUP_ID_PATTERN.match(group_id or ""):
+        errors.append("The group id should be 1 to 40 lower case letters, digits or dashes")
+    if not 2 <= len(players) <= MAX_PLAYERS:
+        errors.append(f"A group should have 2 to {MAX_PLAYERS} players")
+    if len({player.lower() for player in players}) != len(players):
+        errors.append("Every player in a group should have a different name")
+    if any(not player.strip() or re.search(r"[.]| by ", player) for player in players):
+        errors.append("Player names can not be blank or contain a period or ' by '")
+    if errors:
+        raise Exception(f"The group is not valid. {'. '.join(errors)}")
+
+
+class S3GroupRegistry:
+    """
+    Looks groups up by id. Each group is its own small object in S3, so a lookup costs one GET however many groups there
+    are, and it is cached in the warm lambda for GROUP_CACHE_SECONDS.
+    """
+
+    # Shared by every registry in the lambda container. Ordered by last use so the least recently used group is dropped.
+    _cache = OrderedDict()
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _group_key(self, group_id):
+        return f"{self.prefix}{group_id}/group.json"
+
+    def get(self, group_id=None):
+        """
+        Args:
+            group_id (str): None or "default" for the default group
+        Returns:
+            Group
+        """
+        if group_id in (None, "", DEFAULT_GROUP_ID):
+            return Group(DEFAULT_GROUP_ID, DEFAULT_PLAYERS)
+        if not GROUP_ID_PATTERN.match(group_id):
+            raise Exception(f"Unknown group {group_id}")
+
+        cache_key = (self.bucket, self.prefix, group_id)
+        cached = self._cache.get(cache_key)
+        if cached and cached[0] > time.time():
+            self._cache.move_to_end(cache_key)
+            return cached[1]
+
+        with tracing.span("group_read"):
+            try:
+                group_dict = get_s3_json(self.bucket, self._group_key(group_id))
+            except Exception as e:
+                if "NoSuchKey" not in str(e):
+                    raise e
+                raise Exception(f"Unknown group {group_id}")
+        group = Group(
+            group_dict["group_id"], group_dict["players"], group_dict["sheet_name"], f"{self.prefix}{group_id}/"
+        )
+        self._cache[cache_key] = (time.time() + GROUP_CACHE_SECONDS, group)
+        self._cache.move_to_end(cache_key)
+        while len(self._cache) > MAX_CACHED_GROUPS:
+            self._cache.popitem(last=False)
+        return group
+
+    def create(self, group_id, players):
+        """
+        Saves a new group. Its sheet tab has to be added separately, see GoogleSheets.add_sheet.
+        Returns:
+            Group
+        """
+        validate_group(group_id, players)
+        try:
+            self.get(group_id)
+        except Exception as e:
+            if "Unknown group" not in str(e):
+                raise e
+        else:
+            raise Exception(f"The group {group_id} already exists")
+        group = Group(group_id, players, prefix=f"{self.prefix}{group_id}/")
+        put_s3_json(self.bucket, self._group_key(group_id), group.to_dict())
+        self._cache.pop((self.bucket, self.prefix, group_id), None)
+        return group
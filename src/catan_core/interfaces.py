@@ -0,0 +1,148 @@
+"""
+The pieces of the scoring pipeline that can be swapped out. The pipeline only ever talks to these, so a new parser,
+storage backend or stats engine is a new subclass rather than a change to both lambdas.
+"""
+
+
+class Parser:
+    """Turns a text message into a row for the game history"""
+
+    def parse(self, received_message, game_date=None):
+        """
+        Args:
+            received_message (str): IE. "Jess by 5. Seafarers. Raining"
+            game_date (str): The date of the game as M/D/YYYY. Today when it is not given.
+        Returns:
+            dict: Column name to value
+        """
+        raise NotImplementedError
+
+
+class GameStore:
+    """
+    Where the game history is kept. `columns` is the header of the history. `last_row` is the row number of the last
+    game once it is known, with the header being row 1.
+    """
+
+    columns = []
+    last_row = None
+
+    def add_data(self, data_dict):
+        """
+        Appends one game.
+        Returns:
+            int: The last row before the append. None if the store can not tell, which makes the stats be rebuilt.
+        """
+        raise NotImplementedError
+
+    def add_rows(self, data_dicts):
+        """
+        Appends many games, in order.
+        Returns:
+            int: The last row before the append. None if the store can not tell, which makes the stats be rebuilt.
+        """
+        raise NotImplementedError
+
+    def get_all_data(self):
+        """
+        Returns:
+            list: Every game as a list of cell values in the order of `columns`. Trailing blank cells can be left off.
+        """
+        raise NotImplementedError
+
+    def get_rows(self, first_row):
+        """
+        Reads only the end of the history, IE. the games appended since a snapshot was taken.
+        Args:
+            first_row (int): Row number of the first game to read, with the header being row 1
+        Returns:
+            list: The games from `first_row` on, like get_all_data
+        """
+        raise NotImplementedError
+
+
+class StatsEngine:
+    """Answers the record questions that the reply to a score is built from. Records map a winner to their wins."""
+
+    last_row = 1
+
+    def add(self, data_dict):
+        raise NotImplementedError
+
+    def overall_records(self):
+        raise NotImplementedError
+
+    def game_records(self, game):
+        raise NotImplementedError
+
+    def conditions_records(self, data_dict):
+        """Records for the games of the same type that had at least all of the conditions in `data_dict`"""
+        raise NotImplementedError
+
+    def superset_conditions_records(self, game, conditions):
+        """Records for the games of type `game` that had at least all of `conditions`"""
+        raise NotImplementedError
+
+    def exact_conditions_records(self, game, conditions):
+        """Records for the games of type `game` that had exactly `conditions`"""
+        raise NotImplementedError
+
+    def subset_conditions_records(self, game, conditions):
+        """Records for the games of type `game` whose conditions were all among `conditions`, including none at all"""
+        raise NotImplementedError
+
+    def score_difference_wins(self, game, winner, score_diff):
+        raise NotImplementedError
+
+
+class StatsStore:
+    """Keeps a StatsEngine between invocations"""
+
+    def load(self):
+        """
+        Returns:
+            StatsEngine: The saved stats, or empty stats if they have never been saved
+        """
+        raise NotImplementedError
+
+    def save(self, stats):
+        raise NotImplementedError
+
+    def rebuild(self, store):
+        """
+        Builds stats from the whole game history, IE. once they no longer line up with the store
+        Args:
+            store (GameStore): The store the games are in
+        Returns:
+            StatsEngine
+        """
+        raise NotImplementedError
+
+
+class GameQueue:
+    """
+    A durable FIFO of games waiting to be written to the GameStore. An entry that is received but not deleted goes
+    back in the queue, so it is retried until it is written.
+    """
+
+    def send(self, body, deduplication_id):
+        """
+        Args:
+            body (dict): JSON serializable entry
+            deduplication_id (str): Sending the same id again while the first entry is still queued is a no-op
+        """
+        raise NotImplementedError
+
+    def receive(self, max_entries):
+        """
+        Returns:
+            list: Up to `max_entries` of the oldest entries as {"receipt": ..., "body": ..., "receive_count": int}
+        """
+        raise NotImplementedError
+
+    def delete(self, receipt):
+        raise NotImplementedError
+
+    def release(self, receipt):
+        """Puts a received entry back in the queue straight away, so the next receive retries it"""
+        raise NotImplementedError
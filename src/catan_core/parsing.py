@@ -0,0 +1,244 @@
+import csv
+import io
+import re
+from datetime import date
+from datetime import datetime as dt
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+from catan_core.groups import DEFAULT_PLAYERS
+from catan_core.interfaces import Parser
+
+IMPORT_DATE_PATTERN = re.compile(r"^(\d{1,2}/\d{1,2}/\d{4})\s+(.*)$")
+GAME_DATE_PATTERN = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+GAME_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+NUMBER_WORDS = {
+    word: str(number)
+    for number, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen sixteen "
+        "seventeen eighteen nineteen twenty".split()
+    )
+}
+
+
+def today():
+    """The date a game is recorded under when none is given, IE. "1/31/2024" """
+    now = dt.now(GAME_TIMEZONE)
+    return f"{now.month}/{now.day}/{now.year}"
+
+
+def parse_game_date(game_date):
+    """
+    Checks that a game date is a real date, IE. not "2/30/2024", before it is written to the store.
+    Args:
+        game_date (str): IE. "1/31/2024"
+    Returns:
+        str: The date as M/D/YYYY, IE. "01/31/2024" => "1/31/2024"
+    Raises:
+        MessageParseError
+    """
+    match = GAME_DATE_PATTERN.match(game_date.strip())
+    try:
+        month, day, year = (int(group) for group in match.groups())
+        parsed = date(year, month, day)
+    except (AttributeError, ValueError):
+        raise MessageParseError([INVALID_DATE_ERROR])
+    return f"{parsed.month}/{parsed.day}/{parsed.year}"
+
+
+def convert_csv_row_to_message(row):
+    """
+    Converts a row of a bulk import CSV, which has the sheet's columns as its header, back into a message and its date
+    so that it goes through exactly the same validation as a text.
+    Returns:
+        tuple: (message, game date or None)
+    """
+    row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+    conditions = [k[:-1] for k, v in row.items() if k.endswith("?") and v.lower() == "yes"]
+    message = ". ".join([f"{row.get('Winner', '')} by {row.get('Score difference', '')}", row.get("Game", "")] + conditions)
+    return message, row.get("Game date") or None
+
+
+def split_dated_message(line):
+    """Splits the game date off the start of an import line. IE. "1/31/2024 Jess by 5. Seafarers" """
+    match = IMPORT_DATE_PATTERN.match(line)
+    if match:
+        return match.group(2), match.group(1)
+    return line, None
+
+
+def parse_import(data: str, file_format: str, parser: Parser) -> tuple:
+    """
+    Parses a bulk import file into rows for the sheet. Every row is validated on its own so one bad row does not stop
+    the rest of the import.
+    Args:
+        data (str): The file contents
+        file_format (str): "csv" for a file with the sheet's columns as its header, or "messages" for one message per
+            line. A message line can start with the game date, IE. "1/31/2024 Jess by 5. Seafarers. Raining"
+        parser (Parser): Parses each row once it is turned into a message
+    Returns:
+        tuple: (rows as dictionaries, errors as [{"row": line number, "error": message}]). The error of a row that did
+            not follow the message format also has the MessageParseError `fields` that were wrong.
+    """
+    if file_format == "csv":
+        rows = enumerate(csv.DictReader(io.StringIO(data)), 2)
+        lines = ((i, row) for i, row in rows if any(isinstance(v, str) and v.strip() for v in row.values()))
+        to_message = convert_csv_row_to_message
+    elif file_format == "messages":
+        lines = ((i, line.strip()) for i, line in enumerate(data.splitlines(), 1) if line.strip())
+        to_message = split_dated_message
+    else:
+        raise Exception(f"Unknown import format '{file_format}'. Use 'csv' or 'messages'.")
+
+    data_dicts, errors = [], []
+    for line_number, line in lines:
+        try:
+            data_dicts.append(parser.parse(*to_message(line)))
+        except MessageParseError as e:
+            errors.append({"row": line_number, "error": f"{e.__class__.__name__}: {e}", "fields": e.errors})
+        except Exception as e:
+            errors.append({"row": line_number, "error": f"{e.__class__.__name__}: {e}"})
+    return data_dicts, errors
+
+
+class MessageParseError(Exception):
+    """
+    A message that does not follow the format. `errors` has one entry per field that is wrong, as
+    {"field": "winner"|"score_difference"|"game"|"game_date", "code": str, "message": str}, so a caller can point at
+    the field. The text of the exception is the same sentence the sender has always been replied with.
+    """
+
+    def __init__(self, errors):
+        self.errors = errors
+        error_messages = ". ".join(error["message"] for error in errors)
+        super().__init__(f"The message was not sent in the correct format. {error_messages}")
+
+
+# A game date given with the message (IE. for a backfill) that is not a real date
+INVALID_DATE_ERROR = {
+    "field": "game_date",
+    "code": "invalid_date",
+    "message": "The game date should be a real date as M/D/YYYY, IE. 1/31/2024",
+}
+
+
+class ParsedGame(NamedTuple):
+    winner: str
+    score_difference: str
+    game: str
+    conditions: tuple
+
+    def to_dict(self, game_date=None):
+        """The row for the store. The game is dated today unless a date is given (IE. for a backfill)."""
+        data_dict = {
+            "Game date": game_date or today(),
+            "Winner": self.winner,
+            "Score difference": self.score_difference,
+            "Game": self.game,
+        }
+        for condition in self.conditions:
+            data_dict[f"{condition}?"] = "Yes"
+        return data_dict
+
+
+class MessageParser(Parser):
+    """
+    The "Jess by 5. Seafarers. Raining" format that is texted in. The lookups for the roster are built once, so a
+    message is a single split and a few dictionary lookups, and every field that is wrong is reported together.
+    Also accepted: any case for the winner, "Jess won by 5", the score as a word ("Jess by five") and `aliases`.
+    Args:
+        players (list): The roster of the group. The winner has to be one of them.
+        aliases (dict): Other names for the players, IE. {"J": "Jess"}
+    """
+
+    def __init__(self, players=DEFAULT_PLAYERS, aliases=None):
+        self.players = list(players)
+        self.winners = {player.lower(): player for player in self.players}
+        for alias, player in (aliases or {}).items():
+            self.winners[alias.lower()] = player
+        # A game name should never have a player in it, that usually means a period is missing
+        self.player_pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(name) for name in sorted(self.winners, key=len, reverse=True)) + r")\b",
+            re.IGNORECASE,
+        )
+        # The errors only depend on the roster, so they are built once too
+        self.errors = {
+            "format": {
+                "field": "score_difference",
+                "code": "format",
+                "message": f"The first sentence should follow the format of '{self.players[0]} by 5'",
+            },
+            "unknown_player": {
+                "field": "winner",
+                "code": "unknown_player",
+                "message": f"The winner should be one of {', '.join(self.players)}",
+            },
+            "not_a_number": {
+                "field": "score_difference",
+                "code": "not_a_number",
+                "message": "The score difference should be a whole number, IE. 5 or five",
+            },
+            "missing": {"field": "game", "code": "missing", "message": "The second sentence should be the game name"},
+            "contains_player": {
+                "field": "game",
+                "code": "contains_player",
+                "message": "The second sentence should only be the game name",
+            },
+        }
+
+    def parse_game(self, received_message):
+        """
+        Returns:
+            ParsedGame
+        Raises:
+            MessageParseError
+        """
+        # One split into sentences and one into the words of the first. Everything after that is a dictionary lookup.
+        sentences = received_message.split(".")
+        words = sentences[0].split()
+        errors = []
+        winner = score_difference = None
+        if len(words) < 3 or words[-2].lower() != "by":
+            errors.append(self.errors["format"])
+        else:
+            name_words = words[:-2]
+            if len(name_words) > 1 and name_words[-1].lower() == "won":
+                name_words.pop()
+            winner = self.winners.get(" ".join(name_words).lower())
+            if winner is None:
+                errors.append(self.errors["unknown_player"])
+            score = words[-1]
+            score_difference = str(int(score)) if score.isdecimal() else NUMBER_WORDS.get(score.lower())
+            if score_difference is None:
+                errors.append(self.errors["not_a_number"])
+
+        game = sentences[1].strip() if len(sentences) > 1 else ""
+        if not game:
+            errors.append(self.errors["missing"])
+        elif self.player_pattern.search(game):
+            errors.append(self.errors["contains_player"])
+
+        if errors:
+            raise MessageParseError(errors)
+        conditions = tuple(condition for condition in map(str.strip, sentences[2:]) if condition)
+        return ParsedGame(winner, score_difference, game, conditions)
+
+    def parse(self, received_message, game_date=None):
+        """
+        Raises:
+            MessageParseError: With the errors of the message and of `game_date` together
+        """
+        date_errors = []
+        if game_date is not None:
+            try:
+                game_date = parse_game_date(game_date)
+            except MessageParseError as e:
+                date_errors = e.errors
+        try:
+            game = self.parse_game(received_message)
+        except MessageParseError as e:
+            raise MessageParseError(e.errors + date_errors)
+        if date_errors:
+            raise MessageParseError(date_errors)
+        return game.to_dict(game_date)
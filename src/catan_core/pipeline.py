@@ -0,0 +1,253 @@
+import re
+import time
+import uuid
+
+from catan_core import analytics, tracing
+from catan_core.concurrency import run_concurrently
+from catan_core.groups import DEFAULT_GROUP_ID, DEFAULT_PLAYERS, Group
+from catan_core.parsing import MessageParser, parse_import
+from catan_core.stats import build_response
+
+IDEMPOTENCY_KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class ScoringPipeline:
+    """
+    Records games and answers with the records. Both lambdas are thin adapters around this.
+    Args:
+        store_factory (callable): Returns the GameStore. It is only called once a message has parsed, so a malformed
+            message is answered without setting up the storage backend.
+        stats_store (StatsStore): Loads and saves the stats between invocations
+        parser (Parser): Defaults to the texted "Jess by 5. Seafarers. Raining" format for the group's players
+        snapshot_store (S3SnapshotStore): Keeps the history snapshot behind `history_stats` between lambda containers.
+            None keeps it in memory only.
+        group (Group): The group the games are recorded for. Defaults to the original group of Jess and Dan.
+    """
+
+    def __init__(self, store_factory, stats_store, parser=None, snapshot_store=None, group=None):
+        self.store_factory = store_factory
+        self.stats_store = stats_store
+        self.group = group or Group(DEFAULT_GROUP_ID, DEFAULT_PLAYERS)
+        self.parser = parser or MessageParser(self.group.players)
+        self.snapshot_store = snapshot_store
+
+    def _load_stats(self):
+        with tracing.span("aggregates_read"):
+            return self.stats_store.load()
+
+    def _save_stats(self, stats):
+        with tracing.span("aggregates_write"):
+            self.stats_store.save(stats)
+
+    def _save_stats_after_reply(self, stats):
+        """
+        Saves the stats once the reply is already built, so a failure is only counted rather than replied with.
+        Stats that were not saved do not line up with the store, so the next write rebuilds them.
+        """
+        try:
+            self._save_stats(stats)
+        except Exception as e:
+            tracing.count("AggregatesWriteErrors")
+            tracing.set_property("Error", e.__class__.__name__)
+
+    def _finish(self, reply, stats, on_reply):
+        """Saves the stats and hands the reply to `on_reply` at the same time. Neither depends on the other."""
+        save = (lambda: self._save_stats_after_reply(stats)) if stats is not None else None
+        run_concurrently(save, (lambda: on_reply(reply)) if on_reply else None)
+
+    def _record(self, data_dicts, store=None, stats=None, save=True):
+        """
+        Appends games to the store and counts them in the stats.
+        The stats are rebuilt from the store if they do not line up with it (IE. the sheet was edited by hand).
+        Args:
+            store (GameStore): Already built by the caller. Built here, at the same time as the stats are loaded, if not.
+            stats (StatsEngine): Already loaded by the caller, along with `store`
+            save (bool): Save the stats before returning. Otherwise the caller saves them.
+        """
+        if store is None:
+            # Setting up the store (IE. the sheet's header and credentials) and loading the stats are independent
+            store, stats = run_concurrently(self.store_factory, self._load_stats)
+        previous_last_row = store.add_data(data_dicts[0]) if len(data_dicts) == 1 else store.add_rows(data_dicts)
+        # A store that can not tell where the games went can not be checked against the stats, so they are rebuilt
+        if previous_last_row is not None and previous_last_row == stats.last_row:
+            for data_dict in data_dicts:
+                stats.add(data_dict)
+            stats.last_row = previous_last_row + len(data_dicts)
+        else:
+            tracing.count("AggregatesRebuilt")
+            stats = self.stats_store.rebuild(store)
+        if save:
+            self._save_stats(stats)
+        return stats
+
+    def _reply(self, stats, data_dict):
+        game, score_diff, winner = data_dict["Game"], data_dict["Score difference"], data_dict["Winner"]
+        with tracing.span("query"):
+            overall_records = stats.overall_records()
+            game_records = stats.game_records(game)
+            conditions_records = stats.conditions_records(data_dict)
+            score_diff_wins = stats.score_difference_wins(game, winner, score_diff)
+        with tracing.span("response_build"):
+            return build_response(
+                overall_records,
+                game_records,
+                conditions_records,
+                winner,
+                game,
+                score_diff,
+                score_diff_wins,
+                self.group.players,
+            )
+
+    def score(self, received_message, on_reply=None):
+        """
+        Records the game in a message and builds the reply. Any error is returned as the reply so the sender sees it.
+        Args:
+            received_message (str): IE. "Jess by 5. Seafarers. Raining"
+            on_reply (callable): Called with the reply (IE. to send it) while the stats are being saved
+        Returns:
+            str
+        """
+        stats = None
+        try:
+            with tracing.span("parse"):
+                data_dict = self.parser.parse(received_message)
+            stats = self._record([data_dict], save=False)
+            reply = self._reply(stats, data_dict)
+        except Exception as e:
+            tracing.set_property("Error", e.__class__.__name__)
+            reply = f"{e.__class__.__name__}: {e}"
+        self._finish(reply, stats, on_reply)
+        return reply
+
+    def enqueue_score(self, received_message, queue, idempotency_key=None, on_reply=None):
+        """
+        Write-behind version of `score`. The game is validated and queued, and the reply is built from the saved stats
+        plus this game without waiting for the store. `write_queued` writes the game later.
+        Args:
+            received_message (str): IE. "Jess by 5. Seafarers. Raining"
+            queue (GameQueue): The write-behind queue
+            idempotency_key (str): Identifies the submission so that a resend is only written once. Random if not given.
+            on_reply (callable): Called with the reply, IE. to send it
+        Returns:
+            str
+        """
+        try:
+            with tracing.span("parse"):
+                data_dict = self.parser.parse(received_message)
+            if idempotency_key is None:
+                idempotency_key = uuid.uuid4().hex
+            elif not IDEMPOTENCY_KEY_PATTERN.match(idempotency_key):
+                raise Exception("The idempotency key should be 1 to 64 letters, digits, dashes or underscores")
+            body = {"idempotency_key": idempotency_key, "game": data_dict, "group": self.group.group_id}
+
+            def send():
+                with tracing.span("queue_send"):
+                    queue.send(body, idempotency_key)
+
+            _, stats = run_concurrently(send, self._load_stats)
+            # Only counted for the reply. The stats are saved by write_queued once the game is in the store.
+            stats.add(data_dict)
+            reply = self._reply(stats, data_dict)
+        except Exception as e:
+            tracing.set_property("Error", e.__class__.__name__)
+            reply = f"{e.__class__.__name__}: {e}"
+        self._finish(reply, None, on_reply)
+        return reply
+
+    def write_queued(self, entries, applied_keys):
+        """
+        Writes games taken off the write-behind queue, in order, skipping any whose idempotency key was already written.
+        The games are saved as a pending write before they are appended and their keys are only applied once they have
+        been. Any failure from there on may come after the rows landed, so the next attempt reads the rows past the
+        pending write's last row and applies its keys if its games are there, rather than appending them again.
+        Args:
+            entries (list): Queue entries of this pipeline's group as {"idempotency_key": str, "game": data_dict}
+            applied_keys (S3AppliedKeys): Idempotency keys of the games already written
+        Returns:
+            int: Number of games written
+        """
+        # The keys decide which games are written, but the store and the stats can be set up at the same time
+        store, stats, (keys, pending) = run_concurrently(self.store_factory, self._load_stats, applied_keys.load)
+        if pending is not None and self._pending_landed(store, pending):
+            tracing.count("PendingWritesLanded")
+            keys = keys + pending["keys"]
+        seen = set(keys)
+        data_dicts, new_keys = [], []
+        for entry in entries:
+            if entry["idempotency_key"] in seen:
+                tracing.count("DuplicatesSkipped")
+                continue
+            seen.add(entry["idempotency_key"])
+            new_keys.append(entry["idempotency_key"])
+            data_dicts.append(entry["game"])
+        if data_dicts:
+            # The stats are behind the store if anything, so the games can only be past their last row
+            applied_keys.save(keys, {"after_row": stats.last_row, "keys": new_keys, "games": data_dicts})
+            stats = self._record(data_dicts, store, stats, save=False)
+            run_concurrently(lambda: self._save_stats(stats), lambda: applied_keys.save(keys + new_keys))
+        elif pending is not None:
+            applied_keys.save(keys)
+        return len(data_dicts)
+
+    @staticmethod
+    def _pending_landed(store, pending):
+        """
+        Whether the games of a pending write are in the store, IE. the append went through but a later step failed.
+        They are appended in one request, so either they are all in the rows past `after_row`, in order, or none are.
+        """
+        with tracing.span("pending_check"):
+            rows = store.get_rows(pending["after_row"] + 1)
+
+        def cells(pairs):
+            # Compared as text, since the store gives back what it made of the values, IE. 5 for "5"
+            return {column: str(value).strip() for column, value in pairs if value not in (None, "")}
+
+        games = [cells((column, game.get(column)) for column in store.columns) for game in pending["games"]]
+        written = [cells(zip(store.columns, row)) for row in rows]
+        return any(written[i : i + len(games)] == games for i in range(len(written) - len(games) + 1))
+
+    def history_stats(self, snapshot_name, window=analytics.DEFAULT_WINDOW, points=analytics.DEFAULT_POINTS):
+        """
+        Streaks, rolling win rates, win matrices, histograms and trends for the whole history, see catan_core.analytics.
+        The columnar snapshot they are computed from is cached. Once the stats count more rows than it has, only the new
+        rows are read from the store, so a warm call never reads the whole store.
+        Args:
+            snapshot_name (str): Names the cached snapshot, IE. the storage backend
+            window (int): Number of games the rolling win rate is over
+            points (int): Number of the most recent games the rolling win rate is given for
+        Returns:
+            dict
+        """
+        with tracing.span("aggregates_read"):
+            last_row = self.stats_store.load().last_row
+
+        snapshot = analytics.get_snapshot(snapshot_name, last_row, self.store_factory, self.snapshot_store)
+        with tracing.span("stats_compute"):
+            return analytics.compute_stats(snapshot, window, points)
+
+    def import_games(self, data: str, file_format: str, dry_run: bool = False) -> dict:
+        """
+        Validates and appends a whole file of games, writing them with GameStore.add_rows and counting them in the stats
+        in one go.
+        Args:
+            data (str): The file contents
+            file_format (str): "csv" or "messages", see parse_import
+            dry_run (bool): Only validate the rows
+        Returns:
+            dict: Report of the number of rows imported, the errors of the rows that were skipped and the throughput
+        """
+        start = time.perf_counter()
+        with tracing.span("parse"):
+            data_dicts, errors = parse_import(data, file_format, self.parser)
+        if data_dicts and not dry_run:
+            self._record(data_dicts)
+        seconds = time.perf_counter() - start
+
+        return {
+            "imported": 0 if dry_run else len(data_dicts),
+            "valid": len(data_dicts),
+            "errors": errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(len(data_dicts) / seconds, 1) if seconds else None,
+        }
@@ -0,0 +1,252 @@
+"""
+The write-behind queue. In write-behind mode a score is answered as soon as it is queued, and `drain` or the SQS
+triggered lambda writes the queued games to the GameStore in batches.
+"""
+
+import json
+import os
+import time
+import uuid
+
+from catan_core import tracing
+from catan_core.aws import get_client
+from catan_core.groups import DEFAULT_GROUP_ID
+from catan_core.interfaces import GameQueue
+from catan_core.s3 import get_s3_json, put_s3_json
+
+# The games of a group go in one FIFO message group so they are written in the order they were sent. Games queued
+# without a group use the original message group.
+MESSAGE_GROUP_ID = "games"
+VISIBILITY_TIMEOUT = 90
+MAX_RECEIVES = 5
+DRAIN_BATCH_SIZE = 100
+DRAIN_RETRIES = 3
+# How many of the most recently written idempotency keys are remembered
+MAX_APPLIED_KEYS = 5000
+
+
+class SQSQueue(GameQueue):
+    """
+    A GameQueue on SQS. With a FIFO queue (the url ends in .fifo) the deduplication id is passed on to SQS, which
+    drops a repeat within 5 minutes. Entries received more than the queue's maxReceiveCount go to its dead letter queue.
+    """
+
+    def __init__(self, queue_url, wait_seconds=0):
+        self.queue_url = queue_url
+        self.wait_seconds = wait_seconds
+
+    @staticmethod
+    def _client():
+        return get_client("sqs")
+
+    def send(self, body, deduplication_id):
+        params = dict(QueueUrl=self.queue_url, MessageBody=json.dumps(body))
+        if self.queue_url.endswith(".fifo"):
+            message_group_id = body.get("group", DEFAULT_GROUP_ID)
+            if message_group_id == DEFAULT_GROUP_ID:
+                message_group_id = MESSAGE_GROUP_ID
+            params.update(MessageGroupId=message_group_id, MessageDeduplicationId=deduplication_id)
+        self._client().send_message(**params)
+        tracing.count("SQSCalls")
+
+    def receive(self, max_entries):
+        result = self._client().receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_entries, 10),
+            WaitTimeSeconds=self.wait_seconds,
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        tracing.count("SQSCalls")
+        return [
+            {
+                "receipt": message["ReceiptHandle"],
+                "body": json.loads(message["Body"]),
+                "receive_count": int(message.get("Attributes", {}).get("ApproximateReceiveCount", 1)),
+            }
+            for message in result.get("Messages", [])
+        ]
+
+    def delete(self, receipt):
+        self._client().delete_message(QueueUrl=self.queue_url, ReceiptHandle=receipt)
+        tracing.count("SQSCalls")
+
+    def release(self, receipt):
+        self._client().change_message_visibility(QueueUrl=self.queue_url, ReceiptHandle=receipt, VisibilityTimeout=0)
+        tracing.count("SQSCalls")
+
+
+class FileQueue(GameQueue):
+    """
+    Stand-in for SQS in a local directory, for local development and benchmarks. Each entry is a file under `ready/`,
+    named by the time it was sent so that listing the directory gives the queue order. Receiving an entry renames it
+    into `inflight/`, which is atomic, so two workers never get the same entry. An entry left in flight for longer than
+    the visibility timeout goes back to `ready/`, and one received more than `max_receives` times is moved to `dead/`.
+    """
+
+    def __init__(self, directory, visibility_timeout=VISIBILITY_TIMEOUT, max_receives=MAX_RECEIVES):
+        self.directory = directory
+        self.visibility_timeout = visibility_timeout
+        self.max_receives = max_receives
+        for state in ("ready", "inflight", "dead"):
+            os.makedirs(os.path.join(directory, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.directory, state, name)
+
+    def _write(self, path, entry):
+        # Write to a temporary file first so a reader never sees half an entry
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(temporary_path, path)
+
+    def send(self, body, deduplication_id):
+        suffix = f"-{deduplication_id}.json"
+        for state in ("ready", "inflight"):
+            if any(name.endswith(suffix) for name in os.listdir(os.path.join(self.directory, state))):
+                return
+        self._write(self._path("ready", f"{time.time_ns():020d}{suffix}"), {"body": body, "receive_count": 0})
+
+    def _requeue_expired(self):
+        now = time.time()
+        for name in os.listdir(os.path.join(self.directory, "inflight")):
+            if not name.endswith(".json"):
+                continue
+            path = self._path("inflight", name)
+            try:
+                if now - os.path.getmtime(path) > self.visibility_timeout:
+                    os.replace(path, self._path("ready", name))
+            except FileNotFoundError:
+                # Deleted or released by its worker in the meantime
+                pass
+
+    def receive(self, max_entries):
+        self._requeue_expired()
+        entries = []
+        for name in sorted(n for n in os.listdir(os.path.join(self.directory, "ready")) if n.endswith(".json")):
+            if len(entries) == max_entries:
+                break
+            path = self._path("inflight", name)
+            try:
+                os.replace(self._path("ready", name), path)
+            except FileNotFoundError:
+                # Another worker received it first
+                continue
+            with open(path) as f:
+                entry = json.load(f)
+            entry["receive_count"] += 1
+            if entry["receive_count"] > self.max_receives:
+                os.replace(path, self._path("dead", name))
+                continue
+            # Rewriting the entry also restarts its visibility timeout
+            self._write(path, entry)
+            entries.append({"receipt": name, "body": entry["body"], "receive_count": entry["receive_count"]})
+        return entries
+
+    def delete(self, receipt):
+        os.remove(self._path("inflight", receipt))
+
+    def release(self, receipt):
+        os.replace(self._path("inflight", receipt), self._path("ready", receipt))
+
+    def __len__(self):
+        states = ("ready", "inflight")
+        return sum(name.endswith(".json") for state in states for name in os.listdir(os.path.join(self.directory, state)))
+
+
+class S3AppliedKeys:
+    """
+    The idempotency keys of the most recently written games, kept as JSON in S3 along with the games of a write that has
+    started but is not known to have landed, IE. {"keys": [...], "pending": {"after_row": 11, "keys": [...],
+    "games": [...]}}. Objects saved before there were pending writes are just the list of keys.
+    """
+
+    def __init__(self, bucket, key, max_keys=MAX_APPLIED_KEYS):
+        self.bucket = bucket
+        self.key = key
+        self.max_keys = max_keys
+
+    def load(self):
+        """
+        Returns:
+            tuple: The applied keys, and the pending write or None
+        """
+        try:
+            applied = get_s3_json(self.bucket, self.key)
+        except Exception as e:
+            if "NoSuchKey" not in str(e):
+                raise e
+            return [], None
+        if isinstance(applied, list):
+            return applied, None
+        return applied["keys"], applied.get("pending")
+
+    def save(self, keys, pending=None):
+        """
+        Args:
+            keys (list): The applied keys, oldest first
+            pending (dict): The write about to be made, IE. the games, their keys and the last row before them
+        """
+        put_s3_json(self.bucket, self.key, {"keys": keys[-self.max_keys :], "pending": pending})
+
+
+def drain(
+    queue, get_pipeline, get_applied_keys, batch_size=DRAIN_BATCH_SIZE, retries=DRAIN_RETRIES, backoff_seconds=1.0
+):
+    """
+    Writes every queued game to the store, a batch at a time, in the order they were queued. The games of a batch are
+    written group by group, each with its own group's pipeline.
+    A group's games that still fail after `retries` go back in the queue and draining stops there, since writing the
+    games after them would put them out of order.
+    Args:
+        queue (GameQueue): The write-behind queue
+        get_pipeline (callable): Returns the ScoringPipeline that writes a group's games, given the group id
+        get_applied_keys (callable): Returns the S3AppliedKeys of a group, given the group id
+        batch_size (int): Games per batch
+        retries (int): Retries of a failed batch, with exponential backoff starting at `backoff_seconds`
+    Returns:
+        dict: Report of the games received, written and failed
+    """
+    report = {"batches": 0, "received": 0, "written": 0, "failed": 0}
+    while True:
+        entries = queue.receive(batch_size)
+        if not entries:
+            break
+        report["received"] += len(entries)
+        failed = False
+        for group_id, group_entries in group_entries_by_group(entries).items():
+            for attempt in range(retries + 1):
+                try:
+                    pipeline, applied_keys = get_pipeline(group_id), get_applied_keys(group_id)
+                    report["written"] += pipeline.write_queued([entry["body"] for entry in group_entries], applied_keys)
+                    break
+                except Exception as e:
+                    error = e
+                    if attempt < retries:
+                        time.sleep(backoff_seconds * 2**attempt)
+            else:
+                for entry in group_entries:
+                    queue.release(entry["receipt"])
+                report["failed"] += len(group_entries)
+                report["error"] = f"{group_id}: {error.__class__.__name__}: {error}"
+                failed = True
+                continue
+            for entry in group_entries:
+                queue.delete(entry["receipt"])
+        if failed:
+            break
+        report["batches"] += 1
+    return report
+
+
+def group_entries_by_group(entries):
+    """
+    Splits queue entries by the group they were sent for, keeping their order. Entries queued before there were groups
+    belong to the default group.
+    Returns:
+        dict: Group id to its entries
+    """
+    by_group = {}
+    for entry in entries:
+        by_group.setdefault(entry["body"].get("group", DEFAULT_GROUP_ID), []).append(entry)
+    return by_group
@@ -0,0 +1,75 @@
+"""
+JSON and binary objects in S3. The client is the shared one from catan_core.aws, so boto3 is only loaded by the routes
+that touch S3 and the connection pool is reused across invocations.
+"""
+
+import json
+
+from catan_core import tracing
+from catan_core.aws import get_client
+
+
+def put_s3_json(bucket: str, key: str, body: dict) -> None:
+    s3 = get_client("s3")
+    data = json.dumps(body).encode()
+    s3.put_object(Bucket=bucket, Key=key, Body=data)
+    tracing.count("S3Calls")
+    tracing.count("S3SentBytes", len(data))
+
+
+def list_s3_keys(bucket: str, prefix: str, max_keys: int, start_after: str = None) -> tuple:
+    """
+    Lists keys in ascending order
+    Returns:
+        tuple: (keys, whether there are more keys after them)
+    """
+    s3 = get_client("s3")
+    params = dict(Bucket=bucket, Prefix=prefix, MaxKeys=max_keys)
+    if start_after:
+        params["StartAfter"] = start_after
+    result = s3.list_objects_v2(**params)
+    tracing.count("S3Calls")
+    return [obj["Key"] for obj in result.get("Contents", [])], result.get("IsTruncated", False)
+
+
+def get_s3_json(bucket: str, key: str) -> dict:
+    tracing.count("S3Calls")
+    obj = get_client("s3").get_object(Bucket=bucket, Key=key)
+    data = obj["Body"].read()
+    tracing.count("S3ReceivedBytes", len(data))
+    return json.loads(data.decode())
+
+
+def put_s3_bytes(bucket: str, key: str, data: bytes) -> str:
+    """
+    Returns:
+        str: The ETag of the new object
+    """
+    s3 = get_client("s3")
+    result = s3.put_object(Bucket=bucket, Key=key, Body=data)
+    tracing.count("S3Calls")
+    tracing.count("S3SentBytes", len(data))
+    return result.get("ETag")
+
+
+def get_s3_bytes(bucket: str, key: str, etag: str = None) -> tuple:
+    """
+    Conditional GET. With an `etag` S3 answers 304 without a body if the object has not changed since.
+    Returns:
+        tuple: (data, etag). data is None when the object still has `etag`.
+    """
+    s3 = get_client("s3")
+    params = dict(Bucket=bucket, Key=key)
+    if etag:
+        params["IfNoneMatch"] = etag
+    tracing.count("S3Calls")
+    try:
+        obj = s3.get_object(**params)
+    except Exception as e:
+        if not etag or ("304" not in str(e) and "Not Modified" not in str(e)):
+            raise e
+        tracing.count("S3NotModified")
+        return None, etag
+    data = obj["Body"].read()
+    tracing.count("S3ReceivedBytes", len(data))
+    return data, obj.get("ETag")
@@ -0,0 +1,213 @@
+"""
+Every request GoogleSheets makes goes through the SheetsScheduler, which keeps it within the Sheets API quotas.
+
+Sheets allows a number of read and of write requests per minute. The scheduler spends a token from a read or a write
+bucket for each request, and waits for one to refill when the bucket is empty, so a burst of submissions is spread out
+rather than rejected. Other containers share the same quota without the buckets knowing, so a 429 is still possible: it
+is retried after the Retry-After the API sends, or with exponential backoff and full jitter. A read is retried on 5xx
+errors too, but a write is not: a 5xx can come after Sheets already appended the rows, and appending them again would
+count the games twice. A write that may have landed fails with its HttpError instead, and is never sent again here.
+
+Reads of the same range that are in flight at the same time share one request.
+"""
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+from catan_core import tracing
+
+# Sheets allows 60 read and 60 write requests per minute for each user, which is what the service account is
+READS_PER_MINUTE = int(os.environ.get("SHEETS_READS_PER_MINUTE", "60"))
+WRITES_PER_MINUTE = int(os.environ.get("SHEETS_WRITES_PER_MINUTE", "60"))
+# Share of the quota that can go straight away after a quiet spell. The rest refills evenly over the minute, so a
+# bigger burst means a lower steady rate.
+BURST_SHARE = 0.1
+QUOTA_WINDOW_SECONDS = 60
+MAX_RETRIES = 5
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 16
+# A request that cannot get a token or finish its retries in this long fails, rather than running out the lambda timeout
+MAX_WAIT_SECONDS = 20
+# A 429 is rejected before anything is written, so it is the only status a write is retried on
+RETRY_STATUSES = {"read": {429, 500, 502, 503, 504}, "write": {429}}
+
+
+class SheetsQuotaError(Exception):
+    """Sheets is still over its quota once the retries ran out"""
+
+
+class TokenBucket:
+    """
+    Lets `quota` requests through in any `window_seconds`. A `burst_share` of them go straight away after a quiet
+    spell and the rest refill evenly over the window, so a burst and what refills after it never add up to more than
+    the quota.
+    """
+
+    def __init__(self, quota, burst_share=BURST_SHARE, window_seconds=QUOTA_WINDOW_SECONDS):
+        if quota < 1 or not 0 < burst_share <= 1 or window_seconds <= 0:
+            raise Exception(
+                f"A Sheets quota needs at least 1 request, a burst share over 0 and up to 1, and a window over 0 "
+                f"seconds, not {quota}, {burst_share} and {window_seconds}"
+            )
+        self.quota = quota
+        # At least one token is left to refill over the window, or the bucket would never refill once the burst is spent
+        self.capacity = max(1, min(int(quota * burst_share), quota - 1))
+        self.rate = max(1, quota - self.capacity) / window_seconds
+        self.window_seconds = window_seconds
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout=MAX_WAIT_SECONDS):
+        """
+        Takes a token, waiting for one to refill if the bucket is empty
+        Returns:
+            float: Seconds spent waiting
+        Raises:
+            SheetsQuotaError: No token refilled within `timeout`
+        """
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            # The token is taken now even when it has not refilled yet, which books the caller's place in line
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+            if wait > timeout:
+                self.tokens += 1
+                raise SheetsQuotaError(f"Sheets is busy with {self.quota:g} requests a minute, try again in a minute")
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def _status(error):
+    """The HTTP status of a googleapiclient HttpError, or None for any other error"""
+    response = getattr(error, "resp", None)
+    return getattr(response, "status", None)
+
+
+def _retry_after(error):
+    """Seconds the API asked to wait before retrying, if it did"""
+    response = getattr(error, "resp", None)
+    try:
+        return float(response.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class SheetsScheduler:
+    """
+    Args:
+        reads_per_minute (int): Read quota. None turns the read bucket off.
+        writes_per_minute (int): Write quota. None turns the write bucket off.
+        max_retries (int): Retries of a request that got a 429, or a read that got a 5xx
+        window_seconds (float): The quotas are per this many seconds instead of a minute, IE. to simulate them quickly
+    """
+
+    def __init__(
+        self,
+        reads_per_minute=READS_PER_MINUTE,
+        writes_per_minute=WRITES_PER_MINUTE,
+        max_retries=MAX_RETRIES,
+        base_backoff_seconds=BASE_BACKOFF_SECONDS,
+        max_backoff_seconds=MAX_BACKOFF_SECONDS,
+        burst_share=BURST_SHARE,
+        window_seconds=QUOTA_WINDOW_SECONDS,
+    ):
+        self.buckets = {
+            "read": TokenBucket(reads_per_minute, burst_share, window_seconds) if reads_per_minute else None,
+            "write": TokenBucket(writes_per_minute, burst_share, window_seconds) if writes_per_minute else None,
+        }
+        self.max_retries = max_retries
+        self.base_backoff_seconds = base_backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def _backoff(self, attempt, error):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return retry_after
+        return random.uniform(0, min(self.max_backoff_seconds, self.base_backoff_seconds * 2**attempt))
+
+    def _execute(self, request, kind):
+        bucket = self.buckets[kind]
+        deadline = time.monotonic() + MAX_WAIT_SECONDS
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                waited = bucket.acquire(max(0, deadline - time.monotonic()))
+                if waited:
+                    tracing.count("SheetsQuotaWaits")
+                    tracing.count("SheetsQuotaWaitMs", int(waited * 1000))
+            try:
+                return request.execute()
+            except Exception as e:
+                status = _status(e)
+                if status not in RETRY_STATUSES[kind]:
+                    raise e
+                if status == 429:
+                    tracing.count("SheetsThrottled")
+                backoff = self._backoff(attempt, e)
+                if attempt == self.max_retries or time.monotonic() + backoff > deadline:
+                    if status == 429:
+                        raise SheetsQuotaError("Sheets is busy, try again in a minute") from e
+                    raise e
+                tracing.count("SheetsRetries")
+                time.sleep(backoff)
+
+    def read(self, request, key=None):
+        """
+        Runs a read request. A read with the same `key` as one that is already in flight waits for that one instead.
+        The result is then shared, so it must be treated as read only.
+        Args:
+            request: The googleapiclient request, not yet executed
+            key: Identifies the read, IE. (spreadsheet id, range). None never shares.
+        Returns:
+            dict: The response
+        """
+        if key is None:
+            return self._execute(request, "read")
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+        if not leader:
+            tracing.count("SheetsReadsCoalesced")
+            return future.result()
+
+        try:
+            result = self._execute(request, "read")
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise e
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def write(self, request):
+        """Runs a write request. Writes are never shared, and only retried when they were throttled."""
+        return self._execute(request, "write")
+
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+
+def get_scheduler():
+    """The scheduler shared by every GoogleSheets in the lambda container, since they all share the same quota"""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = SheetsScheduler()
+        return _SCHEDULER
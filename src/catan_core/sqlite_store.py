@@ -0,0 +1,228 @@
+"""
+SQLite storage backend. The games are the system of record here and the indexes answer the record questions
+directly, so neither a full read of the history nor the S3 aggregates are needed to reply to a score.
+
+SQLite only keeps data across invocations where its file does, IE. a local machine or a lambda with EFS mounted.
+"""
+
+import sqlite3
+import threading
+
+from catan_core.aggregates import RecordAggregates, get_conditions
+from catan_core.interfaces import GameStore, StatsEngine, StatsStore
+
+# The fixed columns are real columns so they can be indexed. Every other column of the sheet (the conditions) is a
+# row in `game_values`, so a new condition never changes the schema.
+BASE_COLUMNS = {"Game date": "game_date", "Winner": "winner", "Score difference": "score_difference", "Game": "game"}
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS columns (position INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS games (
+    row INTEGER PRIMARY KEY,
+    game_date TEXT NOT NULL DEFAULT '',
+    winner TEXT NOT NULL DEFAULT '',
+    score_difference TEXT NOT NULL DEFAULT '',
+    game TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS games_by_winner ON games (winner);
+CREATE INDEX IF NOT EXISTS games_by_game ON games (game, winner);
+CREATE INDEX IF NOT EXISTS games_by_score_difference ON games (game, winner, score_difference);
+CREATE TABLE IF NOT EXISTS game_values (
+    row INTEGER NOT NULL REFERENCES games (row),
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (row, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS game_values_by_condition ON game_values (name, value, row);
+"""
+
+# One connection per database file for as long as the process lives
+_CONNECTIONS = {}
+_CONNECTIONS_LOCK = threading.Lock()
+
+
+def get_connection(path):
+    with _CONNECTIONS_LOCK:
+        if path not in _CONNECTIONS:
+            # Transactions are started explicitly, so autocommit mode is used outside of them
+            connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+            _CONNECTIONS[path] = connection
+        return _CONNECTIONS[path]
+
+
+def get_last_row(connection):
+    """The row number the last game would have in the sheet, with the header being row 1"""
+    return connection.execute("SELECT COALESCE(MAX(row), 1) FROM games").fetchone()[0]
+
+
+class SQLiteStore(GameStore):
+    """
+    A GameStore in a SQLite database. Rows are numbered the way they would be in the sheet, so `last_row` means the
+    same thing for both backends and the stats can be checked against either of them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = get_connection(path)
+        self.columns = self._get_current_columns()
+        self.last_row = get_last_row(self.connection)
+
+    def _get_current_columns(self):
+        columns = [name for (name,) in self.connection.execute("SELECT name FROM columns ORDER BY position")]
+        return columns or list(BASE_COLUMNS)
+
+    def add_data(self, data_dict):
+        return self.add_rows([data_dict])
+
+    def add_rows(self, data_dicts):
+        """
+        Appends rows in one transaction
+        Returns:
+            int: The last row before the append
+        """
+        connection = self.connection
+        # IMMEDIATE takes the write lock up front, so two writers can not number their rows the same
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            columns = self._get_current_columns()
+            for data_dict in data_dicts:
+                columns += [k for k in data_dict if k not in columns]
+            connection.executemany(
+                "INSERT OR IGNORE INTO columns (position, name) VALUES (?, ?)", list(enumerate(columns))
+            )
+
+            previous_last_row = get_last_row(connection)
+            games, values = [], []
+            for row, data_dict in enumerate(data_dicts, previous_last_row + 1):
+                games.append([row] + [data_dict.get(name) or "" for name in BASE_COLUMNS])
+                values += [(row, k, v) for k, v in data_dict.items() if k not in BASE_COLUMNS and v]
+            connection.executemany(
+                "INSERT INTO games (row, game_date, winner, score_difference, game) VALUES (?, ?, ?, ?, ?)", games
+            )
+            connection.executemany("INSERT INTO game_values (row, name, value) VALUES (?, ?, ?)", values)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self.columns = columns
+        self.last_row = previous_last_row + len(data_dicts)
+        return previous_last_row
+
+    def get_all_data(self):
+        return self.get_rows(2)
+
+    def get_rows(self, first_row):
+        self.columns = self._get_current_columns()
+        positions = {name: i for i, name in enumerate(self.columns)}
+        rows = {}
+        for row, *base_values in self.connection.execute(
+            "SELECT row, game_date, winner, score_difference, game FROM games WHERE row >= ? ORDER BY row", (first_row,)
+        ):
+            cells = [""] * len(self.columns)
+            for name, value in zip(BASE_COLUMNS, base_values):
+                cells[positions[name]] = value
+            rows[row] = cells
+        for row, name, value in self.connection.execute(
+            "SELECT row, name, value FROM game_values WHERE row >= ?", (first_row,)
+        ):
+            rows[row][positions[name]] = value
+
+        # Drop blank cells at the end of each row the same way the Sheets API does
+        all_rows = []
+        for cells in rows.values():
+            while cells and not cells[-1]:
+                cells.pop()
+            all_rows.append(cells)
+        self.last_row = max(rows, default=get_last_row(self.connection))
+        return all_rows
+
+
+# Filters on the games table for conditions, which are every value other than the fixed columns that is "Yes"
+_HAS_CONDITION = "AND EXISTS (SELECT 1 FROM game_values v WHERE v.row = games.row AND v.name = ? AND v.value = 'Yes')"
+_CONDITION_COUNT = "(SELECT COUNT(*) FROM game_values v WHERE v.row = games.row AND v.value = 'Yes')"
+
+
+def _merge(*records):
+    merged = {}
+    for record in records:
+        for winner, wins in record.items():
+            merged[winner] = merged.get(winner, 0) + wins
+    return merged
+
+
+class SQLiteStats(StatsEngine):
+    """
+    Answers the record questions with indexed queries on the SQLite store, as of `loaded_row`. Games added with `add`
+    after that (IE. a game that is only queued so far) are counted in memory on top.
+    """
+
+    def __init__(self, connection, last_row):
+        self.connection = connection
+        self.loaded_row = last_row
+        self.last_row = last_row
+        self.pending = RecordAggregates()
+
+    def add(self, data_dict):
+        self.pending.add(data_dict)
+
+    def _win_counts(self, where="", params=()):
+        query = f"SELECT winner, COUNT(*) FROM games WHERE row <= ? AND winner != '' {where} GROUP BY winner"
+        return dict(self.connection.execute(query, (self.loaded_row, *params)).fetchall())
+
+    def overall_records(self):
+        return _merge(self._win_counts(), self.pending.overall_records())
+
+    def game_records(self, game):
+        return _merge(self._win_counts("AND game = ?", (game,)), self.pending.game_records(game))
+
+    def score_difference_wins(self, game, winner, score_diff):
+        wins = self._win_counts("AND game = ? AND winner = ? AND score_difference = ?", (game, winner, score_diff))
+        return wins.get(winner, 0) + self.pending.score_difference_wins(game, winner, score_diff)
+
+    def conditions_records(self, data_dict):
+        return self.superset_conditions_records(data_dict.get("Game"), get_conditions(data_dict))
+
+    def superset_conditions_records(self, game, conditions):
+        # Each condition is a primary key lookup per game of the type, which beats reading every game with any of them
+        conditions = sorted(set(conditions))
+        where = "AND game = ? " + " ".join([_HAS_CONDITION] * len(conditions))
+        records = self._win_counts(where, (game, *conditions))
+        return _merge(records, self.pending.superset_conditions_records(game, conditions))
+
+    def exact_conditions_records(self, game, conditions):
+        conditions = sorted(set(conditions))
+        where = " ".join(["AND game = ?"] + [_HAS_CONDITION] * len(conditions) + [f"AND {_CONDITION_COUNT} = ?"])
+        records = self._win_counts(where, (game, *conditions, len(conditions)))
+        return _merge(records, self.pending.exact_conditions_records(game, conditions))
+
+    def subset_conditions_records(self, game, conditions):
+        conditions = sorted(set(conditions))
+        placeholders = ", ".join("?" * len(conditions))
+        where = (
+            "AND game = ? AND NOT EXISTS ("
+            f"SELECT 1 FROM game_values v WHERE v.row = games.row AND v.value = 'Yes' AND v.name NOT IN ({placeholders}))"
+        )
+        records = self._win_counts(where, (game, *conditions))
+        return _merge(records, self.pending.subset_conditions_records(game, conditions))
+
+
+class SQLiteStatsStore(StatsStore):
+    """
+    The stats of a SQLite store are the store itself, so there is nothing to save and rebuilding is a reload, without
+    reading the games
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        connection = get_connection(self.path)
+        return SQLiteStats(connection, get_last_row(connection))
+
+    def save(self, stats):
+        pass
+
+    def rebuild(self, store):
+        return self.load()
+
@@ -0,0 +1,89 @@
+from catan_core import tracing
+from catan_core.aggregates import RecordAggregates
+from catan_core.groups import DEFAULT_PLAYERS
+from catan_core.interfaces import StatsStore
+from catan_core.s3 import get_s3_json, put_s3_json
+
+
+def determine_winner(records, players=DEFAULT_PLAYERS):
+    """
+    Describes who is ahead. IE. "Jess is winning 5-3", or with more players
+    "Jess is winning 5-3-1 (Jess 5, Dan 3, Sam 1)"
+    Args:
+        records (dict): Winner to their number of wins
+        players (list): The roster, every player is listed even without a win
+    Returns:
+        str
+    """
+    # Most wins first. A tie keeps the roster order.
+    standings = sorted(((records.get(player, 0), player) for player in players), key=lambda s: -s[0])
+    score = "-".join(str(wins) for wins, _ in standings)
+    if len(players) > 2:
+        score += " (" + ", ".join(f"{player} {wins}" for wins, player in standings) + ")"
+
+    leaders = [player for wins, player in standings if wins == standings[0][0]]
+    if len(leaders) == 1:
+        return f"{leaders[0]} is winning {score}"
+    if len(leaders) == len(players):
+        return f"it's a tie {score}"
+    return f"{' and '.join(leaders)} are tied for the lead {score}"
+
+
+def build_response(
+    overall_records,
+    game_records,
+    conditions_records,
+    winner,
+    game,
+    score_diff,
+    score_diff_wins,
+    players=DEFAULT_PLAYERS,
+):
+    """
+    Builds a message response based on:
+        1. The overall record
+        2. The record for just the game played
+        3. The amount of times the winner has won the game by the same score difference
+        4. The record for the current conditions
+    Each of the records maps a winner to their number of wins. `players` is the roster of the group.
+    """
+
+    # Get the winners in a sentence format for the response text message.
+    overall_winner = determine_winner(overall_records, players)
+    game_type_winner = determine_winner(game_records, players)
+    conditions_winner = determine_winner(conditions_records, players)
+
+    str_time = "times" if score_diff_wins > 1 else "time"
+    response = (
+        f"Congrats {winner}!\n"
+        f"Overall, {overall_winner}.\n"
+        f"{game_type_winner} in {game}.\n"
+        f"{winner} has won by {score_diff} in this game {score_diff_wins} {str_time}.\n"
+        f"For all matching conditions, {conditions_winner}."
+    )
+
+    return response
+
+
+class S3AggregatesStore(StatsStore):
+    """Keeps RecordAggregates as a JSON object in S3"""
+
+    def __init__(self, bucket, key):
+        self.bucket = bucket
+        self.key = key
+
+    def load(self):
+        try:
+            return RecordAggregates.from_dict(get_s3_json(self.bucket, self.key))
+        except Exception as e:
+            if "NoSuchKey" not in str(e):
+                raise e
+            return RecordAggregates()
+
+    def save(self, stats):
+        put_s3_json(self.bucket, self.key, stats.to_dict())
+
+    def rebuild(self, store):
+        rows = store.get_all_data()
+        with tracing.span("aggregates_build"):
+            return RecordAggregates.from_rows(rows, store.columns, store.last_row)
@@ -0,0 +1,354 @@
+import json
+import re
+import threading
+from datetime import date
+
+from catan_core import tracing
+from catan_core.interfaces import GameStore
+from catan_core.sheets_scheduler import get_scheduler
+
+SPREADSHEET_ID = "1-o3tpUS70-2iDRfhVVWWNVpEsSBuR0fCdFpU8DJzN_Y"
+SHEETS_EPOCH = date(1899, 12, 30)
+BULK_CHUNK_SIZE = 500
+RANGE_PATTERN = re.compile(r"^.*![A-Z]+\d+:([A-Z]+)(\d+)$")
+
+# Module level caches that live as long as the lambda container so warm invocations skip the client setup.
+# The Sheets services are keyed by credentials file. The header rows and sheet ids by spreadsheet and sheet name.
+_SHEETS_SERVICES = {}
+_SHEETS_COLUMNS = {}
+_SHEET_IDS = {}
+
+
+class ThreadLocalSheetsService:
+    """
+    The `spreadsheets()` resource, built once per thread. The httplib2 connection under a service is not thread-safe, so
+    each thread gets its own service and connection, all on the same credentials so the token is only refreshed once.
+    Args:
+        credentials: The scoped google-auth credentials
+    """
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.local = threading.local()
+
+    def _service(self):
+        service = getattr(self.local, "service", None)
+        if service is None:
+            from apiclient import discovery
+            from google_auth_httplib2 import AuthorizedHttp
+            from googleapiclient.http import build_http
+
+            with tracing.span("client_init"):
+                http = tracing.CountingHttp(build_http(), "Sheets", "sheets.googleapis.com")
+                authorized_http = AuthorizedHttp(self.credentials, http=http)
+                service = discovery.build(
+                    "sheets", "v4", http=authorized_http, static_discovery=True, cache_discovery=False
+                ).spreadsheets()
+            self.local.service = service
+        return service
+
+    def __getattr__(self, name):
+        # IE. values(), get() and batchUpdate() of the calling thread's service
+        return getattr(self._service(), name)
+
+
+def get_sheets_service(credentials_filepath):
+    """
+    Gets the Sheets service for a credentials file, setting it up only once per lambda container.
+    The discovery document bundled with google-api-python-client is used so building it never goes over the network.
+    The credentials are kept with the service, so they are only refreshed by google-auth once their token expires.
+    Requests to Sheets and their bytes are counted into the trace of the invocation in progress.
+    Args:
+        credentials_filepath (str): Path to the workload identity pool credentials
+    Returns:
+        ThreadLocalSheetsService: The `spreadsheets()` resource of whichever thread uses it
+    """
+    service = _SHEETS_SERVICES.get(credentials_filepath)
+    tracing.count("SheetsClientCacheHit", int(service is not None))
+    if service is None:
+        from google.auth import aws
+
+        with tracing.span("client_init"):
+            with open(credentials_filepath) as f:
+                raw_creds = json.load(f)
+            credentials = aws.Credentials.from_info(raw_creds)
+            scoped_credentials = credentials.with_scopes(["https://www.googleapis.com/auth/spreadsheets"])
+        service = _SHEETS_SERVICES.setdefault(credentials_filepath, ThreadLocalSheetsService(scoped_credentials))
+    return service
+
+
+class GoogleSheets(GameStore):
+    """
+    Works with data in Google Sheets and keeps track of the columns of a dataset as it goes.
+    Rows are always appended by Sheets itself, so the last row is only known after `add_data` or `get_all_data`.
+    Every request goes through the SheetsScheduler, which keeps them within the quota and retries them when throttled.
+    """
+
+    def __init__(self, credentials_filepath, sheet_name="Sheet1", spreadsheet_id=SPREADSHEET_ID):
+        self.service = get_sheets_service(credentials_filepath)
+        self.sheet_name = sheet_name
+        self.spreadsheet_id = spreadsheet_id
+        self.cache_key = (spreadsheet_id, sheet_name)
+        self.scheduler = get_scheduler()
+        self.last_row = None
+        # Once this store has written, its reads must see the write, so they no longer share a read already in flight
+        self.written = False
+        self._get_current_columns()
+
+    @staticmethod
+    def add_sheet(credentials_filepath, sheet_name, columns, spreadsheet_id=SPREADSHEET_ID):
+        """Adds a tab to the spreadsheet with `columns` as its header, IE. for a new group"""
+        service, scheduler = get_sheets_service(credentials_filepath), get_scheduler()
+        add_sheet = {"addSheet": {"properties": {"title": sheet_name}}}
+        scheduler.write(service.batchUpdate(spreadsheetId=spreadsheet_id, body={"requests": [add_sheet]}))
+        body = {"values": [list(columns)]}
+        params = dict(spreadsheetId=spreadsheet_id, range=f"{sheet_name}!A1", valueInputOption="RAW", body=body)
+        scheduler.write(service.values().update(**params))
+        _SHEETS_COLUMNS[(spreadsheet_id, sheet_name)] = list(columns)
+
+    @staticmethod
+    def _excel_column_name(n):
+        """Converts a number to an excel column name. IE. 1 => A, 27 => AA, 53 => BA, etc."""
+
+        result = ""
+        while n > 0:
+            # find the index of the next letter and concatenate the letter to the solution
+            # here index 0 corresponds to `A`, and 25 corresponds to `Z`
+            index = (n - 1) % 26
+            result += chr(index + ord("A"))
+            n = (n - 1) // 26
+
+        return result[::-1]
+
+    @staticmethod
+    def _cell_data(value):
+        """
+        Converts a value to Sheets CellData, typed the way the USER_ENTERED input option would parse it.
+        IE. "5" => a number, "1/31/2024" => a date, "Yes" => a string. Like USER_ENTERED, a date that does not exist
+        (IE. "2/30/2024") is kept as a string rather than failing the whole request.
+        """
+        if value is None:
+            return {}
+        if re.match(r"^\d+$", value):
+            return {"userEnteredValue": {"numberValue": int(value)}}
+        date_match = re.match(r"^(\d{1,2})/(\d{1,2})/(\d{4})$", value)
+        if date_match:
+            month, day, year = (int(group) for group in date_match.groups())
+            try:
+                serial_number = (date(year, month, day) - SHEETS_EPOCH).days
+            except ValueError:
+                return {"userEnteredValue": {"stringValue": value}}
+            return {
+                "userEnteredValue": {"numberValue": serial_number},
+                "userEnteredFormat": {"numberFormat": {"type": "DATE", "pattern": "M/d/yyyy"}},
+            }
+        return {"userEnteredValue": {"stringValue": value}}
+
+    def _row_data(self, values):
+        return {"values": [self._cell_data(value) for value in values]}
+
+    def _get_values(self, range_name, fresh=False):
+        request = self.service.values().get(spreadsheetId=self.spreadsheet_id, range=range_name)
+        key = None if fresh or self.written else (self.spreadsheet_id, range_name)
+        return self.scheduler.read(request, key)
+
+    def _write(self, request):
+        self.written = True
+        return self.scheduler.write(request)
+
+    def _get_current_columns(self, refresh=False):
+        # Columns are only ever added to the end of the header, so a cached header can only be missing columns.
+        # Rows appended with a short header are still correct, they just leave the unknown columns blank.
+        if refresh or self.cache_key not in _SHEETS_COLUMNS:
+            with tracing.span("header_read"):
+                result = self._get_values(f"{self.sheet_name}!1:1", fresh=refresh)
+            _SHEETS_COLUMNS[self.cache_key] = result.get("values", [[]])[0]
+        self.columns = list(_SHEETS_COLUMNS[self.cache_key])
+        self.last_col = self._excel_column_name(len(self.columns))
+        return self.columns
+
+    def _get_sheet_id(self):
+        if self.cache_key not in _SHEET_IDS:
+            params = dict(spreadsheetId=self.spreadsheet_id, fields="sheets.properties(sheetId,title)")
+            with tracing.span("sheet_id_read"):
+                result = self.scheduler.read(self.service.get(**params), (self.spreadsheet_id, "sheets"))
+            for sheet in result["sheets"]:
+                _SHEET_IDS[(self.spreadsheet_id, sheet["properties"]["title"])] = sheet["properties"]["sheetId"]
+        return _SHEET_IDS[self.cache_key]
+
+    def _get_additional_columns(self, data_dict):
+        return [k for k in data_dict.keys() if k not in self.columns]
+
+    def add_data(self, data_dict):
+        """
+        Appends `data_dict` as a new row in a single request. Any new columns are added to the header in that same request.
+        Sheets picks the row to write, so two submissions at the same time can never write over each other.
+        Args:
+            data_dict (dict): Column name to value
+        Returns:
+            int: The last row of the sheet before the append
+        """
+        return self.add_rows([data_dict])
+
+    def add_rows(self, data_dicts, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Appends rows in order. Rows that fit in one chunk and need no new columns go in a single values.append, which
+        reports where they went. Otherwise there is one batchUpdate per chunk and any new columns are added along with
+        the first chunk. batchUpdate does not report where the rows went, so the last row is read back afterwards.
+        Args:
+            data_dicts (list): Column name to value for each row, in the order they should be appended
+            chunk_size (int): Number of rows in each request
+        Returns:
+            int: The last row of the sheet before the append
+        """
+        if any(self._get_additional_columns(data_dict) for data_dict in data_dicts):
+            # Another lambda may have added the columns already, so check the live header before growing it
+            self._get_current_columns(refresh=True)
+        additional_columns = []
+        for data_dict in data_dicts:
+            additional_columns += [k for k in self._get_additional_columns(data_dict) if k not in additional_columns]
+        if not additional_columns and len(data_dicts) <= chunk_size:
+            return self._append_values(data_dicts)
+
+        if additional_columns:
+            tracing.set_property("AdditionalColumns", additional_columns)
+        for start in range(0, len(data_dicts), chunk_size):
+            self._append_with_batch_update(data_dicts[start : start + chunk_size], additional_columns)
+            additional_columns = []
+        # Read after the append, so rows someone else appended in the meantime can only make the rows before these look
+        # like more than the caller expects, which makes it rebuild rather than miscount
+        self.last_row = self._get_last_row()
+        return self.last_row - len(data_dicts)
+
+    def _append_values(self, data_dicts):
+        data = {"values": [[data_dict.get(col) for col in self.columns] for data_dict in data_dicts]}
+        params = dict(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{self.sheet_name}!A:{self.last_col}",
+            valueInputOption="USER_ENTERED",
+            insertDataOption="INSERT_ROWS",
+            body=data,
+        )
+        with tracing.span("row_append"):
+            result = self._write(self.service.values().append(**params))
+
+        # The rows are appended directly under the existing table, so the row before them was the last row
+        match = RANGE_PATTERN.match(result["updates"]["updatedRange"])
+        self.last_row = int(match.group(2))
+        return self.last_row - len(data_dicts)
+
+    def _append_with_batch_update(self, data_dicts, additional_columns):
+        # values.append cannot be batched with a header write, so the spreadsheet level batchUpdate is used instead.
+        # The requests in a batchUpdate are applied atomically, so the header and the rows land together or not at all.
+        sheet_id = self._get_sheet_id()
+        columns = self.columns + additional_columns
+        requests = []
+        if additional_columns:
+            requests += [
+                {"appendDimension": {"sheetId": sheet_id, "dimension": "COLUMNS", "length": len(additional_columns)}},
+                {
+                    "updateCells": {
+                        "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": len(self.columns)},
+                        "rows": [self._row_data(additional_columns)],
+                        "fields": "userEnteredValue",
+                    }
+                },
+            ]
+        requests.append(
+            {
+                "appendCells": {
+                    "sheetId": sheet_id,
+                    "rows": [self._row_data([data_dict.get(col) for col in columns]) for data_dict in data_dicts],
+                    "fields": "userEnteredValue,userEnteredFormat.numberFormat",
+                }
+            }
+        )
+        with tracing.span("header_update" if additional_columns else "row_append"):
+            self._write(self.service.batchUpdate(spreadsheetId=self.spreadsheet_id, body={"requests": requests}))
+
+        # Update the recorded last column and column list. The row the data went to is not reported by batchUpdate.
+        self.columns = columns
+        self.last_col = self._excel_column_name(len(self.columns))
+        self.last_row = None
+        _SHEETS_COLUMNS[self.cache_key] = list(self.columns)
+
+    def _get_last_row(self):
+        """The last row of the sheet, counted from the first column since every game has a date"""
+        with tracing.span("last_row_read"):
+            result = self._get_values(f"{self.sheet_name}!A:A", fresh=True)
+        return len(result.get("values", []))
+
+    def get_all_data(self):
+        with tracing.span("full_read"):
+            result = self._get_values(f"{self.sheet_name}!A2:{self.last_col}")
+        rows = result.get("values", [])
+        self.last_row = len(rows) + 1
+        return rows
+
+    def get_rows(self, first_row):
+        with tracing.span("rows_read"):
+            result = self._get_values(f"{self.sheet_name}!A{first_row}:{self.last_col}")
+        rows = result.get("values", [])
+        self.last_row = first_row + len(rows) - 1
+        return rows
+
+
+class MirroredStore(GameStore):
+    """
+    Writes go to `primary`, which is the system of record, and are then copied to the mirror (IE. the Google Sheet)
+    so it stays a readable export. Reads only ever use the primary. A failed copy does not fail the write: it is
+    counted as a MirrorErrors metric and `sync_mirror` fills in whatever the mirror is missing.
+    Args:
+        primary (GameStore): The system of record
+        mirror_factory (callable): Returns the mirror GameStore. It is only called once the primary write went through.
+    """
+
+    def __init__(self, primary, mirror_factory):
+        self.primary = primary
+        self.mirror_factory = mirror_factory
+
+    @property
+    def columns(self):
+        return self.primary.columns
+
+    @property
+    def last_row(self):
+        return self.primary.last_row
+
+    def add_data(self, data_dict):
+        return self.add_rows([data_dict])
+
+    def add_rows(self, data_dicts):
+        previous_last_row = self.primary.add_rows(data_dicts)
+        try:
+            with tracing.span("mirror_write"):
+                mirror_previous_last_row = self.mirror_factory().add_rows(data_dicts)
+            if None not in (previous_last_row, mirror_previous_last_row) and mirror_previous_last_row != previous_last_row:
+                tracing.set_property("MirrorRowsBehind", previous_last_row - mirror_previous_last_row)
+        except Exception as e:
+            tracing.count("MirrorErrors")
+            tracing.set_property("MirrorError", f"{e.__class__.__name__}: {e}")
+        return previous_last_row
+
+    def get_all_data(self):
+        return self.primary.get_all_data()
+
+    def get_rows(self, first_row):
+        return self.primary.get_rows(first_row)
+
+
+def sync_mirror(primary, mirror, dry_run=False):
+    """
+    Appends the games that are in `primary` but not yet in `mirror`. Games are only ever appended, so the mirror is
+    missing the rows past its own last row.
+    Returns:
+        int: Number of games appended
+    """
+    primary_rows, mirror_rows = primary.get_all_data(), mirror.get_all_data()
+    missing = [
+        {column: value for column, value in zip(primary.columns, row) if value}
+        for row in primary_rows[len(mirror_rows) :]
+    ]
+    if missing and not dry_run:
+        mirror.add_rows(missing)
+    return len(missing)
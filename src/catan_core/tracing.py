@@ -0,0 +1,180 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Fraction of invocations that run the sampling profiler, IE. 0.01 profiles 1 in 100. Off by default.
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_TOP_STACKS = 15
+PROFILE_STACK_DEPTH = 12
+
+# The trace of the invocation in progress. A lambda container only runs one invocation at a time.
+_current = None
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of one thread from a background thread every `interval_ms` and counts how often each stack is
+    seen. Sampling instead of tracing every call keeps the overhead flat no matter how hot the code is.
+    """
+
+    def __init__(self, thread_id, interval_ms=PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.interval = interval_ms / 1000
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None and len(stack) < PROFILE_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def top(self, n=PROFILE_TOP_STACKS):
+        """The most sampled stacks, outermost frame first"""
+        return [{"stack": list(stack), "samples": count} for stack, count in self.samples.most_common(n)]
+
+
+class Trace:
+    """
+    Timings and counters for one invocation, printed as a single CloudWatch embedded metric format line by `emit`.
+    Spans with the same name add up, so a phase that runs more than once is reported as its total time.
+    """
+
+    def __init__(self, namespace, route, profile=False, **properties):
+        self.namespace = namespace
+        self.route = route
+        self.properties = {k: v for k, v in properties.items() if v is not None}
+        self.spans = {}
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.profiler = SamplingProfiler(threading.get_ident()) if profile else None
+        if self.profiler:
+            self.profiler.start()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            with self.lock:
+                self.spans[name] = self.spans.get(name, 0) + elapsed_ms
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def set_property(self, name, value):
+        """Adds a property to the log line. Properties are searchable in CloudWatch Logs Insights but are not metrics."""
+        self.properties[name] = value
+
+    def to_dict(self):
+        duration_ms = (time.perf_counter() - self.start) * 1000
+        values = {"DurationMs": duration_ms}
+        values.update({f"{name}Ms": ms for name, ms in self.spans.items()})
+        units = {name: "Milliseconds" for name in values}
+        values.update(self.counters)
+        units.update({name: "Bytes" if name.endswith("Bytes") else "Count" for name in self.counters})
+        line = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [
+                    {
+                        "Namespace": self.namespace,
+                        "Dimensions": [["Route"]],
+                        "Metrics": [{"Name": name, "Unit": unit} for name, unit in units.items()],
+                    }
+                ],
+            },
+            "Route": self.route,
+            **self.properties,
+            **{name: round(value, 3) if isinstance(value, float) else value for name, value in values.items()},
+        }
+        if self.profiler:
+            self.profiler.stop()
+            line["Profile"] = self.profiler.top()
+        return line
+
+
+class CountingHttp:
+    """
+    Wraps the httplib2.Http of a Google API client to count the requests to `host` and the bytes sent and received.
+    Other requests going through it, like credential refreshes, are passed through without being counted.
+    """
+
+    def __init__(self, http, name, host):
+        self.http = http
+        self.name = name
+        self.host = host
+
+    def request(self, uri, method="GET", body=None, *args, **kwargs):
+        response, content = self.http.request(uri, method, body, *args, **kwargs)
+        if self.host in uri:
+            count(f"{self.name}Calls")
+            count(f"{self.name}SentBytes", len(body or b""))
+            count(f"{self.name}ReceivedBytes", len(content or b""))
+        return response, content
+
+    def __getattr__(self, name):
+        return getattr(self.http, name)
+
+
+def start(namespace, route, **properties):
+    """
+    Starts the trace of an invocation. The sampling profiler runs for PROFILE_SAMPLE_RATE of invocations.
+    Args:
+        namespace (str): CloudWatch metrics namespace
+        route (str): The metrics dimension. Keep it to a small set of values. IE. "POST /send"
+        properties: Extra values for the log line. IE. the request id
+    Returns:
+        Trace
+    """
+    global _current
+    _current = Trace(namespace, route, profile=random.random() < PROFILE_SAMPLE_RATE, **properties)
+    return _current
+
+
+def emit():
+    """Prints the log line of the trace in progress and ends it"""
+    global _current
+    if _current is not None:
+        print(json.dumps(_current.to_dict(), default=str))
+    _current = None
+
+
+def span(name):
+    """Times a block of code into the trace in progress. Does nothing outside of a trace."""
+    if _current is None:
+        return nullcontext()
+    return _current.span(name)
+
+
+def count(name, value=1):
+    if _current is not None:
+        _current.count(name, value)
+
+
+def set_property(name, value):
+    if _current is not None:
+        _current.set_property(name, value)
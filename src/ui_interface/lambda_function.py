@@ -1,28 +1,42 @@
+import hashlib
 import json
-import re
 import os
-from datetime import datetime as dt
-from zoneinfo import ZoneInfo
-
-import boto3
-from jinja2 import Environment, FileSystemLoader
-import pandas as pd
-from apiclient import discovery
-from google.auth import aws
-from http.cookies import SimpleCookie
-
-SPREADSHEET_ID = "1-o3tpUS70-2iDRfhVVWWNVpEsSBuR0fCdFpU8DJzN_Y"
-
-
-def put_s3_json(bucket: str, key: str, body: dict) -> None:
-    s3 = boto3.client("s3")
-    s3.put_object(Bucket=bucket, Key=key, Body=json.dumps(body))
+import time
+import uuid
 
+from http.cookies import SimpleCookie
 
-def get_s3_json(bucket: str, key: str) -> dict:
-    s3 = boto3.client("s3")
-    obj = s3.get_object(Bucket=bucket, Key=key)
-    return json.loads(obj["Body"].read().decode())
+from catan_core import (
+    FileQueue,
+    S3AppliedKeys,
+    SQSQueue,
+    analytics,
+    build_pipeline,
+    get_group,
+    get_s3_json,
+    group_entries_by_group,
+    list_s3_keys,
+    put_s3_json,
+    tracing,
+)
+
+# boto3, the Google clients and jinja2 are imported inside the functions that use them rather than at module load.
+# They make up most of the cold start, and each route only pays for the ones it actually needs.
+# The scoring pipeline itself lives in catan_core, which is shipped in the lambda layer and shared with sms_interface.
+CREDENTIALS_FILEPATH = "googlecreds.json"
+METRICS_NAMESPACE = "CatanTracker"
+MESSAGES_PAGE_SIZE = int(os.environ.get("MESSAGES_PAGE_SIZE", "50"))
+CACHE_TEMPLATES = os.environ.get("CACHE_TEMPLATES", "true").lower() == "true"
+PAGE_MAX_AGE = int(os.environ.get("PAGE_MAX_AGE", "0"))
+MAX_MESSAGE_TIMESTAMP = 10**13 - 1
+MAX_S3_WORKERS = 8
+# In write-behind mode /send answers as soon as the game is queued and queue_handler writes it to Sheets.
+# The queue is SQS when SCORE_QUEUE_URL is set and a local directory otherwise.
+WRITE_BEHIND = os.environ.get("WRITE_BEHIND", "false").lower() == "true"
+SCORE_QUEUE_DIR = os.environ.get("SCORE_QUEUE_DIR", "/tmp/catan-tracker-queue")
+
+# Compiled jinja2 templates and a hash of their source, keyed by template name
+_TEMPLATES = {}
 
 
 def convert_cookies_to_dict(cookie_string: str) -> dict:
@@ -44,238 +58,54 @@ def convert_cookies_to_dict(cookie_string: str) -> dict:
         return {}
 
 
-def validate_message(message_parts):
-    errors = []
-    score_difference = message_parts[0].strip()
-    game_name = message_parts[1].strip().lower()
+def get_pipeline(group_id: str = None):
+    # The storage backend is picked by GAME_STORE, see catan_core.backends. Each group has its own.
+    return build_pipeline(CREDENTIALS_FILEPATH, get_group(group_id))
 
-    if not re.search(r"by \d", score_difference):
-        errors.append("The first sentence should follow the format of 'Jess by 5'")
 
-    if "jess" in game_name or "dan" in game_name:
-        errors.append("The second sentence should only be the game name")
+def get_queue():
+    if os.environ.get("SCORE_QUEUE_URL"):
+        return SQSQueue(os.environ["SCORE_QUEUE_URL"])
+    return FileQueue(SCORE_QUEUE_DIR)
 
-    if errors:
-        error_messages = ". ".join(errors)
-        raise Exception(f"The message was not sent in the correct format. {error_messages}")
 
+def get_applied_keys(group_id: str = None):
+    return S3AppliedKeys(os.environ["CONFIG_BUCKET"], get_group(group_id).key(os.environ["APPLIED_KEYS_KEY"]))
 
-def convert_message_to_dictionary(received_message):
-    # Validate the message parts
-    message_parts = received_message.split(".")
-    validate_message(message_parts)
 
-    # Transform the message to a dictionary
-    now = dt.now(ZoneInfo("America/Los_Angeles"))
-    winner, score_difference = message_parts[0].strip().split(" by ")
-    my_dict = {
-        "Game date": f"{now.month}/{now.day}/{now.year}",
-        "Winner": winner,
-        "Score difference": score_difference,
-        "Game": message_parts[1].strip(),
-    }
-    if len(message_parts) > 2:
-        for message_part in message_parts[2:]:
-            stripped_message_part = message_part.strip()
-            if stripped_message_part:
-                my_dict[f"{stripped_message_part}?"] = "Yes"
-
-    return my_dict
-
-
-class GoogleSheets:
-    """Works with data in Google Sheets and updates the known last row and last column of a dataset as it goes."""
-
-    def __init__(self, credentials_filepath, sheet_name="Sheet1"):
-        raw_creds = json.load(open(credentials_filepath))
-        credentials = aws.Credentials.from_info(raw_creds)
-        scoped_credentials = credentials.with_scopes(["https://www.googleapis.com/auth/spreadsheets"])
-        self.service = discovery.build("sheets", "v4", credentials=scoped_credentials).spreadsheets()
-        self.sheet_name = sheet_name
-        self._get_last_row_and_col()
-        self._get_current_columns()
-
-    def _get_last_row_and_col(self):
-        # This gets the last row and column by creating an empty table. It uses the range of the empty table
-        # to determine the last row and column.
-        table = {"majorDimension": "ROWS", "values": []}
-        # append the empty table
-        request = self.service.values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{self.sheet_name}!A:ZZZ",
-            valueInputOption="USER_ENTERED",
-            insertDataOption="INSERT_ROWS",
-            body=table,
-        )
-        result = request.execute()
-
-        # get last row and last column with regex
-        p = re.compile("^.*![A-Z]+\d+:([A-Z]+)(\d+)$")
-        match = p.match(result["tableRange"])
-        last_col = match.group(1)
-        last_row = match.group(2)
-        self.last_col = last_col
-        self.last_row = last_row
-        return last_row, last_col
-
-    @staticmethod
-    def _excel_column_name(n):
-        """Converts a number to an excel column name. IE. 1 => A, 27 => AA, 53 => BA, etc."""
-
-        result = ""
-        while n > 0:
-            # find the index of the next letter and concatenate the letter to the solution
-            # here index 0 corresponds to `A`, and 25 corresponds to `Z`
-            index = (n - 1) % 26
-            result += chr(index + ord("A"))
-            n = (n - 1) // 26
-
-        return result[::-1]
-
-    @staticmethod
-    def _excel_column_number(name):
-        """Excel-style column name to number, IE. A => 1, Z => 26, AA => 27, BA => 53."""
-
-        n = 0
-        for c in name:
-            n = n * 26 + 1 + ord(c) - ord("A")
-        return n
-
-    def _get_current_columns(self):
-        result = self.service.values().get(spreadsheetId=SPREADSHEET_ID, range=f"A1:{self.last_col}1").execute()
-        self.columns = result["values"][0]
-        return self.columns
-
-    def _update_values(self, range, data):
-        params = dict(spreadsheetId=SPREADSHEET_ID, body=data, range=range, valueInputOption="USER_ENTERED")
-        self.service.values().update(**params).execute()
-
-    def update_columns(self, data_dict):
-        additional_columns = [k for k in data_dict.keys() if k not in self.columns]
-        if additional_columns:
-            print("We have additional columns!")
-            print(additional_columns)
-
-            # Get range that needs to be updated
-            current_col_num = self._excel_column_number(self.last_col)
-            next_col = self._excel_column_name(current_col_num + 1)
-            new_last_col = self._excel_column_name(current_col_num + len(additional_columns))
-            new_col_range = f"{next_col}1:{new_last_col}1"
-
-            # Update the values for the range
-            data = {"values": [additional_columns]}
-            self._update_values(new_col_range, data)
-
-            # Update the recorded last column and column list
-            self.last_col = new_last_col
-            self.columns += additional_columns
-
-    def add_data(self, data_dict):
-        # Get range
-        next_row = int(self.last_row) + 1
-        range_name = f"{self.sheet_name}!A{next_row}:{self.last_col}{next_row}"
-
-        # Get values
-        data_values = []
-        for col in self.columns:
-            data_values.append(data_dict.get(col))
-        data = {"values": [data_values]}
-        print("Updating")
-        self._update_values(range_name, data)
-        self.last_row = next_row
-
-    def get_all_data(self):
-        range_name = f"{self.sheet_name}!A2:{self.last_col}{self.last_row}"
-        result = self.service.values().get(spreadsheetId=SPREADSHEET_ID, range=range_name).execute()
-        return result["values"]
-
-
-def determine_winner(jess_record, dan_record):
-    if jess_record > dan_record:
-        return f"Jess is winning {jess_record}-{dan_record}"
-
-    if dan_record > jess_record:
-        return f"Dan is winning {dan_record}-{jess_record}"
-
-    return f"it's a tie {jess_record}-{dan_record}"
-
-
-def build_response(df, df_game, df_all_conditions, winner, game, score_diff, score_diff_wins):
-    """
-    Builds a message response based on:
-        1. The overall record
-        2. The record for just the game played
-        3. The amount of times the winner has won the game by the same score difference
-        4. The record for the current conditions
-    """
+def get_group_id(event: dict) -> str:
+    """The group a request is for, from the `group` query string parameter. None is the default group."""
+    return (event.get("queryStringParameters") or {}).get("group")
 
-    # Get all of the records
-    overall_records = df["Winner"].value_counts()
-    game_records = df_game["Winner"].value_counts()
-    conditions_records = df_all_conditions["Winner"].value_counts()
-    jess_record, dan_record = overall_records.get("Jess", 0), overall_records.get("Dan", 0)
-    jess_game_record, dan_game_record = game_records.get("Jess", 0), game_records.get("Dan", 0)
-    jess_conditions_record, dan_conditions_record = conditions_records.get("Jess", 0), conditions_records.get("Dan", 0)
-
-    # Get the winners in a sentence format for the response text message.
-    overall_winner = determine_winner(jess_record, dan_record)
-    game_type_winner = determine_winner(jess_game_record, dan_game_record)
-    conditions_winner = determine_winner(jess_conditions_record, dan_conditions_record)
-
-    str_time = "times" if score_diff_wins > 1 else "time"
-    response = (
-        f"Congrats {winner}!\n"
-        f"Overall, {overall_winner}.\n"
-        f"{game_type_winner} in {game}.\n"
-        f"{winner} has won by {score_diff} in this game {score_diff_wins} {str_time}.\n"
-        f"For all matching conditions, {conditions_winner}."
-    )
 
-    return response
+def get_messages_prefix(group_id: str = None) -> str:
+    return get_group(group_id).key(os.environ["MESSAGES_PREFIX"])
 
 
 def send_score(event):
-    # Convert message to a dictionary
-    try:
-        event_body = json.loads(event["body"])
-        received_message = event_body["message"]
-        data_dict = convert_message_to_dictionary(received_message)
-        print("Converted data")
-        print(data_dict)
-
-        # Input data into google sheets
-        sheets = GoogleSheets("googlecreds.json")
-        sheets.update_columns(data_dict)
-        sheets.add_data(data_dict)
-
-        # Get all of the current data
-        # Create a filtered dataframe for just the game
-        # Create a filtered dataframe for the score difference, winner, and game
-        # Create a filtered dataframe for all current conditions. Ignore some columns so that not too much is filtered.
-        df = pd.DataFrame(sheets.get_all_data(), columns=sheets.columns)
-        game, score_diff, winner = data_dict["Game"], data_dict["Score difference"], data_dict["Winner"]
-        df_game = df[df["Game"] == game]
-        df_score_and_game = df[(df["Game"] == game) & (df["Score difference"] == score_diff) & (df["Winner"] == winner)]
-        ignore_columns = ["Game date", "Winner", "Score difference"]
-        query = " & ".join([f'`{k}` == "{v}"' for k, v in data_dict.items() if k not in ignore_columns])
-        df_all_conditions = df.query(query)
-
-        # Build and send response
-        score_diff_wins = len(df_score_and_game.index)
-        response_message = build_response(df, df_game, df_all_conditions, winner, game, score_diff, score_diff_wins)
-
-    except Exception as e:
-        response_message = f"{e.__class__.__name__}: {e}"
-
-    messages = get_messages()
-    messages.extend([{
-        "body": received_message,
-        "who": "sender"
-    }, {
-        "body": response_message,
-        "who": "receiver"
-    }])
-    put_s3_json(os.environ["CONFIG_BUCKET"], os.environ["MESSAGES_KEY"], messages)
+    group_id = get_group_id(event)
+    event_body = json.loads(event["body"])
+    received_message = event_body["message"]
+    pipeline = get_pipeline(group_id)
+    prefix = get_messages_prefix(group_id)
+
+    def write_messages(response_message):
+        # Runs while the pipeline saves the stats, see ScoringPipeline.score
+        with tracing.span("messages_write"):
+            put_messages([{
+                "body": received_message,
+                "who": "sender"
+            }, {
+                "body": response_message,
+                "who": "receiver"
+            }], prefix)
+
+    if WRITE_BEHIND:
+        response_message = pipeline.enqueue_score(
+            received_message, get_queue(), event_body.get("idempotency_key"), on_reply=write_messages
+        )
+    else:
+        response_message = pipeline.score(received_message, on_reply=write_messages)
 
     return response(200, response_message)
 
@@ -301,8 +131,49 @@ def response(status_code: int, body: str, headers: dict = None, multi_value_head
     return response_dict
 
 
-def get_messages():
+def message_key(timestamp_ms: int, name: str, prefix: str = None) -> str:
+    """
+    Key of a message log object. The timestamp is inverted so that listing the log returns the newest messages first.
+    Args:
+        timestamp_ms (int): Milliseconds since the epoch that the messages were sent
+        name (str): Makes the key unique when two writes land on the same millisecond
+        prefix (str): The group's message log. MESSAGES_PREFIX when it is not set.
+    Returns:
+        str
+    """
+    inverted_timestamp = MAX_MESSAGE_TIMESTAMP - timestamp_ms
+    return f"{prefix or os.environ['MESSAGES_PREFIX']}{inverted_timestamp:013d}-{name}.json"
+
+
+def put_messages(messages: list, prefix: str = None) -> None:
+    """
+    Appends messages to the message log. Every write goes to a new object, so concurrent sends never lose messages.
+    """
+    key = message_key(int(time.time() * 1000), uuid.uuid4().hex, prefix)
+    put_s3_json(os.environ["CONFIG_BUCKET"], key, messages)
+
+
+def list_message_keys(limit: int = MESSAGES_PAGE_SIZE, cursor: str = None, prefix: str = None) -> tuple:
+    """
+    Lists a page of the message log, newest first.
+    Args:
+        limit (int): Number of message log objects in the page
+        cursor (str): Where the page starts. The newest page when it is not set.
+        prefix (str): The group's message log. MESSAGES_PREFIX when it is not set.
+    Returns:
+        tuple: (keys, cursor of the next older page or None when this is the oldest page)
+    """
+    prefix = prefix or os.environ["MESSAGES_PREFIX"]
+    start_after = f"{prefix}{cursor}" if cursor else None
+    keys, is_truncated = list_s3_keys(os.environ["CONFIG_BUCKET"], prefix, limit, start_after)
+    keys = [k for k in keys if k != message_manifest_key(prefix)]
+    next_cursor = keys[-1][len(prefix):] if is_truncated and keys else None
+    return keys, next_cursor
+
+
+def get_messages_for_keys(keys: list) -> list:
     """
+    Fetches message log objects and flattens them into a list of messages, oldest first.
     Format of messages:
         [
             {
@@ -312,13 +183,17 @@ def get_messages():
 
         ]
     """
-    try:
-        messages = get_s3_json(os.environ["CONFIG_BUCKET"], os.environ["MESSAGES_KEY"])
-    except Exception as e:
-        if "NoSuchKey" not in str(e):
-            raise e
-        messages = []
-    return messages
+    from concurrent.futures import ThreadPoolExecutor
+
+    bucket = os.environ["CONFIG_BUCKET"]
+    # The threads share the S3 client and its connection pool, see catan_core.aws
+    with ThreadPoolExecutor(max_workers=MAX_S3_WORKERS) as executor:
+        objects = list(executor.map(lambda key: get_s3_json(bucket, key), keys))
+    return [message for messages_object in reversed(objects) for message in messages_object]
+
+
+def message_manifest_key(prefix: str = None) -> str:
+    return f"{prefix or os.environ['MESSAGES_PREFIX']}manifest.json"
 
 
 def validate_cookies(cookies: dict) -> bool:
@@ -326,25 +201,157 @@ def validate_cookies(cookies: dict) -> bool:
     return "CT_CR" in cookies
 
 
+def get_template(name: str) -> tuple:
+    """
+    Gets a compiled template, compiling it only once per lambda container unless CACHE_TEMPLATES is turned off.
+    Returns:
+        tuple: (jinja2.Template, hash of the template source to include in ETags)
+    """
+    if name not in _TEMPLATES or not CACHE_TEMPLATES:
+        from jinja2 import Environment, FileSystemLoader
+
+        templates_path = os.path.join(os.path.dirname(__file__), "templates")
+        en = Environment(loader=FileSystemLoader(templates_path, encoding="utf8"))
+        with open(os.path.join(templates_path, name), "rb") as f:
+            source_hash = hashlib.sha1(f.read()).hexdigest()
+        _TEMPLATES[name] = (en.get_template(name), source_hash)
+    return _TEMPLATES[name]
+
+
+def make_etag(*parts) -> str:
+    return '"' + hashlib.sha1(json.dumps(parts).encode()).hexdigest() + '"'
+
+
+def is_not_modified(event: dict, etag: str) -> bool:
+    """Whether the If-None-Match header of the request already has the ETag"""
+    headers = event.get("headers", {}) or {}
+    if_none_match = headers.get("if-none-match") or headers.get("If-None-Match") or ""
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
 def get_home(event: dict) -> dict:
     """
-    Returns an HTML page based on whether a user needs to sign in, is already signed in, or signs in for the first time
+    Returns an HTML page based on whether a user needs to sign in, is already signed in, or signs in for the first time.
+    Only the newest page of messages is rendered. The message log is append-only, so the listed keys identify the page
+    and an unchanged chat is answered with a 304 before any message is fetched.
     Args:
         event (dict): API Gateway event dictionary.
     Returns:
         dict: API Gateway response.
     """
-    en = Environment(loader=FileSystemLoader(os.path.join(os.path.dirname(__file__), "templates"), encoding="utf8"))
-    template = en.get_template("index.html")
     headers = event.get("headers", {}) or {}
     cookies = convert_cookies_to_dict(headers.get("cookie") or headers.get("Cookie"))
     flow = "home" if validate_cookies(cookies) else "sign-in"
-    html = template.render(messages=get_messages(), flow=flow)
-    response_headers = {"Content-Type": "html"}
-
+    prefix = get_messages_prefix(get_group_id(event))
+    with tracing.span("messages_list"):
+        keys, cursor = list_message_keys(prefix=prefix) if flow == "home" else ([], None)
+    with tracing.span("template_load"):
+        template, template_hash = get_template("index.html")
+    etag = make_etag(template_hash, flow, keys, cursor)
+    response_headers = {"Content-Type": "html", "ETag": etag, "Cache-Control": f"private, max-age={PAGE_MAX_AGE}"}
+    if is_not_modified(event, etag):
+        return response(304, "", response_headers)
+
+    with tracing.span("messages_read"):
+        messages = get_messages_for_keys(keys)
+    with tracing.span("render"):
+        html = template.render(messages=messages, flow=flow, cursor=cursor)
     return response(200, html, response_headers)
 
 
+def get_message_page(event: dict) -> dict:
+    """
+    Returns a page of older messages as JSON for the "Load older messages" button.
+    Args:
+        event (dict): API Gateway event dictionary. The `cursor` query string parameter picks the page.
+    Returns:
+        dict: API Gateway response with a body of {"messages": [...], "cursor": <next older page or null>}
+    """
+    headers = event.get("headers", {}) or {}
+    cookies = convert_cookies_to_dict(headers.get("cookie") or headers.get("Cookie"))
+    if not validate_cookies(cookies):
+        return response(401, "Sign in to see messages")
+
+    cursor = (event.get("queryStringParameters") or {}).get("cursor")
+    with tracing.span("messages_list"):
+        keys, next_cursor = list_message_keys(cursor=cursor, prefix=get_messages_prefix(get_group_id(event)))
+    etag = make_etag(keys, next_cursor)
+    response_headers = {
+        "Content-Type": "application/json",
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={PAGE_MAX_AGE}",
+    }
+    if is_not_modified(event, etag):
+        return response(304, "", response_headers)
+
+    with tracing.span("messages_read"):
+        messages = get_messages_for_keys(keys)
+    body = json.dumps({"messages": messages, "cursor": next_cursor})
+    return response(200, body, response_headers)
+
+
+def import_scores(event: dict) -> dict:
+    """
+    Bulk import of historical games.
+    Args:
+        event (dict): API Gateway event dictionary. The body is {"format": "csv"|"messages", "data": ..., "dry_run": bool}
+    Returns:
+        dict: API Gateway response with the import report as JSON
+    """
+    headers = event.get("headers", {}) or {}
+    cookies = convert_cookies_to_dict(headers.get("cookie") or headers.get("Cookie"))
+    if not validate_cookies(cookies):
+        return response(401, "Sign in to import games")
+
+    event_body = json.loads(event["body"])
+    try:
+        report = get_pipeline(get_group_id(event)).import_games(
+            event_body["data"], event_body.get("format", "messages"), event_body.get("dry_run", False)
+        )
+    except Exception as e:
+        return response(400, f"{e.__class__.__name__}: {e}")
+    return response(200, json.dumps(report), {"Content-Type": "application/json"})
+
+
+def get_stats(event: dict) -> dict:
+    """
+    Returns the history stats as JSON. See catan_core.analytics for what is in them.
+    Args:
+        event (dict): API Gateway event dictionary. The `window` query string parameter is the number of games the
+            rolling win rate is over and `points` is the number of recent games it is given for.
+    Returns:
+        dict: API Gateway response
+    """
+    headers = event.get("headers", {}) or {}
+    cookies = convert_cookies_to_dict(headers.get("cookie") or headers.get("Cookie"))
+    if not validate_cookies(cookies):
+        return response(401, "Sign in to see stats")
+
+    parameters = event.get("queryStringParameters") or {}
+    try:
+        window = int(parameters.get("window", analytics.DEFAULT_WINDOW))
+        points = int(parameters.get("points", analytics.DEFAULT_POINTS))
+    except ValueError:
+        return response(400, "window and points should be whole numbers")
+    if not (1 <= window <= analytics.MAX_WINDOW and 1 <= points <= analytics.MAX_WINDOW):
+        return response(400, f"window and points should be between 1 and {analytics.MAX_WINDOW}")
+
+    # Each group has its own history, so its own snapshot
+    group_id = get_group(get_group_id(event)).group_id
+    snapshot_name = f"{os.environ.get('GAME_STORE', 'sheets')}/{group_id}"
+    stats = get_pipeline(group_id).history_stats(snapshot_name, window, points)
+    body = json.dumps(stats)
+    etag = make_etag(body)
+    response_headers = {
+        "Content-Type": "application/json",
+        "ETag": etag,
+        "Cache-Control": f"private, max-age={PAGE_MAX_AGE}",
+    }
+    if is_not_modified(event, etag):
+        return response(304, "", response_headers)
+    return response(200, body, response_headers)
+
+
 def login(event):
     event_body = json.loads(event["body"])
     cookie_to_set = event_body["credential"]
@@ -352,12 +359,65 @@ def login(event):
     return response(200, "login success", response_headers)
 
 
-def lambda_handler(event, context):
-    # Dispatch the request
-    print(event)
+def dispatch(event):
+    if event["path"] != "/login":
+        try:
+            get_group(get_group_id(event))
+        except Exception as e:
+            return response(404, f"{e.__class__.__name__}: {e}")
+
     if event["path"] == "/" and event["httpMethod"] == "GET":
         return get_home(event)
     elif event["path"] == "/send" and event["httpMethod"] == "POST":
         return send_score(event)
     elif event["path"] == "/login" and event["httpMethod"] == "POST":
         return login(event)
+    elif event["path"] == "/messages" and event["httpMethod"] == "GET":
+        return get_message_page(event)
+    elif event["path"] == "/import" and event["httpMethod"] == "POST":
+        return import_scores(event)
+    elif event["path"] == "/stats" and event["httpMethod"] == "GET":
+        return get_stats(event)
+
+
+def lambda_handler(event, context):
+    # Dispatch the request inside a trace, which prints one structured log line with the timings of the invocation
+    trace = tracing.start(
+        METRICS_NAMESPACE,
+        f"{event['httpMethod']} {event['path']}",
+        RequestId=getattr(context, "aws_request_id", None),
+    )
+    try:
+        result = dispatch(event)
+        trace.set_property("StatusCode", result["statusCode"] if result else None)
+        return result
+    except Exception as e:
+        trace.set_property("Error", e.__class__.__name__)
+        raise e
+    finally:
+        tracing.emit()
+
+
+def queue_handler(event, context):
+    """
+    Writes the games queued by /send in write-behind mode, in the order they were sent. Triggered by the SQS queue.
+    The games of a batch are written together per group, so if a group's write fails every message of that group in the
+    batch is reported as failed and SQS retries them. The other groups' games are still written.
+    """
+    tracing.start(METRICS_NAMESPACE, "SQS", RequestId=getattr(context, "aws_request_id", None))
+    try:
+        entries = [{"receipt": record["messageId"], "body": json.loads(record["body"])} for record in event["Records"]]
+        failures = []
+        for group_id, group_entries in group_entries_by_group(entries).items():
+            try:
+                written = get_pipeline(group_id).write_queued(
+                    [entry["body"] for entry in group_entries], get_applied_keys(group_id)
+                )
+                tracing.count("GamesWritten", written)
+            except Exception as e:
+                tracing.set_property("Error", e.__class__.__name__)
+                tracing.set_property("ErrorMessage", str(e))
+                failures += [{"itemIdentifier": entry["receipt"]} for entry in group_entries]
+        return {"batchItemFailures": failures}
+    finally:
+        tracing.emit()
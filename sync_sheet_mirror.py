@@ -0,0 +1,42 @@
+"""
+This file is not for the application. With GAME_STORE=sqlite the Google Sheet is only a mirror of the SQLite database,
+and a game whose copy to the sheet failed is missing from it. This appends whatever the sheet is missing.
+
+Usage:
+    python sync_sheet_mirror.py [--from-sheet] [--dry-run]
+
+--from-sheet copies the other way, which seeds a new SQLite database with the history already in the sheet.
+The database is the SQLITE_PATH file.
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+SRC_PATH = f"{Path(__file__).parent.absolute()}{os.sep}src"
+UI_INTERFACE_PATH = f"{SRC_PATH}{os.sep}ui_interface"
+sys.path.insert(1, SRC_PATH)
+sys.path.insert(1, UI_INTERFACE_PATH)
+
+import set_env_vars
+from catan_core import GoogleSheets, SQLiteStore, sync_mirror
+from catan_core.backends import DEFAULT_SQLITE_PATH
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from-sheet", action="store_true", help="Copy the games in the sheet into SQLite instead")
+    parser.add_argument("--dry-run", action="store_true", help="Only count the missing games")
+    args = parser.parse_args()
+
+    set_env_vars.main()
+    sheets = GoogleSheets(os.path.join(UI_INTERFACE_PATH, "googlecreds.json"))
+    database = SQLiteStore(os.environ.get("SQLITE_PATH", DEFAULT_SQLITE_PATH))
+    source, destination = (sheets, database) if args.from_sheet else (database, sheets)
+    appended = sync_mirror(source, destination, args.dry_run)
+    print(f"{'Would append' if args.dry_run else 'Appended'} {appended} games to {destination.__class__.__name__}")
+
+
+if __name__ == "__main__":
+    main()
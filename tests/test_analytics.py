@@ -0,0 +1,96 @@
+"""
+The snapshot cache of catan_core.analytics under concurrent callers, as in a threaded load test or the multi-worker
+server.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+from catan_core import analytics
+from synthetic import generate_rows
+
+
+class SlowStore:
+    """A GameStore whose reads wait for `release`, IE. a cold read of a big sheet"""
+
+    def __init__(self, num_games, release=None):
+        self.rows, self.columns = generate_rows(num_games)
+        self.last_row = None
+        self.release = release
+        self.reads = 0
+
+    def get_all_data(self):
+        self.reads += 1
+        if self.release is not None:
+            assert self.release.wait(5)
+        self.last_row = len(self.rows) + 1
+        return self.rows
+
+
+@pytest.fixture(autouse=True)
+def clear_snapshots():
+    analytics._SNAPSHOTS.clear()
+    yield
+    analytics._SNAPSHOTS.clear()
+
+
+def test_cold_build_does_not_block_other_histories():
+    warm = SlowStore(100)
+    analytics.get_snapshot("warm", 101, lambda: warm)
+    release = threading.Event()
+    cold = SlowStore(100, release)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        building = executor.submit(analytics.get_snapshot, "cold", 101, lambda: cold)
+        # The cold build is waiting on its read, the warm history is still answered from memory
+        assert analytics.get_snapshot("warm", 101, lambda: warm).last_row == 101
+        assert not building.done()
+        release.set()
+        assert building.result(5).last_row == 101
+
+
+def test_concurrent_callers_share_one_build():
+    release = threading.Event()
+    store = SlowStore(100, release)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(analytics.get_snapshot, "cold", 101, lambda: store) for _ in range(4)]
+        release.set()
+        snapshots = [future.result(5) for future in futures]
+
+    assert store.reads == 1
+    assert all(snapshot is snapshots[0] for snapshot in snapshots)
+
+
+def test_rows_shorter_than_the_header():
+    # The Sheets API leaves off blank cells at the end of a row, so no row reaches the "Raining?" column
+    columns = ["Game date", "Winner", "Score difference", "Game", "Raining?"]
+    rows = [["1/31/2024", "Jess", "5", "Seafarers"], ["2/1/2024", "Dan", "3", "Catan"]]
+
+    snapshot = analytics.HistorySnapshot.from_rows(rows, columns, 3)
+
+    assert len(snapshot) == 2
+    assert snapshot.condition_names == []
+
+
+def test_extend_with_rows_shorter_than_the_header():
+    columns = ["Game date", "Winner", "Score difference", "Game", "Raining?"]
+    snapshot = analytics.HistorySnapshot.from_rows([["1/31/2024", "Jess", "5", "Seafarers", "Yes"]], columns, 2)
+
+    snapshot = snapshot.extend([["2/1/2024", "Dan", "3", "Catan"]], columns, 3)
+
+    assert len(snapshot) == 2
+    assert snapshot.condition_names == ["Raining?"]
+    assert snapshot.condition_flags[:, 0].tolist() == [True, False]
+    assert analytics.compute_stats(snapshot)["games"] == 2
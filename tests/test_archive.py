@@ -0,0 +1,40 @@
+"""
+Incremental exports to the history archive, against the in-process fakes in benchmarks/fakes.py.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import GoogleSheets
+from catan_core.analytics import compute_stats
+from catan_core.archive import HistoryArchive, export_archive
+
+COLUMNS = ["Game date", "Winner", "Score difference", "Game", "Raining?"]
+
+
+def test_incremental_export_of_rows_shorter_than_the_header(tmp_path):
+    sheets = fakes.FakeSheets([COLUMNS, ["1/31/2024", "Jess", "5", "Seafarers", "Yes"]])
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+    path = str(tmp_path / "archive")
+    export_archive(GoogleSheets("googlecreds.json"), path)
+
+    # No new row reaches the "Raining?" column
+    game = {"Game date": "2/1/2024", "Winner": "Dan", "Score difference": "3", "Game": "Catan"}
+    GoogleSheets("googlecreds.json").add_rows([game])
+    report = export_archive(GoogleSheets("googlecreds.json"), path)
+
+    assert report["rows_read"] == 1
+    snapshot = HistoryArchive(path).snapshot()
+    assert len(snapshot) == 2
+    assert snapshot.condition_flags[:, snapshot.condition_names.index("Raining?")].tolist() == [True, False]
+    full = export_archive(GoogleSheets("googlecreds.json"), str(tmp_path / "full"), full=True)
+    assert full["games"] == 2
+    assert compute_stats(snapshot) == compute_stats(HistoryArchive(str(tmp_path / "full")).snapshot())
@@ -0,0 +1,79 @@
+"""
+Bulk import of games with a game date that does not exist, against the in-process fakes in benchmarks/fakes.py.
+
+Usage:
+    python -m pytest tests
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import GoogleSheets, MessageParseError, MessageParser, S3AggregatesStore, ScoringPipeline
+from synthetic import generate_message, generate_rows
+
+BUCKET = "catan-tracker-local"
+AGGREGATES_KEY = "local/aggregates.json"
+IMPOSSIBLE_DATE = "2/30/2024"
+
+
+@pytest.fixture
+def sheets():
+    rows, columns = generate_rows(10)
+    sheets = fakes.FakeSheets([columns] + rows)
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+    return sheets
+
+
+def get_pipeline():
+    return ScoringPipeline(lambda: GoogleSheets("googlecreds.json"), S3AggregatesStore(BUCKET, AGGREGATES_KEY))
+
+
+def test_parser_rejects_impossible_date():
+    with pytest.raises(MessageParseError) as e:
+        MessageParser().parse("Jess by 5. Seafarers", IMPOSSIBLE_DATE)
+    assert e.value.errors == [
+        {"field": "game_date", "code": "invalid_date", "message": e.value.errors[0]["message"]},
+    ]
+    assert MessageParser().parse("Jess by 5. Seafarers", "02/29/2024")["Game date"] == "2/29/2024"
+
+
+def test_dry_run_flags_impossible_date(sheets):
+    report = get_pipeline().import_games(f"{IMPOSSIBLE_DATE} Jess by 5. Seafarers", "messages", dry_run=True)
+
+    assert report["valid"] == 0
+    assert [error["row"] for error in report["errors"]] == [1]
+    assert [field["code"] for field in report["errors"][0]["fields"]] == ["invalid_date"]
+
+
+def test_import_of_impossible_date_writes_nothing(sheets):
+    before = [list(row) for row in sheets.rows]
+    data = f"Game date,Winner,Score difference,Game\n{IMPOSSIBLE_DATE},Jess,5,Seafarers\n"
+
+    report = get_pipeline().import_games(data, "csv")
+
+    assert report["imported"] == 0
+    assert [error["row"] for error in report["errors"]] == [2]
+    assert sheets.rows == before
+
+
+def test_impossible_date_does_not_stop_a_chunked_import(sheets):
+    # More rows than fit in one chunk, with the bad one last, so it would only be hit after chunks were written
+    rng = random.Random(0)
+    lines = [f"1/{i % 28 + 1}/2024 {generate_message(rng)}" for i in range(600)]
+    lines.append(f"{IMPOSSIBLE_DATE} Jess by 5. Seafarers")
+    header_rows = len(sheets.rows)
+
+    report = get_pipeline().import_games("\n".join(lines), "messages")
+
+    assert report["imported"] == 600
+    assert [error["row"] for error in report["errors"]] == [601]
+    assert len(sheets.rows) == header_rows + 600
+    assert S3AggregatesStore(BUCKET, AGGREGATES_KEY).load().last_row == header_rows + 600
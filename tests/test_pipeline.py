@@ -0,0 +1,79 @@
+"""
+The stats of the ScoringPipeline against a sheet that was edited by hand, on the in-process fakes in
+benchmarks/fakes.py, and against a SQLite store.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import GoogleSheets, S3AggregatesStore, ScoringPipeline, SQLiteStatsStore, SQLiteStore
+from synthetic import generate_rows
+
+BUCKET = "catan-tracker-local"
+AGGREGATES_KEY = "local/aggregates.json"
+
+
+@pytest.fixture
+def sheets():
+    rows, columns = generate_rows(10)
+    sheets = fakes.FakeSheets([columns] + rows)
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+    return sheets
+
+
+def get_pipeline():
+    return ScoringPipeline(lambda: GoogleSheets("googlecreds.json"), S3AggregatesStore(BUCKET, AGGREGATES_KEY))
+
+
+def wins(sheets):
+    winner = sheets.rows[0].index("Winner")
+    return dict(Counter(row[winner] for row in sheets.rows[1:] if len(row) > winner and row[winner]))
+
+
+@pytest.mark.parametrize(
+    "message", ["Dan by 3. Seafarers", "Dan by 3. Seafarers. Snowing"], ids=["append", "new column"]
+)
+def test_stats_are_rebuilt_after_a_hand_edit(sheets, message):
+    pipeline = get_pipeline()
+    pipeline.score("Jess by 5. Seafarers")
+    # A game typed straight into the sheet, which the saved stats do not know about
+    hand_edit = {"Game date": "1/31/2024", "Winner": "Jess", "Score difference": "2", "Game": "Catan"}
+    sheets.rows.append([hand_edit.get(column, "") for column in sheets.rows[0]])
+
+    pipeline.score(message)
+
+    aggregates = S3AggregatesStore(BUCKET, AGGREGATES_KEY).load()
+    assert aggregates.last_row == len(sheets.rows)
+    assert {winner: count for winner, count in aggregates.overall.items() if count} == wins(sheets)
+
+
+class UntrackedSQLiteStore(SQLiteStore):
+    """Does not say where its games went, so the stats are always rebuilt, and fails if the whole store is read"""
+
+    def add_rows(self, data_dicts):
+        super().add_rows(data_dicts)
+
+    def get_all_data(self):
+        raise AssertionError("The SQLite stats were rebuilt from every game")
+
+
+def test_sqlite_stats_are_rebuilt_without_reading_the_games(tmp_path):
+    path = str(tmp_path / "games.db")
+    pipeline = ScoringPipeline(lambda: UntrackedSQLiteStore(path), SQLiteStatsStore(path))
+
+    pipeline.score("Jess by 5. Seafarers")
+    reply = pipeline.score("Dan by 3. Seafarers")
+
+    assert "Error" not in reply
+    assert SQLiteStatsStore(path).load().overall_records() == {"Jess": 1, "Dan": 1}
@@ -0,0 +1,97 @@
+"""
+Draining the write-behind queue when a write fails part of the way through, on a FileQueue and the in-process fakes in
+benchmarks/fakes.py.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+import fakes
+from catan_core import FileQueue, GoogleSheets, S3AggregatesStore, S3AppliedKeys, ScoringPipeline, drain
+from synthetic import generate_rows
+
+BUCKET = "catan-tracker-local"
+AGGREGATES_KEY = "local/aggregates.json"
+APPLIED_KEYS_KEY = "local/applied_keys.json"
+MESSAGES = ["Jess by 5. Seafarers", "Dan by 3. Seafarers. Raining", "Jess by 1. Catan"]
+
+
+@pytest.fixture
+def sheets():
+    rows, columns = generate_rows(10)
+    sheets = fakes.FakeSheets([columns] + rows)
+    fakes.install(sheets, fakes.FakeS3(), fakes.FakeSNS())
+    return sheets
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = FileQueue(str(tmp_path))
+    pipeline = get_pipeline()
+    for i, message in enumerate(MESSAGES):
+        pipeline.enqueue_score(message, queue, f"key-{i}")
+    return queue
+
+
+def get_pipeline(store_factory=None):
+    return ScoringPipeline(
+        store_factory or (lambda: GoogleSheets("googlecreds.json")), S3AggregatesStore(BUCKET, AGGREGATES_KEY)
+    )
+
+
+class KeysSaveFailsOnce(S3AppliedKeys):
+    """Fails to apply the keys the first time, IE. after the rows were appended"""
+
+    failed = False
+
+    def save(self, keys, pending=None):
+        if pending is None and not KeysSaveFailsOnce.failed:
+            KeysSaveFailsOnce.failed = True
+            raise Exception("An error occurred (InternalError) when calling the PutObject operation")
+        super().save(keys, pending)
+
+
+class AppendFailsOnce(GoogleSheets):
+    """Fails the first append before anything is written"""
+
+    failed = False
+
+    def add_rows(self, data_dicts, **kwargs):
+        if not AppendFailsOnce.failed:
+            AppendFailsOnce.failed = True
+            raise Exception("Connection reset before the request was sent")
+        return super().add_rows(data_dicts, **kwargs)
+
+
+def test_failure_after_the_append_does_not_duplicate_rows(sheets, queue):
+    rows_before = len(sheets.rows)
+
+    report = drain(
+        queue, lambda group_id: get_pipeline(), lambda group_id: KeysSaveFailsOnce(BUCKET, APPLIED_KEYS_KEY), 10, 1, 0
+    )
+
+    assert KeysSaveFailsOnce.failed
+    assert report["failed"] == 0 and len(queue) == 0
+    assert len(sheets.rows) == rows_before + len(MESSAGES)
+    assert S3AppliedKeys(BUCKET, APPLIED_KEYS_KEY).load() == ([f"key-{i}" for i in range(len(MESSAGES))], None)
+
+
+def test_failed_append_is_written_on_retry(sheets, queue):
+    rows_before = len(sheets.rows)
+    pipeline = get_pipeline(lambda: AppendFailsOnce("googlecreds.json"))
+
+    report = drain(queue, lambda group_id: pipeline, lambda group_id: S3AppliedKeys(BUCKET, APPLIED_KEYS_KEY), 10, 1, 0)
+
+    assert AppendFailsOnce.failed
+    assert report["written"] == len(MESSAGES) and len(queue) == 0
+    assert len(sheets.rows) == rows_before + len(MESSAGES)
+    assert S3AggregatesStore(BUCKET, AGGREGATES_KEY).load().last_row == len(sheets.rows)
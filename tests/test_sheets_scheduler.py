@@ -0,0 +1,70 @@
+"""
+Retries of the SheetsScheduler against requests that fail with a given HTTP status, and its token buckets.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "benchmarks"))
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+from catan_core.sheets_scheduler import SheetsScheduler, TokenBucket
+from fakes import FakeHttpError
+
+
+class FailingRequest:
+    """Fails with `statuses` one after the other, then succeeds"""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.executed = 0
+
+    def execute(self):
+        self.executed += 1
+        if self.statuses:
+            raise FakeHttpError(self.statuses.pop(0))
+        return {"executed": self.executed}
+
+
+def get_scheduler():
+    return SheetsScheduler(None, None, base_backoff_seconds=0, max_backoff_seconds=0)
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_read_is_retried_on_server_error(status):
+    request = FailingRequest(status)
+    assert get_scheduler().read(request) == {"executed": 2}
+
+
+@pytest.mark.parametrize("status", [500, 502, 503, 504])
+def test_write_is_not_retried_on_server_error(status):
+    # The append may have gone through before the error, so retrying it could write the game twice
+    request = FailingRequest(status)
+    with pytest.raises(FakeHttpError):
+        get_scheduler().write(request)
+    assert request.executed == 1
+
+
+def test_write_is_retried_when_throttled():
+    request = FailingRequest(429, 429)
+    assert get_scheduler().write(request) == {"executed": 3}
+
+
+@pytest.mark.parametrize("quota, burst_share", [(1, 0.1), (2, 1), (60, 1), (60, 0.1)])
+def test_bucket_always_refills(quota, burst_share):
+    bucket = TokenBucket(quota, burst_share, window_seconds=0.05)
+    assert bucket.rate > 0
+    for _ in range(quota + 1):
+        bucket.acquire(timeout=1)
+
+
+@pytest.mark.parametrize("quota, burst_share", [(0, 0.1), (60, 0), (60, 1.5)])
+def test_bucket_rejects_invalid_quota(quota, burst_share):
+    with pytest.raises(Exception, match="Sheets quota"):
+        TokenBucket(quota, burst_share)
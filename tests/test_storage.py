@@ -0,0 +1,39 @@
+"""
+The Sheets service that GoogleSheets shares between the threads of a lambda container.
+
+Usage:
+    python -m pytest tests
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent.parent.absolute()
+sys.path.insert(1, str(PROJECT_PATH / "src"))
+
+from catan_core.storage import ThreadLocalSheetsService
+
+
+class FakeResource:
+    def __init__(self, http):
+        self.http = http
+
+    def spreadsheets(self):
+        return self
+
+
+def test_each_thread_gets_its_own_service_and_connection(monkeypatch):
+    from googleapiclient import discovery
+
+    monkeypatch.setattr(discovery, "build", lambda *args, http=None, **kwargs: FakeResource(http))
+    service = ThreadLocalSheetsService(credentials=None)
+    services = []
+    thread = threading.Thread(target=lambda: services.append(service._service()))
+    thread.start()
+    thread.join()
+
+    assert service._service() is service._service()
+    assert services[0] is not service._service()
+    assert services[0].http is not service._service().http
+    assert service.http is service._service().http